@@ -1,28 +1,40 @@
 
 import streamlit as st
+import os
+from collections import deque
 from datetime import datetime
 from mcp_client import execute_plan_blocking, fix_plan
+from pipeline import run_turn_blocking
 import time
+import uuid
 import urllib.parse
 
 from typing import Optional
 import re
 from logger import log_mcp
-from llm import plan_llm, finalize_llm, fallback_plan
+from llm import finalize_llm
+from prefetch import speculate, prefetch_stats
+from router import route
+from context import facts_from_music_ctx
+from session import Session
+from session_store import store, valid_sid
+from basket import Basket
+from results import ToolResult
 try:
     from llm import ask_llm
 except Exception:
     ask_llm = None
 
 from dotenv import load_dotenv
-import json
 
 load_dotenv()
 HOST = "MoodST"
 st.set_page_config(page_title=HOST, layout="wide")
 
-# ===== CSS CRT =====
-st.markdown(r"""
+# ===== CSS CRT + header =====
+# Un solo elemento con contenido fijo: Streamlit exige reemitirlo en cada rerun, pero al no cambiar
+# el frontend no lo vuelve a montar.
+CRT_HEAD = r"""
 <style>
 @import url('https://fonts.googleapis.com/css2?family=VT323&display=swap');
 :root{ --crt-green:#2cff76; --crt-bg:#000000; --crt-bright:#b9ffc9; }
@@ -51,34 +63,71 @@ button[kind="secondary"], button[kind="primary"]{
 }
 header, [data-testid="stToolbar"]{visibility:hidden;height:0}
 .reasoning-expander > div{border:1px dashed var(--crt-green); padding:8px}
+details.reasoning summary{cursor:pointer;opacity:.75;font-size:18px}
 </style>
-""", unsafe_allow_html=True)
-
-# ===== Header =====
-st.markdown(f"""
+""" + f"""
 <div class="crt-header">
   <span class="host">[{HOST}]</span> <span class="blink">▮</span>
 </div>
-""", unsafe_allow_html=True)
+"""
+st.markdown(CRT_HEAD, unsafe_allow_html=True)
+
+# Mensajes más recientes que se renderizan uno a uno; los anteriores van en un solo bloque
+LIVE_TURNS = int(os.getenv("CHAT_LIVE_TURNS", "12"))
 
 # ===== Estado =====
+# La sesión se identifica con ?sid= en la URL; mensajes y music_ctx viven en el session store
+# (SESSION_STORE), así una recarga u otra réplica la retoma sin volver a llamar al LLM.
+def _query_sid() -> Optional[str]:
+    qp = st.query_params if hasattr(st, "query_params") else st.experimental_get_query_params()
+    sid = qp.get("sid")
+    return sid[0] if isinstance(sid, list) else sid
+
+def _set_query_sid(sid: str):
+    if hasattr(st, "query_params"):
+        if st.query_params.get("sid") != sid:
+            st.query_params["sid"] = sid
+    else:
+        st.experimental_set_query_params(sid=sid)
+
+_saved = None
+if "sid" not in st.session_state:
+    _sid = _query_sid()
+    if valid_sid(_sid):
+        _saved = store().load(_sid)
+    st.session_state.sid = _sid if valid_sid(_sid) else uuid.uuid4().hex
+_set_query_sid(st.session_state.sid)
+
+def _persist_state():
+    ctx = st.session_state.music_ctx
+    store().set_state(st.session_state.sid, {"music_ctx": {**ctx, "basket": ctx["basket"].to_dict()},
+                                             "window": st.session_state.messages.window.to_dict()})
+
 if "messages" not in st.session_state:
-    st.session_state.messages = [
-        {"role":"assistant","content":"Bienvenido. ¿Qué quieres hacer hoy?","thought":"","ts":datetime.now()},
-    ]
+    if _saved:
+        st.session_state.messages = Session.from_dict({"turns": _saved["messages"],
+                                                       "window": _saved["state"].get("window") or {}})
+    else:
+        st.session_state.messages = Session()
+    st.session_state.messages.on_add = lambda m, sid=st.session_state.sid: store().append(sid, m)
+    if not _saved:
+        st.session_state.messages.add("assistant", "Bienvenido. ¿Qué quieres hacer hoy?", thought="")
 
 if "music_ctx" not in st.session_state:
     st.session_state.music_ctx = {
-        "basket_track_ids": [],
+        "basket": Basket(),   # pistas + objetivo (target) de la próxima playlist
         "last_playlist_name": None,
         "last_public": None,
         "last_playlist_url": None,
         "last_playlist_id": None,
         "playlists": {},   
         "last_created_key": None,
-        "target_count": None,
+        "last_mood": None,
 
     }
+    if _saved:
+        st.session_state.music_ctx.update(_saved["state"].get("music_ctx") or {})
+        st.session_state.music_ctx["basket"] = Basket.from_dict(st.session_state.music_ctx.get("basket"))
 
 # --- Playlist name normalization and link extraction ---
 def _norm_name(s: str) -> str:
@@ -96,11 +145,49 @@ def _extract_link_query(text: str) -> str|None:
 def fmt_time(ts: datetime) -> str:
     return ts.strftime("%H:%M:%S")
 
-def render_line(role: str, content: str, ts: datetime):
+def line_html(role: str, content: str, ts: datetime) -> str:
     tag = f"[{HOST}]" if role=="assistant" else "[you]"
-    st.markdown(f'<div class="line"><span class="tag">{tag}</span>{content}<span class="time">{fmt_time(ts)}</span></div>',
-                unsafe_allow_html=True)
-    
+    return f'<div class="line"><span class="tag">{tag}</span>{content}<span class="time">{fmt_time(ts)}</span></div>'
+
+def render_line(role: str, content: str, ts: datetime):
+    st.markdown(line_html(role, content, ts), unsafe_allow_html=True)
+
+def render_history(session: Session):
+    """
+    Los últimos LIVE_TURNS mensajes van en vivo; los anteriores se pliegan en un único bloque HTML
+    (dentro de un expander) que se arma incrementalmente: cada mensaje se formatea una sola vez.
+    """
+    cache = st.session_state.setdefault("history_cache", {"parts": deque(), "next": 0, "html": ""})
+    parts, base, n = cache["parts"], session.evicted, len(session)
+    cut = base + max(0, n - LIVE_TURNS)   # índice global del primer mensaje en vivo
+    changed = False
+    while parts and parts[0][0] < base:   # ya salieron del ring buffer de la sesión
+        parts.popleft(); changed = True
+    for g in range(max(cache["next"], base), cut):
+        m = session.turns[g - base]
+        html = line_html(m["role"], m["content"], m["ts"])
+        if m["role"] == "assistant" and m.get("thought"):
+            html += ("<details class='reasoning'><summary>Ver razonamiento</summary>"
+                     f"<div style='font-size:16px; opacity:0.85; margin-left:20px'>{m['thought']}</div></details>")
+        parts.append((g, html)); changed = True
+    cache["next"] = max(cache["next"], cut)
+    if changed:
+        cache["html"] = "\n".join(h for _, h in parts)
+    if parts:
+        with st.expander(f"Mensajes anteriores ({len(parts)})", expanded=False):
+            st.markdown(cache["html"], unsafe_allow_html=True)
+
+    for g in range(cut, base + n):
+        m = session.turns[g - base]
+        render_line(m["role"], m["content"], m["ts"])
+        if m["role"] == "assistant" and m.get("thought"):
+            with st.expander("Ver razonamiento", expanded=False):
+                st.markdown(
+                    f"<div style='font-size:16px; opacity:0.85; margin-left:20px'>"
+                    f"{m['thought']}</div>",
+                    unsafe_allow_html=True
+                )
+
 
 def typewriter(container, text: str, delay: float = 0.01):
     """Efecto de tipeo en tiempo real."""
@@ -135,53 +222,22 @@ def _intent_is_new_playlist(text: str) -> bool:
            and any(kw in t for kw in ["playlist","lista","canciones"])
 
 
-def _playlist_summary_text(results: list[dict]) -> Optional[str]:
+def _playlist_summary_text(results: list[ToolResult]) -> Optional[str]:
     url = None
     added = None
     for r in results or []:
-        if r.get("server") != "spotify" or not r.get("ok"):
+        if r.server != "spotify" or not r.ok:
             continue
-
-        if r.get("tool") in ("create_playlist", "build_playlist_from_profile", "create_playlist_with_tracks"):
-            data = (r.get("result") or {}).get("parsed")
-            if not data:
-                raw = (r.get("result") or {}).get("_text")
-                try:
-                    data = json.loads(raw) if raw else None
-                except Exception:
-                    data = None
-            if isinstance(data, dict):
-                url = data.get("url") or url
-                if data.get("added") is not None:
-                    added = data["added"]
-
-        if r.get("tool") == "add_to_playlist":
-            data = (r.get("result") or {}).get("parsed")
-            if not data:
-                raw = (r.get("result") or {}).get("_text")
-                try:
-                    data = json.loads(raw) if raw else None
-                except Exception:
-                    data = None
-            if isinstance(data, dict) and data.get("added") is not None:
-                added = data["added"]
+        if r.tool in ("create_playlist", "build_playlist_from_profile", "create_playlist_with_tracks"):
+            url = r.url or url
+        if r.tool in ("create_playlist", "build_playlist_from_profile", "create_playlist_with_tracks", "add_to_playlist") \
+                and r.added is not None:
+            added = r.added
 
     if url:
         return f"✅ Creé tu playlist y agregué {added} canciones: {url}" if added is not None else f"✅ Creé tu playlist: {url}"
     return None
 
-def _parse_ndjson_objects(raw: str) -> list[dict]:
-    """Convierte NDJSON (o JSONs pegados) a lista de dicts."""
-    objs = []
-    if not raw: 
-        return objs
-    for m in re.finditer(r'\{.*?\}(?=\s*\{|\s*$)', raw, flags=re.S):
-        try:
-            objs.append(json.loads(m.group(0)))
-        except Exception:
-            pass
-    return objs
-
 def _extract_count(text: str) -> Optional[int]:
 
     if not text:
@@ -215,10 +271,8 @@ def _extract_count(text: str) -> Optional[int]:
 def _whoami() -> dict:
     res = execute_plan_blocking([{"server":"spotify","tool":"whoami","args":{}}])
     for r in res:
-        if r.get("server")=="spotify" and r.get("tool")=="whoami" and r.get("ok"):
-            data = (r.get("result") or {}).get("structuredContent", {}) or {}
-            data = data.get("result") or {}
-            return data if isinstance(data, dict) else {"authed": False}
+        if r.server=="spotify" and r.tool=="whoami" and r.ok:
+            return r.data if isinstance(r.data, dict) else {"authed": False}
     return {"authed": False}
 
 params = st.query_params if hasattr(st, "query_params") else st.experimental_get_query_params()
@@ -231,6 +285,7 @@ if code_in_url:
         st.query_params.clear()
     else:
         st.experimental_set_query_params()
+    _set_query_sid(st.session_state.sid)
 
 who = _whoami()
 if not who.get("authed") and st.session_state.get("last_auth_url"):
@@ -241,19 +296,11 @@ if not who.get("authed"):
         ab = execute_plan_blocking([{"server":"spotify","tool":"auth_begin","args":{}}])
         auth_url = None
         for r in ab:
-            if r.get("server")=="spotify" and r.get("tool")=="auth_begin" and r.get("ok"):
-                res = r.get("result") or {}
-
-                sc = (res.get("structuredContent") or {}).get("result")
-                if isinstance(sc, dict) and sc.get("authorize_url"):
-                    auth_url = sc["authorize_url"]
-                else:
-                    raw = res.get("_text") or ""
-                    try:
-                        auth_url = json.loads(raw).get("authorize_url")
-                    except Exception:
-                        m = re.search(r'https?://[^"\s]+', raw)
-                        auth_url = m.group(0) if m else None
+            if r.server=="spotify" and r.tool=="auth_begin" and r.ok:
+                auth_url = r.authorize_url
+                if not auth_url and isinstance(r.data, str):
+                    m = re.search(r'https?://[^"\s]+', r.data)
+                    auth_url = m.group(0) if m else None
 
         if auth_url:
             st.session_state["last_auth_url"] = auth_url
@@ -263,31 +310,23 @@ else:
     st.success(f"Conectado como {user_label}")
 
 # ===== Render historial =====
-for m in st.session_state.messages:
-    render_line(m["role"], m["content"], m["ts"])
-    if m["role"] == "assistant" and m.get("thought"):
-        with st.expander("Ver razonamiento", expanded=False):
-            st.markdown(
-                f"<div style='font-size:16px; opacity:0.85; margin-left:20px'>"
-                f"{m['thought']}</div>",
-                unsafe_allow_html=True
-            )
+render_history(st.session_state.messages)
 
 # ===== Input =====
 user_msg = st.chat_input("escribe tu mensaje…", key="main_chat")
 
 if user_msg:
     now = datetime.now()
-    st.session_state.messages.append({"role":"user","content":user_msg,"ts":now})
+    st.session_state.messages.add("user", user_msg, ts=now)
     render_line("user", user_msg, now)
 
     lower_msg = (user_msg or "").strip().lower()
     requested_n = _extract_count(lower_msg)
     if requested_n is not None:
-        st.session_state.music_ctx["target_count"] = requested_n
+        st.session_state.music_ctx["basket"].target = requested_n
 
     if _intent_is_new_playlist(lower_msg):
-        st.session_state.music_ctx["basket_track_ids"] = []
+        st.session_state.music_ctx["basket"].clear(keep_target=True)
         st.session_state.music_ctx["last_playlist_name"] = _extract_name(user_msg) or "Mi Mix"
         st.session_state.music_ctx["last_public"] = None
         st.session_state.music_ctx["last_playlist_id"] = None
@@ -332,79 +371,69 @@ if user_msg:
                 typing_box.markdown(f'<div class="line"><span class="tag">[{HOST}]</span>{out}</div>', unsafe_allow_html=True)
                 time.sleep(0.01)
             now2 = datetime.now()
-            st.session_state.messages.append({"role":"assistant","content":final_text,"thought":"","ts":now2})
+            st.session_state.messages.add("assistant", final_text, thought="", ts=now2)
             log_mcp({"event":"llm_exchange","user": user_msg,"assistant": final_text,"thought": "","actions": [],"execution_results": []})
+            _persist_state()
             st.stop()
 
 
-    # === Planificación
-    try:
-        plan = plan_llm(user_msg, st.session_state.messages)
-    except Exception:
-        plan = fallback_plan(user_msg)
+    # === Planificación + ejecución: router local para intenciones comunes; si no, planner LLM en
+    #     streaming (cada acción se ejecuta apenas llega, con prefetch especulativo en paralelo)
+    execution_results = []
+    t_route = time.perf_counter()
+    plan = route(user_msg, st.session_state.music_ctx, who.get("authed"))
+    if plan:
+        log_mcp({"event":"mcp_route", "route": plan["route"], "router_ms": round((time.perf_counter() - t_route) * 1000, 3)})
+        actions = fix_plan(plan.get("actions", []))
+        if actions:
+            execution_results = execute_plan_blocking(actions)
+    else:
+        spec = speculate(user_msg, who)
+        transcript = st.session_state.messages.get_context(facts_from_music_ctx(st.session_state.music_ctx))
+        plan, actions, execution_results = run_turn_blocking(user_msg, st.session_state.messages, spec, transcript)
+        if spec:
+            log_mcp({"event":"mcp_prefetch", "speculated": spec.actions, "hits": len(spec.hits), **prefetch_stats()})
 
     thought = plan.get("thought","")
-    actions = fix_plan(plan.get("actions", []))
     reply_preview = plan.get("reply_preview","Procesando...")
 
     if thought:
         with reasoning_box.expander("Ver razonamiento", expanded=False):
             st.markdown(f"<div style='font-size:16px; opacity:0.85; margin-left:20px'>{thought}</div>", unsafe_allow_html=True)
 
-    # === Ejecución herramientas
-    execution_results = []
+    # === Resultados de herramientas
     if actions:
         log_mcp({"event":"mcp_plan", "actions": actions})
-        execution_results = execute_plan_blocking(actions)
         for r in execution_results or []:
-            if r.get("server") == "spotify" and r.get("ok"):
-                if r.get("tool") == "search_track":
-                    data = (r.get("result") or {}).get("parsed") or None
-                    if not data:
-                        raw = (r.get("result") or {}).get("_text")
-                        try: data = json.loads(raw) if raw else None
-                        except: data = None
-                    if isinstance(data, dict) and data.get("id"):
-                        tid = data["id"]
-                        if tid not in st.session_state.music_ctx["basket_track_ids"]:
-                            st.session_state.music_ctx["basket_track_ids"].append(tid)
-                if r.get("tool") == "get_recommendations":
-                    res = r.get("result") or {}
-                    items = (res.get("structuredContent") or {}).get("result")
-                    if not isinstance(items, list):
-                            raw = res.get("_text") or ""
-                            items = _parse_ndjson_objects(raw)  # << aquí
-                    for t in (items or []):
-                        tid = t.get("id") if isinstance(t, dict) else None
-                        if tid and tid not in st.session_state.music_ctx["basket_track_ids"]:
-                            st.session_state.music_ctx["basket_track_ids"].append(tid)
+            if r.server == "spotify" and r.ok:
+                if r.tool == "search_track" and r.tracks:
+                    st.session_state.music_ctx["basket"].add_track(r.tracks[0])   # pedida explícitamente
+                if r.tool == "get_recommendations":
+                    if r.args.get("mood"):
+                        st.session_state.music_ctx["last_mood"] = r.args["mood"]
+                    st.session_state.music_ctx["basket"].add_tracks(r.tracks)
 
                 # si el plan ya creó playlist con tracks, registra y limpia canasta
-                if r.get("tool") in ("create_playlist","build_playlist_from_profile","create_playlist_with_tracks"):
-                    data = (r.get("result") or {}).get("parsed") or None
-                    if not data:
-                        raw = (r.get("result") or {}).get("_text")
-                        try: data = json.loads(raw) if raw else None
-                        except: data = None
-                    if isinstance(data, dict) and data.get("url"):
-                        st.session_state.music_ctx["last_playlist_url"] = data["url"]
-                        st.session_state.music_ctx["last_playlist_id"]  = data.get("playlist_id")
+                if r.tool in ("create_playlist","build_playlist_from_profile","create_playlist_with_tracks"):
+                    if r.url:
+                        st.session_state.music_ctx["last_playlist_url"] = r.url
+                        st.session_state.music_ctx["last_playlist_id"]  = r.playlist_id
                         name_key = _slug(st.session_state.music_ctx.get("last_playlist_name") or "mi mix")
                         st.session_state.music_ctx["playlists"][name_key] = {
-                            "id": data.get("playlist_id"),
-                            "url": data["url"],
+                            "id": r.playlist_id,
+                            "url": r.url,
                             "created_at": datetime.now().isoformat()
                         }
                         st.session_state.music_ctx["last_created_key"] = name_key
-                        st.session_state.music_ctx["basket_track_ids"] = []
-                        st.session_state.music_ctx["target_count"] = None
+                        st.session_state.music_ctx["basket"].clear()
 
 
     # === Auto-creación POST–ejecución 
-    target = st.session_state.music_ctx.get("target_count")
-    basket_len = len(st.session_state.music_ctx["basket_track_ids"])
-    if target is not None and basket_len < target and _is_playlist_intent(user_msg):
-        faltan = target - basket_len
+    basket = st.session_state.music_ctx["basket"]
+    target = basket.target
+    basket_len = len(basket)
+    if basket.missing and _is_playlist_intent(user_msg):
+        faltan = basket.missing
         final_text = f"✔️ Llevo {basket_len} canciones. Me faltan {faltan} para llegar a {target}. ¿Quieres que añada recomendaciones para completar?"
         out = ""
         for ch in final_text:
@@ -412,22 +441,20 @@ if user_msg:
             typing_box.markdown(f'<div class="line"><span class="tag">[{HOST}]</span>{out}</div>', unsafe_allow_html=True)
             time.sleep(0.01)
         now2 = datetime.now()
-        st.session_state.messages.append({"role":"assistant","content":final_text,"thought":thought,"ts":now2})
+        st.session_state.messages.add("assistant", final_text, thought=thought, ts=now2)
         log_mcp({"event":"llm_exchange","user": user_msg,"assistant": final_text,"thought": thought,"actions": actions,"execution_results": execution_results})
+        _persist_state()
         st.stop()
 
     needs_auto_playlist_post = (
         _is_playlist_intent(user_msg)
         and not any(a.get("server")=="spotify" and a.get("tool") in ("create_playlist","create_playlist_with_tracks","build_playlist_from_profile") for a in actions)
-        and (
-            (target is None and basket_len >= 1) or
-            (target is not None and basket_len >= target)
-        )
+        and basket.ready
     )
 
 
     if needs_auto_playlist_post:
-        n = len(st.session_state.music_ctx["basket_track_ids"])
+        n = len(basket)
         hhmm = datetime.now().strftime("%H:%M")
         base = st.session_state.music_ctx.get("last_playlist_name") or "Mi Mix"
         base_key = _slug(base)
@@ -437,8 +464,7 @@ if user_msg:
             name_guess = f"{base} • {hhmm}"
        
 
-        count = target or len(st.session_state.music_ctx["basket_track_ids"])
-        track_ids = st.session_state.music_ctx["basket_track_ids"][:count]
+        track_ids = basket.take(target)
 
         pl_actions = [{
             "server": "spotify",
@@ -453,32 +479,34 @@ if user_msg:
         pl_results = execute_plan_blocking(pl_actions)
         execution_results += pl_results
         for r in pl_results:
-            if r.get("server")=="spotify" and r.get("tool")=="create_playlist_with_tracks" and r.get("ok"):
-                data = (r.get("result") or {}).get("parsed") or None
-                if not data:
-                    raw = (r.get("result") or {}).get("_text")
-                    try: data = json.loads(raw) if raw else None
-                    except: data = None
-                if isinstance(data, dict) and data.get("url"):
-                    st.session_state.music_ctx["last_playlist_url"] = data["url"]
-                    st.session_state.music_ctx["last_playlist_id"]  = data.get("playlist_id")
+            if r.server=="spotify" and r.tool=="create_playlist_with_tracks" and r.ok:
+                if r.url:
+                    st.session_state.music_ctx["last_playlist_url"] = r.url
+                    st.session_state.music_ctx["last_playlist_id"]  = r.playlist_id
                     st.session_state.music_ctx["last_playlist_name"] = name_guess
                     key = _slug(name_guess)
                     st.session_state.music_ctx["playlists"][key] = {
-                        "id": data.get("playlist_id"),
-                        "url": data["url"],
+                        "id": r.playlist_id,
+                        "url": r.url,
                         "created_at": datetime.now().isoformat()
                     }
                     st.session_state.music_ctx["last_created_key"] = key
-                    st.session_state.music_ctx["basket_track_ids"] = []
-                    st.session_state.music_ctx["target_count"] = None 
+                    basket.clear()
 
     summary = _playlist_summary_text(execution_results)
     if summary:
         final_text = summary
+    elif plan.get("route") and not actions:
+        final_text = reply_preview
     else:
         guard = "Nota del sistema: si no hay URL de playlist, no afirmes que fue creada."
-        final_text = finalize_llm(guard + "\n\n" + user_msg, execution_results) if actions else (ask_llm(user_msg) if ask_llm else reply_preview or "Listo.")
+        if actions:
+            final_text = finalize_llm(guard + "\n\n" + user_msg, execution_results)
+        elif ask_llm:
+            # misma ventana con presupuesto de tokens que usa el planner
+            final_text = ask_llm(user_msg, st.session_state.messages.get_context(facts_from_music_ctx(st.session_state.music_ctx)))
+        else:
+            final_text = reply_preview or "Listo."
 
     out = ""
     for ch in final_text:
@@ -486,20 +514,22 @@ if user_msg:
         typing_box.markdown(f'<div class="line"><span class="tag">[{HOST}]</span>{out}</div>', unsafe_allow_html=True)
         time.sleep(0.01)
 
-    is_music_turn = any(r.get("server")=="spotify" for r in execution_results) or any(
+    is_music_turn = any(r.server=="spotify" for r in execution_results) or any(
         kw in (user_msg or "").lower() for kw in ("canciones","temas","playlist","rock","pop","lofi","jazz","nublado","rainy","calm")
     )
     if is_music_turn:
         st.write("")
         c1, c2, c3, c4 = st.columns(4)
         if c1.button("Dame 5 más"):
-            st.session_state.music_ctx["target_count"] = (st.session_state.music_ctx.get("target_count") or len(st.session_state.music_ctx["basket_track_ids"])) + 5
-            st.session_state.messages.append({"role":"user","content":"Dame 5 más del mismo estilo","ts":datetime.now()})
+            st.session_state.music_ctx["basket"].target = (st.session_state.music_ctx["basket"].target or len(st.session_state.music_ctx["basket"])) + 5
+            st.session_state.messages.add("user", "Dame 5 más del mismo estilo")
+            _persist_state()
             st.rerun()
-        if c2.button("Más clásico"): st.session_state.messages.append({"role":"user","content":"Quiero más clásico de este estilo","ts":datetime.now()}); st.rerun()
-        if c3.button("Más moderno"): st.session_state.messages.append({"role":"user","content":"Quiero más moderno de este estilo","ts":datetime.now()}); st.rerun()
-        if c4.button("Solo instrumentales"): st.session_state.messages.append({"role":"user","content":"Dame solo instrumentales del mismo estilo","ts":datetime.now()}); st.rerun()
+        if c2.button("Más clásico"): st.session_state.messages.add("user", "Quiero más clásico de este estilo"); _persist_state(); st.rerun()
+        if c3.button("Más moderno"): st.session_state.messages.add("user", "Quiero más moderno de este estilo"); _persist_state(); st.rerun()
+        if c4.button("Solo instrumentales"): st.session_state.messages.add("user", "Dame solo instrumentales del mismo estilo"); _persist_state(); st.rerun()
 
     now2 = datetime.now()
-    st.session_state.messages.append({"role":"assistant","content":final_text,"thought":thought,"ts":now2})
+    st.session_state.messages.add("assistant", final_text, thought=thought, ts=now2)
     log_mcp({"event":"llm_exchange","user": user_msg,"assistant": final_text,"thought": thought,"actions": actions,"execution_results": execution_results})
+    _persist_state()
@@ -0,0 +1,95 @@
+# basket.py
+"""
+Canasta de pistas para la próxima playlist.
+
+Conjunto con orden de inserción (dict) → pertenencia y alta en O(1), sin
+duplicados. Un lote de recomendaciones (add_tracks) no repite artista más de
+BASKET_MAX_PER_ARTIST veces (0 = sin tope); el tope es por lote, no por canasta,
+así las canciones pedidas explícitamente (search_track) no le quitan lugar a las
+recomendaciones y la canasta llega al objetivo. El server ya diversifica cada
+respuesta; esto cubre lotes que vienen de otras tools.
+El objetivo de la playlist (target) vive aquí, así el progreso es O(1).
+
+    BASKET_MAX_PER_ARTIST=1
+"""
+import os
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+MAX_PER_ARTIST = int(os.getenv("BASKET_MAX_PER_ARTIST", "1"))
+
+
+def main_artist(track: Dict[str, Any]) -> str:
+    """Misma clave que el server (diversity.main_artist): nombre del primer artista en minúsculas."""
+    return ((track.get("artists") or [{}])[0].get("name") or "").strip().lower()
+
+
+class Basket:
+    __slots__ = ("ids", "target", "max_per_artist")
+
+    def __init__(self, max_per_artist: int = MAX_PER_ARTIST):
+        self.ids: Dict[str, str] = {}        # track_id → artista principal, en orden de llegada
+        self.target: Optional[int] = None
+        self.max_per_artist = max_per_artist
+
+    def add(self, track_id: str, artist: str = "") -> bool:
+        """Agrega la pista si no está. True si entró."""
+        if not track_id or track_id in self.ids:
+            return False
+        self.ids[track_id] = artist
+        return True
+
+    def add_track(self, track: Dict[str, Any]) -> bool:
+        return self.add(track.get("id"), main_artist(track))
+
+    def add_tracks(self, tracks: Iterable[Dict[str, Any]]) -> int:
+        """Agrega un lote con a lo sumo max_per_artist pistas por artista principal. Devuelve cuántas entraron."""
+        per_artist: Dict[str, int] = {}
+        added = 0
+        for t in tracks:
+            artist = main_artist(t)
+            if artist and self.max_per_artist and per_artist.get(artist, 0) >= self.max_per_artist:
+                continue
+            if self.add(t.get("id"), artist):
+                per_artist[artist] = per_artist.get(artist, 0) + 1
+                added += 1
+        return added
+
+    def take(self, n: Optional[int] = None) -> List[str]:
+        """Primeras n pistas (todas si n es None)."""
+        return list(self.ids) if n is None else list(islice(self.ids, n))
+
+    def clear(self, keep_target: bool = False) -> None:
+        self.ids.clear()
+        if not keep_target:
+            self.target = None
+
+    @property
+    def missing(self) -> int:
+        """Pistas que faltan para el objetivo (0 si no hay objetivo o ya se alcanzó)."""
+        return max(0, self.target - len(self.ids)) if self.target is not None else 0
+
+    @property
+    def ready(self) -> bool:
+        """Hay pistas y se llegó al objetivo (o no hay objetivo)."""
+        return bool(self.ids) and self.missing == 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, track_id: object) -> bool:
+        return track_id in self.ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"ids": [[t, a] for t, a in self.ids.items()], "target": self.target}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]], **kw) -> "Basket":
+        b = cls(**kw)
+        for t, a in (data or {}).get("ids") or []:
+            b.add(t, a)
+        b.target = (data or {}).get("target")
+        return b
@@ -0,0 +1,359 @@
+# bench_replay.py
+"""
+Benchmark end-to-end: re-ejecuta los planes reales de logs/*.jsonl (eventos mcp_plan)
+con fix_plan + execute_plan contra stand-ins locales, sin red ni credenciales.
+
+    python bench_replay.py --out bench_baseline.json
+    python bench_replay.py --compare bench_baseline.json --tolerance 0.25
+
+Stand-ins: Spotify real con SPOTIFY_TRANSPORT=fake, Filesystem/Git en bench_standins/
+(paths reescritos a un directorio temporal), LoL real con Data Dragon simulado y
+Movies/Time como servidores JSON-RPC HTTP locales con respuestas fijas.
+Con --llm el turno completo pasa por pipeline.run_turn (planner en streaming +
+tools + prefetch) y finalize_llm usando el backend "replay" de llm_backends
+(respuestas grabadas, latencia configurable).
+Reporta percentiles por turno, costo de arranque de cada server MCP, tiempo por
+tool y memoria, y escribe un baseline JSON comparable entre versiones.
+"""
+import os, re, sys, glob, json, time, asyncio, argparse, tempfile, threading, statistics, subprocess, tracemalloc, platform
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+STANDINS = os.path.join(HERE, "bench_standins")
+
+
+# ---------- stand-ins HTTP (movies / time) ----------
+_CANNED = {
+    "search_movie": {"title": "Interstellar", "year": 2014, "rating": 8.4, "overview": "Viaje a través de un agujero de gusano.",
+                     "genres": ["Science Fiction", "Drama"], "streaming": ["Netflix"]},
+    "get_random_movie": {"title": "Amélie", "year": 2001, "rating": 7.9},
+    "get_movie_recommendations": {"recommendations": [{"title": t, "rating": r} for t, r in
+                                  (("Arrival", 7.6), ("Blade Runner 2049", 7.5), ("Dune", 7.8), ("Gattaca", 7.5))]},
+    "current_time": {"result": "2025-09-23 00:00:00 UTC"},
+}
+
+
+class _RpcStub(BaseHTTPRequestHandler):
+    latency_s = 0.0
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        time.sleep(self.latency_s)
+        if req.get("method") == "initialize":
+            out = {"jsonrpc": "2.0", "id": req.get("id"), "result": {"status": "ok"}}
+        else:
+            name = (req.get("params") or {}).get("name")
+            res = _CANNED.get(name)
+            out = {"jsonrpc": "2.0", "id": req.get("id")}
+            out.update({"result": {"content": [{"type": "text", "text": json.dumps(res, ensure_ascii=False)}]}} if res
+                       else {"error": {"code": -32601, "message": f"Tool {name} not found"}})
+        body = json.dumps(out).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *a):
+        pass
+
+
+def _start_http_stub(latency_ms: float) -> str:
+    _RpcStub.latency_s = latency_ms / 1000.0
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _RpcStub)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{srv.server_address[1]}/mcp/jsonrpc"
+
+
+# ---------- entorno ----------
+def _setup_env(args, tmp: str) -> None:
+    env = os.environ
+    env["MCP_SPOTIFY_ENTRY"] = os.path.join(ROOT, "mcp", "spotify", "server.py")
+    env["MCP_FS_ENTRY"] = os.path.join(STANDINS, "fs_server.py")
+    env["MCP_GIT_ENTRY"] = os.path.join(STANDINS, "git_server.py")
+    env["MCP_LOL_ENTRY"] = os.path.join(STANDINS, "lol_server.py")
+    url = _start_http_stub(args.http_latency_ms)
+    env["MCP_MOVIES_HTTP_URL"] = url
+    env["MCP_REMOTE_URL"] = url
+    env["SPOTIFY_TRANSPORT"] = "fake"
+    env["MCP_PREFETCH"] = "false" if args.no_prefetch else "true"
+    env["SPOTIFY_FAKE_LATENCY_MS"] = str(args.spotify_latency_ms)
+    env["SPOTIFY_FAKE_SEED"] = str(args.seed)
+    env["SPOTIFY_FEATURE_DB"] = os.path.join(tmp, "features.sqlite3")
+    env["SPOTIFY_TRACK_INDEX"] = os.path.join(tmp, "track_index.json.gz")
+    env["SPOTIFY_MOOD_INDEX"] = os.path.join(tmp, "mood_index.json")
+    for k in ("SPOTIFY_APP_RATE", "SPOTIFY_APP_BURST", "SPOTIFY_USER_RATE", "SPOTIFY_USER_BURST"):
+        env.setdefault(k, "10000")
+
+
+_WIN_ABS = re.compile(r"^[A-Za-z]:[\\/]")
+
+
+def _parts(p: str) -> List[str]:
+    return [x for x in re.split(r"[\\/]+", _WIN_ABS.sub("", str(p))) if x not in ("", ".", "..")]
+
+
+def _is_abs(p: str) -> bool:
+    return bool(_WIN_ABS.match(str(p))) or str(p).startswith(("/", "\\"))
+
+
+def _sandbox_path(p: str, root: str) -> str:
+    """Lleva un path del log (Windows/POSIX, absoluto o relativo) a un path dentro de root."""
+    return os.path.join(root, "abs" if _is_abs(p) else "cwd", *_parts(p))
+
+
+def _sandbox(actions: List[Dict[str, Any]], root: str) -> List[Dict[str, Any]]:
+    out = []
+    for a in actions:
+        args = dict(a.get("args") or {})
+        for k in ("path", "repo_path"):
+            if args.get(k):
+                args[k] = _sandbox_path(args[k], root)
+        if isinstance(args.get("files"), list):
+            # git_add: los relativos son relativos al repo, no al cwd del proceso
+            repo = args.get("repo_path") or _sandbox_path(".", root)
+            args["files"] = [_sandbox_path(f, root) if _is_abs(f) else os.path.join(repo, *_parts(f))
+                             for f in args["files"]]
+        out.append({**a, "args": args})
+    return out
+
+
+def load_turns(pattern: str) -> List[List[Dict[str, Any]]]:
+    turns = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    continue
+                if ev.get("event") == "mcp_plan" and ev.get("actions"):
+                    turns.append(ev["actions"])
+    return turns
+
+
+# ---------- medición ----------
+def _pct(xs: List[float], p: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, max(0, int(round(p / 100.0 * len(xs) + 0.5)) - 1))], 2)
+
+
+def _summary(xs: List[float]) -> Dict[str, float]:
+    return {"n": len(xs), "p50": _pct(xs, 50), "p90": _pct(xs, 90), "p95": _pct(xs, 95), "p99": _pct(xs, 99),
+            "max": round(max(xs), 2) if xs else 0.0, "mean": round(statistics.fmean(xs), 2) if xs else 0.0}
+
+
+async def _stdio_startup_ms(cmd: str, args: List[str]) -> float:
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+    t0 = time.perf_counter()
+    async with stdio_client(StdioServerParameters(command=cmd, args=args, env={**os.environ, "NO_COLOR": "1"})) as (r, w):
+        async with ClientSession(r, w) as s:
+            await s.initialize()
+            return (time.perf_counter() - t0) * 1000
+
+
+def measure_startup(mc, repeat: int, tmp: str) -> Dict[str, Dict[str, float]]:
+    repo = os.path.join(tmp, "startup-repo")
+    os.makedirs(repo, exist_ok=True)
+    servers = {
+        "spotify": (mc.SPOTIFY_SERVER_CMD, mc.SPOTIFY_SERVER_ARGS),
+        "filesystem": (mc.FS_SERVER_CMD, [*mc.FS_SERVER_ARGS, tmp]),
+        "git": (mc.GIT_SERVER_CMD, [*mc.GIT_SERVER_ARGS, "--repository", repo]),
+    }
+    out = {}
+    for name, (cmd, args) in servers.items():
+        xs = []
+        for _ in range(repeat):
+            try:
+                xs.append(asyncio.run(_stdio_startup_ms(cmd, args)))
+            except Exception as e:
+                print(f"⚠️ startup {name}: {e}", file=sys.stderr)
+        out[name] = _summary(xs)
+    xs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        lc = mc.LolLineClient(mc.LOL_SERVER_CMD, mc.LOL_SERVER_ARGS)
+        try:
+            lc.start()
+            xs.append((time.perf_counter() - t0) * 1000)
+        finally:
+            if lc.proc:
+                lc.proc.kill()
+    out["lol"] = _summary(xs)
+    return out
+
+
+def _children_maxrss_kb() -> Optional[int]:
+    try:
+        import resource
+        kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return kb // 1024 if sys.platform == "darwin" else kb
+    except Exception:
+        return None
+
+
+def _version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def run(args) -> Dict[str, Any]:
+    tmp = tempfile.mkdtemp(prefix="moodst-bench-")
+    _setup_env(args, tmp)
+    sys.path.insert(0, HERE)
+    import mcp_client as mc
+    import prefetch
+
+    llm = None
+    if args.llm:
+        os.environ["LLM_BACKEND"] = "replay"
+        import llm
+        import pipeline
+        from llm_backends import ReplayBackend
+
+        class SandboxedReplay(ReplayBackend):
+            root = tmp
+
+            def _text(self, role, prompt, user_msg):
+                text = super()._text(role, prompt, user_msg)
+                if role != "planner":
+                    return text
+                data = json.loads(text)
+                data["actions"] = _sandbox(data["actions"], self.root)
+                return json.dumps(data, ensure_ascii=False)
+
+        rb = llm.set_backend(SandboxedReplay(pattern=args.logs, latency_ms=args.llm_latency_ms, seed=args.seed))
+        turns = [(t["user"], t["actions"]) for t in rb.turns if t["actions"]][: args.limit or None]
+    else:
+        turns = [(None, a) for a in load_turns(args.logs)][: args.limit or None]
+    if not turns:
+        raise SystemExit(f"No hay eventos mcp_plan en {args.logs}")
+    sandbox = os.path.join(tmp, "fs")
+    os.makedirs(os.path.join(sandbox, "cwd"), exist_ok=True)
+    os.chdir(os.path.join(sandbox, "cwd"))  # red de seguridad: un path relativo que _sandbox no reescriba cae aquí
+
+    turn_ms, peak_kb, fix_ms, plan_ms, final_ms = [], [], [], [], []
+    tools: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    ok = total = 0
+    for rep in range(args.repeat):
+        for i, (user, actions) in enumerate(turns):
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            if llm:
+                rb.root = os.path.join(sandbox, f"r{rep}")
+                _, fixed, results = asyncio.run(pipeline.run_turn(user, [], prefetch.speculate(user)))
+                plan_ms.append((time.perf_counter() - t0) * 1000)
+            else:
+                fixed = mc.fix_plan(_sandbox(actions, os.path.join(sandbox, f"r{rep}")))
+                fix_ms.append((time.perf_counter() - t0) * 1000)
+                results = asyncio.run(mc.execute_plan(fixed))
+            if llm:
+                t3 = time.perf_counter()
+                llm.finalize_llm(user, results)
+                final_ms.append((time.perf_counter() - t3) * 1000)
+            t2 = time.perf_counter()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            turn_ms.append((t2 - t0) * 1000)
+            peak_kb.append(peak / 1024)
+            for r in results:
+                key = f"{r.server}.{r.tool}"
+                tools.setdefault(key, []).append(r.elapsed_ms)
+                total += 1
+                if r.ok:
+                    ok += 1
+                else:
+                    errors[key] = errors.get(key, 0) + 1
+            if args.verbose:
+                print(f"turn {rep}:{i} {len(fixed)} acciones {turn_ms[-1]:.0f} ms")
+
+    return {
+        "version": _version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "verbose")},
+        "turns": _summary(turn_ms),
+        "fix_plan_ms": _summary(fix_ms),
+        "llm_ms": {"plan_and_tools": _summary(plan_ms), "finalize": _summary(final_ms),
+                   "backend": llm.backend().snapshot(), "prefetch": prefetch.prefetch_stats()} if llm else {},
+        "startup_ms": measure_startup(mc, args.startup_repeat, tmp) if args.startup_repeat else {},
+        "tools_ms": {k: _summary(v) for k, v in sorted(tools.items())},
+        "memory": {"client_peak_kb": _summary(peak_kb), "children_maxrss_kb": _children_maxrss_kb()},
+        "results": {"total": total, "ok": ok, "errors_by_tool": errors},
+    }
+
+
+def compare(cur: Dict[str, Any], base: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regresiones (p50/p95) mayores a `tolerance` respecto del baseline."""
+    out = []
+
+    def check(label, new, old):
+        if old and new > old * (1 + tolerance):
+            out.append(f"{label}: {old:.1f} → {new:.1f} ms (+{(new / old - 1) * 100:.0f}%)")
+
+    for p in ("p50", "p95"):
+        check(f"turns.{p}", cur["turns"][p], base.get("turns", {}).get(p, 0))
+        for name, s in cur.get("startup_ms", {}).items():
+            check(f"startup.{name}.{p}", s[p], base.get("startup_ms", {}).get(name, {}).get(p, 0))
+    for name, s in cur["tools_ms"].items():
+        check(f"tools.{name}.p50", s["p50"], base.get("tools_ms", {}).get(name, {}).get("p50", 0))
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Replay de planes MCP de logs/ contra stand-ins locales.")
+    ap.add_argument("--logs", default=os.path.join(HERE, "logs", "*.jsonl"))
+    ap.add_argument("--limit", type=int, default=0, help="máximo de turnos (0 = todos)")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--startup-repeat", type=int, default=3)
+    ap.add_argument("--spotify-latency-ms", type=float, default=50.0)
+    ap.add_argument("--http-latency-ms", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--llm", action="store_true", help="incluir plan_llm/finalize_llm con el backend replay")
+    ap.add_argument("--llm-latency-ms", type=float, default=0.0, help="latencia simulada por llamada al LLM")
+    ap.add_argument("--no-prefetch", action="store_true", help="desactiva el prefetch especulativo (con --llm)")
+    ap.add_argument("--out", default="", help="escribe el baseline JSON")
+    ap.add_argument("--compare", default="", help="baseline previo para detectar regresiones")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args(argv)
+    args.out, args.compare = (os.path.abspath(x) if x else x for x in (args.out, args.compare))
+
+    rep = run(args)
+    t = rep["turns"]
+    print(f"turnos={t['n']} p50={t['p50']}ms p95={t['p95']}ms max={t['max']}ms "
+          f"ok={rep['results']['ok']}/{rep['results']['total']}")
+    if rep["llm_ms"]:
+        print(f"  prefetch {rep['llm_ms']['prefetch']}")
+    for stage, s in rep["llm_ms"].items():
+        if stage not in ("backend", "prefetch"):
+            print(f"  llm {stage:14} p50={s['p50']}ms p95={s['p95']}ms")
+    for name, s in rep["startup_ms"].items():
+        print(f"  startup {name:12} p50={s['p50']}ms")
+    for name, s in rep["tools_ms"].items():
+        print(f"  {name:45} n={s['n']:<4} p50={s['p50']}ms p95={s['p95']}ms")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2, ensure_ascii=False)
+        print(f"✅ baseline en {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(rep, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"❌ regresión {r}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,31 @@
+# fs_server.py
+"""Stand-in local del Filesystem MCP (create_directory / write_file) para el benchmark de replay."""
+import os, sys
+from mcp.server.fastmcp import FastMCP
+
+mcp = FastMCP("filesystem-standin")
+ALLOWED = [os.path.realpath(p) for p in sys.argv[1:]]
+
+
+def _check(path: str) -> str:
+    real = os.path.realpath(path)
+    if ALLOWED and not any(real == d or real.startswith(d + os.sep) for d in ALLOWED):
+        raise PermissionError(f"Access denied - path outside allowed directories: {real}")
+    return real
+
+
+@mcp.tool()
+def create_directory(path: str) -> str:
+    os.makedirs(_check(path), exist_ok=True)
+    return f"Successfully created directory {path}"
+
+
+@mcp.tool()
+def write_file(path: str, content: str) -> str:
+    with open(_check(path), "w", encoding="utf-8") as f:
+        f.write(content)
+    return f"Successfully wrote to {path}"
+
+
+if __name__ == "__main__":
+    mcp.run()
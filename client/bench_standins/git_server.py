@@ -0,0 +1,36 @@
+# git_server.py
+"""Stand-in local de mcp_server_git (git_init / git_add / git_commit) sobre la CLI de git."""
+import subprocess
+from typing import List
+from mcp.server.fastmcp import FastMCP
+
+mcp = FastMCP("git-standin")
+
+
+def _git(repo_path: str, *args: str) -> str:
+    cp = subprocess.run(["git", *args], cwd=repo_path, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if cp.returncode:
+        raise RuntimeError(cp.stdout.strip())
+    return cp.stdout.strip()
+
+
+@mcp.tool()
+def git_init(repo_path: str) -> str:
+    return _git(repo_path, "init", "-q") or f"Initialized empty Git repository in {repo_path}"
+
+
+@mcp.tool()
+def git_add(repo_path: str, files: List[str]) -> str:
+    _git(repo_path, "add", "--", *files)
+    return "Files staged successfully"
+
+
+@mcp.tool()
+def git_commit(repo_path: str, message: str) -> str:
+    _git(repo_path, "-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-q", "-m", message)
+    return f"Changes committed successfully with hash {_git(repo_path, 'rev-parse', 'HEAD')}"
+
+
+if __name__ == "__main__":
+    # Acepta y omite "--repository <path>" como mcp_server_git: el repo llega en cada llamada.
+    mcp.run()
@@ -0,0 +1,40 @@
+# lol_server.py
+"""
+Ejecuta el server MCP de LoL real (mcp/lol/server.py) con Data Dragon simulado:
+_fetch_json responde con un champion.json mínimo y determinista, sin red.
+"""
+import os, sys, random, importlib.util
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+_spec = importlib.util.spec_from_file_location("lol_server", os.path.join(_ROOT, "mcp", "lol", "server.py"))
+lol = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(lol)
+
+CHAMPIONS = ["Aatrox", "Ahri", "Ashe", "Garen", "Gnar", "Jinx", "Leona", "Lulu", "Lux", "Malphite",
+             "Morgana", "Ryze", "Soraka", "Thresh", "Vayne", "Yasuo", "Zed", "Darius", "Sona", "Amumu"]
+TAGS = [["Fighter"], ["Mage"], ["Marksman"], ["Fighter", "Tank"], ["Tank"], ["Support", "Mage"], ["Assassin"]]
+
+
+def _champion_json():
+    rnd = random.Random(7)
+    data = {}
+    for name in CHAMPIONS:
+        data[name] = {
+            "id": name, "tags": rnd.choice(TAGS), "info": {"attack": rnd.randint(1, 10), "magic": rnd.randint(1, 10)},
+            "spells": [{"description": rnd.choice(["Stuns the target.", "Heals allies.", "Deals damage.", "Slows enemies."])}
+                       for _ in range(4)],
+            "passive": {"description": rnd.choice(["Heals on hit.", "Gains armor.", ""])},
+        }
+    return {"data": data}
+
+
+def _fake_fetch(self, url: str):
+    if url.endswith("versions.json"):
+        return ["14.10.1"]
+    return _champion_json()
+
+
+lol.DDragonClient._fetch_json = _fake_fetch
+
+if __name__ == "__main__":
+    lol.main()
@@ -0,0 +1,107 @@
+# context.py
+"""
+Contexto del planner con presupuesto de tokens.
+
+ContextWindow guarda los últimos turnos hasta `budget_tokens` (estimación
+chars/4). Cada mensaje largo se recorta a `msg_tokens`, y los turnos que salen
+de la ventana se condensan en una línea del resumen rodante. Ese resumen solo
+se actualiza cuando la ventana se desliza y también tiene tope. El estado musical
+(playlist, canasta, público/privado...) va aparte como pares clave=valor.
+
+    PLANNER_CONTEXT_TOKENS=1500  PLANNER_MSG_TOKENS=160  PLANNER_SUMMARY_TOKENS=300
+"""
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+BUDGET_TOKENS = int(os.getenv("PLANNER_CONTEXT_TOKENS", "1500"))
+MSG_TOKENS = int(os.getenv("PLANNER_MSG_TOKENS", "160"))
+SUMMARY_TOKENS = int(os.getenv("PLANNER_SUMMARY_TOKENS", "300"))
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // 4 + 1
+
+
+def _clip(text: str, tokens: int) -> str:
+    text = " ".join((text or "").split())
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def facts_from_music_ctx(ctx: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Hechos compactos del estado musical (solo los que tienen valor)."""
+    ctx = ctx or {}
+    basket = ctx.get("basket")
+    public = ctx.get("last_public")
+    facts = {
+        "playlist": ctx.get("last_playlist_name"),
+        "playlist_url": ctx.get("last_playlist_url"),
+        "publica": None if public is None else ("sí" if public else "no"),
+        "canasta": f"{len(basket)} pistas" if basket else None,
+        "objetivo": basket.target if basket is not None else None,
+        "mood": ctx.get("last_mood"),
+        "playlists_creadas": ", ".join(list(ctx.get("playlists") or {})[-5:]) or None,
+    }
+    return {k: v for k, v in facts.items() if v not in (None, "")}
+
+
+class ContextWindow:
+    """Ventana de turnos con presupuesto de tokens y resumen incremental de lo que sale."""
+
+    def __init__(self, budget_tokens: int = BUDGET_TOKENS, msg_tokens: int = MSG_TOKENS,
+                 summary_tokens: int = SUMMARY_TOKENS):
+        self.budget_tokens = budget_tokens
+        self.msg_tokens = msg_tokens
+        self.summary_tokens = summary_tokens
+        self.turns: Deque[Tuple[str, str, int]] = deque()
+        self.tokens = 0
+        self.summary: Deque[Tuple[str, int]] = deque()
+        self.summary_size = 0
+
+    def add(self, role: str, content: str) -> None:
+        text = _clip(content, self.msg_tokens)
+        if not text:
+            return
+        n = estimate_tokens(text) + 2
+        self.turns.append((role, text, n))
+        self.tokens += n
+        while self.tokens > self.budget_tokens and len(self.turns) > 1:
+            self._evict()
+
+    def _evict(self) -> None:
+        role, text, n = self.turns.popleft()
+        self.tokens -= n
+        line = f"{'usuario' if role == 'user' else 'asistente'}: {_clip(text, 24)}"
+        k = estimate_tokens(line)
+        self.summary.append((line, k))
+        self.summary_size += k
+        while self.summary_size > self.summary_tokens and len(self.summary) > 1:
+            self.summary_size -= self.summary.popleft()[1]
+
+    def render(self, facts: Optional[Dict[str, Any]] = None) -> str:
+        parts = []
+        if self.summary:
+            parts.append("Resumen de turnos anteriores:\n" + "\n".join(f"- {l}" for l, _ in self.summary))
+        if facts:
+            parts.append("Estado: " + "; ".join(f"{k}={v}" for k, v in facts.items()))
+        parts.append("\n".join(f"{role}: {text}" for role, text, _ in self.turns))
+        return "\n\n".join(p for p in parts if p)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"turns": len(self.turns), "tokens": self.tokens,
+                "summary_lines": len(self.summary), "summary_tokens": self.summary_size}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"turns": [[r, t] for r, t, _ in self.turns], "summary": [l for l, _ in self.summary]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], **kw) -> "ContextWindow":
+        w = cls(**kw)
+        for line in data.get("summary") or []:
+            k = estimate_tokens(line)
+            w.summary.append((line, k))
+            w.summary_size += k
+        for role, text in data.get("turns") or []:
+            w.add(role, text)
+        return w
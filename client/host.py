@@ -18,8 +18,8 @@ def main():
             print("Revisa los archivos en ./logs/")
             continue
 
-        session.add_turn(q)
         ans = ask_llm(q, session.get_context())
+        session.add_turn(q, ans)
         print(ans)
 
         log_mcp({"event": "llm_exchange", "user": q, "assistant": ans})
@@ -0,0 +1,233 @@
+# json_stream.py
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class PlanStreamParser:
+    """
+    Parser incremental del JSON del planner.
+
+    feed() recibe los fragmentos tal como llegan del modelo y devuelve los
+    elementos de la lista `array_key` ("actions") que se cerraron en ese
+    fragmento, así cada acción puede despacharse sin esperar el plan completo.
+    Solo lleva profundidad y estado de strings (O(n) en total); el texto previo
+    al primer '{' (p.ej. un ```json) se ignora. result() parsea el documento final.
+    """
+
+    def __init__(self, array_key: str = "actions"):
+        self.array_key = array_key
+        self.text = ""
+        self.actions: List[Dict[str, Any]] = []
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._in_str = False
+        self._esc = False
+        self._str_start = 0
+        self._pending_key: Optional[str] = None
+        self._key: Optional[str] = None
+        self._in_array = False
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.text += chunk
+        t, out = self.text, []
+        for i in range(self._pos, len(t)):
+            c = t[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        self._pending_key = t[self._str_start + 1:i]
+            elif not self._started:
+                if c == "{":
+                    self._started, self._depth = True, 1
+            elif c == '"':
+                self._in_str, self._str_start = True, i
+            elif c == ":" and self._depth == 1:
+                self._key = self._pending_key
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 2 and c == "[" and self._key == self.array_key:
+                    self._in_array = True
+                elif self._depth == 3 and self._in_array and c == "{":
+                    self._item_start = i
+            elif c in "}]":
+                if self._depth == 3 and self._item_start is not None and c == "}":
+                    try:
+                        item = json.loads(t[self._item_start:i + 1])
+                        if isinstance(item, dict):
+                            out.append(item)
+                    except ValueError:
+                        pass
+                    self._item_start = None
+                elif self._depth == 2 and c == "]":
+                    self._in_array = False
+                self._depth -= 1
+        self._pos = len(t)
+        self.actions.extend(out)
+        return out
+
+    @property
+    def complete(self) -> bool:
+        return self._started and self._depth == 0
+
+    def result(self) -> Dict[str, Any]:
+        """Documento completo; json.JSONDecodeError si el modelo lo dejó truncado o mal formado."""
+        start, end = self.text.find("{"), self.text.rfind("}")
+        return json.loads(self.text[start:end + 1] if start >= 0 else self.text)
+
+
+_WS = " \t\r\n"
+_DECODER = json.JSONDecoder()
+
+
+class JSONStreamDecoder:
+    """
+    Decoder incremental de JSON concatenado / NDJSON.
+
+    feed() acepta fragmentos arbitrarios y devuelve los valores de nivel superior
+    que quedaron completos. Cada valor se intenta primero con JSONDecoder.raw_decode
+    (en C); si todavía no está completo, sus fragmentos se guardan en una lista y
+    un escaneo lineal (profundidad + estado de strings, sin retroceso) recorre solo
+    el texto nuevo de cada feed. Recién al cerrarse el objeto/arreglo se unen los
+    fragmentos, una vez, y se decodifica: el costo total es lineal aunque un objeto
+    grande llegue partido en muchos fragmentos. Los escalares sueltos se entregan
+    al ver un separador o en close(). Texto que no es JSON se salta hasta la siguiente línea.
+    """
+
+    def __init__(self):
+        self.buf = ""          # texto sin consumir fuera de un valor abierto
+        self._pos = 0
+        self._parts: List[str] = []   # fragmentos del objeto/arreglo abierto
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        out: List[Any] = []
+        if self._depth:
+            end = self._scan(chunk, 0)
+            if end < 0:
+                self._parts.append(chunk)
+                return out
+            self._parts.append(chunk[:end])
+            self._emit("".join(self._parts), out)
+            self._parts = []
+            self.buf, self._pos = chunk[end:], 0
+        else:
+            self.buf += chunk
+        buf, n = self.buf, len(self.buf)
+        while True:
+            i = self._pos
+            while i < n and buf[i] in _WS:
+                i += 1
+            self._pos = i
+            if i >= n:
+                break
+            if buf[i] not in "{[":
+                if not self._scalar(out, final=False):
+                    break
+                continue
+            try:  # camino rápido: el valor ya llegó completo
+                value, k = _DECODER.raw_decode(buf, i)
+                out.append(value)
+                self._pos = k
+                continue
+            except ValueError:
+                pass
+            end = self._scan(buf, i)
+            if end < 0:
+                self._parts = [buf[i:]]
+                self._pos = n
+                break
+            self._emit(buf[i:end], out)
+            self._pos = end
+        # lo que queda es a lo sumo un escalar pendiente
+        self.buf, self._pos = self.buf[self._pos:], 0
+        return out
+
+    def _scan(self, text: str, i: int) -> int:
+        """Sigue el valor abierto sobre text[i:]; fin (exclusivo) si se cerró, -1 si sigue abierto."""
+        depth, in_str, esc = self._depth, self._in_str, self._esc
+        n = len(text)
+        while i < n:
+            c = text[i]
+            if in_str:
+                if esc:
+                    esc = False
+                elif c == "\\":
+                    esc = True
+                elif c == '"':
+                    in_str = False
+            elif c == '"':
+                in_str = True
+            elif c in "{[":
+                depth += 1
+            elif c in "}]":
+                depth -= 1
+                if depth == 0:
+                    self._depth, self._in_str, self._esc = 0, False, False
+                    return i + 1
+            i += 1
+        self._depth, self._in_str, self._esc = depth, in_str, esc
+        return -1
+
+    @staticmethod
+    def _emit(text: str, out: List[Any]) -> None:
+        try:
+            out.append(_DECODER.raw_decode(text)[0])
+        except ValueError:
+            pass  # valor mal formado: se descarta entero
+
+    def _scalar(self, out: List[Any], final: bool) -> bool:
+        """Escalar (o basura) en self._pos. False si hay que esperar más texto."""
+        buf, start = self.buf, self._pos
+        if buf[start] == '"':
+            j, esc = start + 1, False
+            while j < len(buf) and (esc or buf[j] != '"'):
+                esc = not esc and buf[j] == "\\"
+                j += 1
+            j += 1   # después de la comilla de cierre
+        else:
+            j = start
+            while j < len(buf) and buf[j] not in _WS and (j == start or buf[j] not in "{["):
+                j += 1
+        if j >= len(buf) and not final:
+            return False
+        try:
+            value, k = _DECODER.raw_decode(buf, start)
+            out.append(value)
+            self._pos = k
+        except ValueError:
+            nl = buf.find("\n", start)
+            nxt = [p for p in (nl + 1 if nl >= 0 else -1, buf.find("{", start + 1), buf.find("[", start + 1)) if p > 0]
+            self._pos = min(nxt) if nxt else len(buf)
+        return True
+
+    def close(self) -> List[Any]:
+        """Fin del stream: entrega un escalar final pendiente; un objeto truncado se descarta."""
+        out: List[Any] = []
+        while self._depth == 0:
+            i = self._pos
+            while i < len(self.buf) and self.buf[i] in _WS:
+                i += 1
+            self._pos = i
+            if i >= len(self.buf):
+                break
+            if self.buf[i] in "{[":
+                out.extend(self.feed(""))
+                continue
+            self._scalar(out, final=True)
+        return out
+
+
+def iter_json_values(text: str) -> Iterator[Any]:
+    """Valores de un texto con JSON concatenado o NDJSON, en orden."""
+    d = JSONStreamDecoder()
+    yield from d.feed(text or "")
+    yield from d.close()
@@ -1,9 +1,9 @@
 # llm.py
-import os, json, re
+import os, json, re, threading
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from google.genai.errors import ServerError, ClientError  
+from llm_backends import LLMBackend, LLMUnavailable, make_backend
+from json_stream import PlanStreamParser
+from results import ToolResult
 try:
     from pydantic import BaseModel as _PydBase
 except Exception:
@@ -21,30 +21,38 @@ def _to_jsonable(obj):
     return repr(obj)
 
 load_dotenv()
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    raise RuntimeError("Falta GEMINI_API_KEY en .env")
 
-client = genai.Client(api_key=API_KEY)
+# Backend elegido con LLM_BACKEND (gemini | replay | paquete.modulo:Clase); se crea en la primera llamada,
+# así que importar este módulo no exige credenciales ni red.
+_backend = None
+_backend_lock = threading.Lock()
+
+def backend() -> LLMBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = make_backend()
+    return _backend
+
+def set_backend(b) -> LLMBackend:
+    """Reemplaza el backend (nombre de LLM_BACKEND o instancia); útil en benchmarks."""
+    global _backend
+    _backend = make_backend(b) if isinstance(b, str) else b
+    return _backend
 
 MODEL_CANDIDATES = [
     os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
     "gemini-2.5-pro",
     "gemini-2.5-flash-lite"
 ]
-def _clean_json_block(s: str) -> str:
-    s = s.strip()
-    s = re.sub(r"^```[a-zA-Z]*\n?", "", s)
-    s = re.sub(r"```$", "", s)
-    return s.strip()
 
 MODEL = "gemini-2.5-flash"
 
 BOT_MODE = os.getenv("MCP_BOT_MODE", "false").strip().lower() in ("1","true","yes")
 BOT_MODE_TXT = "true" if BOT_MODE else "false"
 
-PLANNER_CFG = types.GenerateContentConfig(
-    system_instruction=f"""
+PLANNER_SYS = f"""
 Eres un planner para un host MCP (Filesystem, Git y Spotify).
 Devuelve SOLO JSON válido (sin backticks) con el formato EXACTO:
 {{
@@ -127,12 +135,9 @@ FALLOS / ROBUSTEZ:
 PATRÓN: ONBOARDING DE GÉNERO (cuando el usuario dice “adentrarme / por dónde empezar / bandas para empezar” + género):
 → Devuelve 6–8 acciones 'search_track' (limit=1) con bandas icónicas y un tema representativo del género.
 (Ejemplo de intención, NO lo imprimas como texto, solo produce acciones.)
-""",
-    thinking_config=types.ThinkingConfig(thinking_budget=0),
-)
+"""
 
-FINALIZER_CFG = types.GenerateContentConfig(
-    system_instruction=(
+FINALIZER_SYS = (
         """Eres el asistente del usuario. Responde en español, claro y conciso.
 Usa SOLO los 'execution_results' que te paso para redactar una respuesta natural (sin JSON ni backticks).
 
@@ -186,8 +191,6 @@ CIERRE SIEMPRE CON FOLLOW-UPS (elige 2–3):
 • “¿Quieres que la reproduzca en tu dispositivo?”
 • “¿La hago pública o la dejo privada?”
 """
-    ),
-    thinking_config=types.ThinkingConfig(thinking_budget=0),
 )
 
 def _extract_count(text: str, default_n: int = 10) -> int:
@@ -231,24 +234,51 @@ def fallback_plan(user_msg: str) -> dict:
         "actions": actions
     }
 
-def plan_llm(user_msg: str, history_msgs: list[dict]) -> dict:
+# Salida estructurada del planner: el modelo queda restringido a este esquema.
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reply_preview": {"type": "string"},
+        "thought": {"type": "string"},
+        "actions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "server": {"type": "string", "enum": ["filesystem", "git", "spotify", "time", "lol", "movies"]},
+                    "tool": {"type": "string"},
+                    "args": {"type": "object"},
+                },
+                "required": ["server", "tool", "args"],
+            },
+        },
+    },
+    "required": ["reply_preview", "thought", "actions"],
+}
+
+def plan_llm(user_msg: str, history_msgs: list[dict], on_action=None, transcript: str | None = None) -> dict:
     """
     Generate a plan using LLM based on user message and conversation history.
     Args:
         user_msg: Current user command/request
         history_msgs: List of previous conversation messages with 'role' and 'content' keys
+        on_action: Optional callback called with each action as soon as it is complete in the stream
+        transcript: Optional prebuilt context (context.ContextWindow.render); replaces history_msgs
     Returns:
         dict: Plan containing 'reply_preview', 'thought', and 'actions' fields
     Note:
-        - Uses last 12 messages from history for context
-        - Tries multiple model candidates on failure
+        - Without transcript, uses last 12 messages from history for context
+        - Requests schema-constrained JSON (PLAN_SCHEMA) and parses it incrementally
+        - Tries multiple model candidates on failure, unless actions were already handed to on_action
+          (then the partial plan is returned so nothing runs twice)
         - Falls back to basic plan if all models fail
     """
-    transcript = "\n".join(
-        f"{m.get('role','user')}: {m.get('content','')}"
-        for m in (history_msgs or [])[-12:]
-        if isinstance(m, dict) and m.get("content")
-    )
+    if transcript is None:
+        transcript = "\n".join(
+            f"{m.get('role','user')}: {m.get('content','')}"
+            for m in list(history_msgs or [])[-12:]
+            if isinstance(m, dict) and m.get("content")
+        )
     prompt = (
         f"Transcripción (últimos turnos):\n{transcript}\n\n"
         f"Orden actual del usuario:\n{user_msg}\n\n"
@@ -257,53 +287,33 @@ def plan_llm(user_msg: str, history_msgs: list[dict]) -> dict:
 
     last_err = None
     for mdl in MODEL_CANDIDATES:
+        parser = PlanStreamParser()
         try:
-            resp = client.models.generate_content(model=mdl, contents=prompt, config=PLANNER_CFG)
-            raw = (resp.text or "").strip()
-            cleaned = _clean_json_block(raw)
-            data = json.loads(cleaned)
+            for chunk in backend().stream("planner", prompt, mdl, system=PLANNER_SYS, user_msg=user_msg,
+                                          schema=PLAN_SCHEMA):
+                for a in parser.feed(chunk):
+                    if on_action:
+                        on_action(a)
+            data = parser.result()
             reply_preview = (data.get("reply_preview") or "").strip()
             thought = (data.get("thought") or "").strip()
-            actions = data.get("actions") or []
-            if not isinstance(actions, list):
-                actions = []
-            return {"reply_preview": reply_preview, "thought": thought, "actions": actions}
-        except (ServerError, ClientError, json.JSONDecodeError) as e:
-            last_err = e
-            continue
+            return {"reply_preview": reply_preview, "thought": thought, "actions": parser.actions}
         except Exception as e:
             last_err = e
+            if on_action and parser.actions:
+                return {"reply_preview": "", "thought": f"Plan parcial (motivo: {type(e).__name__})",
+                        "actions": parser.actions}
             continue
 
     fb = fallback_plan(user_msg)
     fb["thought"] += f" (motivo: {type(last_err).__name__})"
     return fb
 
-FINALIZER_CFG = types.GenerateContentConfig(
-    system_instruction=(
-        "Eres el asistente del usuario. Con base en los 'execution_results' que te paso, "
-        "redacta SOLO una respuesta natural y útil (sin JSON, sin backticks)."
-    ),
-    thinking_config=types.ThinkingConfig(thinking_budget=0),
-)
+def _collect_tracks(execution_results: list[ToolResult]) -> list[dict]:
+    return [t for r in execution_results or [] if r.server == "spotify" and r.ok
+            for t in r.tracks if t.get("name") and t.get("artists")]
 
-def _collect_tracks(execution_results: list[dict]) -> list[dict]:
-    out = []
-    for r in execution_results or []:
-        if r.get("server") != "spotify" or not r.get("ok"):
-            continue
-        res = r.get("result") or {}
-        sc = (res.get("structuredContent") or {}).get("result")
-        items = sc if isinstance(sc, list) else None
-        if not items and isinstance(res, dict) and "content" in res:
-            pass
-        if isinstance(items, list):
-            for t in items:
-                if isinstance(t, dict) and t.get("name") and t.get("artists"):
-                    out.append(t)
-    return out
-
-def _local_finalize(user_msg: str, execution_results: list[dict]) -> str:
+def _local_finalize(user_msg: str, execution_results: list[ToolResult]) -> str:
     tracks = _collect_tracks(execution_results)
     if tracks:
         uniq = []
@@ -319,9 +329,10 @@ def _local_finalize(user_msg: str, execution_results: list[dict]) -> str:
         return f"Aquí tienes:\n{body}\n\n¿Te paso 5 más del mismo estilo? · ¿Más clásico o más moderno? · ¿La convierto en playlist pública?"
     return "Listo. ¿Quieres que lo convierta en playlist o cambiamos el mood?"
 
-def finalize_llm(user_msg: str, execution_results: list[dict]) -> str:
+def finalize_llm(user_msg: str, execution_results: list[ToolResult]) -> str:
     try:
-        jsonable_results = _to_jsonable(execution_results)
+        # payload ya parseado de cada tool, no la respuesta MCP completa (content + structuredContent)
+        jsonable_results = _to_jsonable([r.view() for r in execution_results or []])
         prompt = (
             "Usuario pidió:\n"
             f"{user_msg}\n\n"
@@ -332,41 +343,31 @@ def finalize_llm(user_msg: str, execution_results: list[dict]) -> str:
         last_err = None
         for mdl in MODEL_CANDIDATES:
             try:
-                resp = client.models.generate_content(model=mdl, contents=prompt, config=FINALIZER_CFG)
-                return (resp.text or "").strip()
-            except (ServerError, ClientError) as e:
+                return backend().generate("finalizer", prompt, mdl, system=FINALIZER_SYS, user_msg=user_msg)
+            except LLMUnavailable as e:
                 last_err = e
                 continue
         return _local_finalize(user_msg, execution_results)
     except Exception:
         return _local_finalize(user_msg, execution_results)
-QA_CFG = types.GenerateContentConfig(
-    system_instruction=(
-        "Eres un asistente de conocimiento general. Responde en español, "
-        "claro y conciso. Para biografías, da 5–7 puntos clave y 1 línea final "
-        "de por qué es importante."
-    ),
-    thinking_config=types.ThinkingConfig(thinking_budget=0),
+QA_SYS = (
+    "Eres un asistente de conocimiento general. Responde en español, "
+    "claro y conciso. Para biografías, da 5–7 puntos clave y 1 línea final "
+    "de por qué es importante."
 )
 
-MODEL_CANDIDATES = [
-    os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
-    "gemini-2.0-flash",
-    "gemini-1.5-flash",
-]
-
-def ask_llm(question: str) -> str:
+def ask_llm(question: str, context: str | None = None) -> str:
     q = (question or "").strip()
     if not q:
         return "¿Qué te gustaría saber?"
+    prompt = f"Conversación previa:\n{context}\n\nPregunta: {q}" if context else q
     last_err = None
     for mdl in MODEL_CANDIDATES:
         try:
-            resp = client.models.generate_content(model=mdl, contents=q, config=QA_CFG)
-            txt = (resp.text or "").strip()
+            txt = backend().generate("qa", prompt, mdl, system=QA_SYS, user_msg=q)
             if txt:
                 return txt
-        except (ServerError, ClientError) as e:
+        except LLMUnavailable as e:
             last_err = e
             continue
         except Exception as e:
@@ -0,0 +1,337 @@
+# llm_backends.py
+"""
+Backends de LLM para llm.py.
+
+    LLM_BACKEND=gemini                 → Google Gemini (por defecto, requiere GEMINI_API_KEY)
+    LLM_BACKEND=replay                 → respuestas grabadas en logs/*.jsonl, sin red
+    LLM_BACKEND=paquete.modulo:Clase   → backend propio
+
+Todos implementan `generate(role, prompt, model, system, user_msg)` y devuelven
+texto; `role` es "planner", "finalizer" o "qa". `stream(...)` entrega el mismo
+texto en fragmentos y acepta `schema` (JSON Schema) para salida estructurada;
+por defecto es un único fragmento con generate(). Un fallo recuperable (cuota,
+503, modelo no disponible) se señala con LLMUnavailable para que el llamador
+pruebe el siguiente modelo o su fallback local.
+"""
+import os, re, glob, json, time, zlib, random, threading, importlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class LLMUnavailable(RuntimeError):
+    """El modelo no respondió (sin credenciales, 429/503, etc.)."""
+
+
+class LLMBackend:
+    name = "base"
+
+    def generate(self, role: str, prompt: str, model: str, system: str = "", user_msg: str = "") -> str:
+        raise NotImplementedError
+
+    def stream(self, role: str, prompt: str, model: str, system: str = "", user_msg: str = "",
+               schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        yield self.generate(role, prompt, model, system=system, user_msg=user_msg)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class PromptCache:
+    """
+    Handles de cached content de Gemini por (modelo, system_instruction).
+
+    El handle se crea en la primera llamada y su TTL se extiende en segundo plano
+    cuando quedan menos de `refresh_s`, así los turnos nunca esperan a recrearlo.
+    Si el proveedor lo rechaza (prompt bajo el mínimo de tokens, modelo sin
+    soporte) se recuerda el fallo durante `retry_s` y se envía el prompt en línea.
+    Mientras otro hilo crea el handle de una clave, las demás llamadas también lo
+    envían en línea en vez de crear un segundo handle.
+    """
+
+    def __init__(self, client, types, ttl_s: float = 3600, refresh_s: float = 300, retry_s: float = 600):
+        self.client, self.types = client, types
+        self.ttl_s, self.refresh_s, self.retry_s = ttl_s, refresh_s, retry_s
+        self._entries: Dict[Tuple[str, str], Tuple[Optional[str], float]] = {}
+        self._refreshing: set = set()
+        self._creating: set = set()
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "refreshed": 0, "failed": 0, "hits": 0, "cached_tokens": 0}
+
+    def _create(self, key: Tuple[str, str]) -> Optional[str]:
+        model, system = key
+        entry, stat = (None, time.monotonic() + self.retry_s), "failed"
+        try:
+            c = self.client.caches.create(model=model, config=self.types.CreateCachedContentConfig(
+                system_instruction=system, ttl=f"{int(self.ttl_s)}s"))
+            entry, stat = (c.name, time.monotonic() + self.ttl_s), "created"
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._entries[key] = entry
+                self.stats[stat] += 1
+                self._creating.discard(key)
+        return entry[0]
+
+    def _refresh(self, key: Tuple[str, str], name: str) -> None:
+        try:
+            self.client.caches.update(name=name, config=self.types.UpdateCachedContentConfig(ttl=f"{int(self.ttl_s)}s"))
+            with self._lock:
+                self._entries[key] = (name, time.monotonic() + self.ttl_s)
+                self.stats["refreshed"] += 1
+        except Exception:
+            with self._lock:
+                self._entries.pop(key, None)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, model: str, system: str) -> Optional[str]:
+        key = (model, system)
+        now = time.monotonic()
+        with self._lock:
+            name, exp = self._entries.get(key, (None, 0.0))
+            if name and exp - now < self.refresh_s and key not in self._refreshing and exp > now:
+                self._refreshing.add(key)
+                threading.Thread(target=self._refresh, args=(key, name), daemon=True).start()
+            if exp > now:
+                if name:
+                    self.stats["hits"] += 1
+                return name
+            if key in self._creating:
+                return None  # otro hilo lo está creando: este turno va en línea
+            self._creating.add(key)
+        return self._create(key)
+
+    def count_tokens(self, n: int) -> None:
+        with self._lock:
+            self.stats["cached_tokens"] += n
+
+    def invalidate(self, model: str, system: str) -> None:
+        with self._lock:
+            self._entries.pop((model, system), None)
+
+
+class GeminiBackend(LLMBackend):
+    """
+    google-genai se importa y el cliente se crea en la primera llamada.
+
+    Los system prompts de los roles en `cached_roles` (planner y finalizer por
+    defecto) se envían como cached content: se procesan una vez por TTL y cada
+    turno solo paga el prompt variable. GEMINI_PROMPT_CACHE=false lo desactiva.
+    """
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None, cached_roles=("planner", "finalizer")):
+        self.api_key = api_key
+        self.cached_roles = set(cached_roles) if os.getenv("GEMINI_PROMPT_CACHE", "true").strip().lower() in ("1", "true", "yes") else set()
+        self._client = None
+        self._types = None
+        self._errors: Tuple[type, ...] = ()
+        self._cfgs: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.cache: Optional[PromptCache] = None
+
+    def _ensure(self):
+        if self._client is not None:
+            return self._client
+        with self._lock:
+            if self._client is None:
+                key = self.api_key or os.getenv("GEMINI_API_KEY")
+                if not key:
+                    raise LLMUnavailable("Falta GEMINI_API_KEY en .env")
+                from google import genai
+                from google.genai import types
+                from google.genai.errors import ServerError, ClientError
+                self._types, self._errors = types, (ServerError, ClientError)
+                self._client = genai.Client(api_key=key)
+                self.cache = PromptCache(self._client, types,
+                                         ttl_s=float(os.getenv("GEMINI_CACHE_TTL_S", "3600")),
+                                         refresh_s=float(os.getenv("GEMINI_CACHE_REFRESH_S", "300")))
+        return self._client
+
+    def config(self, system: str, cached: Optional[str] = None, schema: Optional[Dict[str, Any]] = None):
+        key = (f"cache:{cached}" if cached else system, id(schema) if schema else None)
+        cfg = self._cfgs.get(key)
+        if cfg is None:
+            t = self._types
+            cfg = self._cfgs[key] = t.GenerateContentConfig(
+                cached_content=cached,
+                system_instruction=None if cached else (system or None),
+                thinking_config=t.ThinkingConfig(thinking_budget=0),
+                response_mime_type="application/json" if schema else None,
+                response_json_schema=schema,
+            )
+        return cfg
+
+    def generate(self, role: str, prompt: str, model: str, system: str = "", user_msg: str = "") -> str:
+        client = self._ensure()
+        cached = self.cache.get(model, system) if system and role in self.cached_roles else None
+        try:
+            resp = client.models.generate_content(model=model, contents=prompt, config=self.config(system, cached))
+        except self._errors as e:
+            if not cached:
+                raise LLMUnavailable(f"{type(e).__name__}: {e}") from e
+            # handle vencido o borrado del lado del proveedor: una vez más con el prompt en línea
+            self.cache.invalidate(model, system)
+            try:
+                resp = client.models.generate_content(model=model, contents=prompt, config=self.config(system))
+            except self._errors as e2:
+                raise LLMUnavailable(f"{type(e2).__name__}: {e2}") from e2
+        usage = getattr(resp, "usage_metadata", None)
+        if cached and usage is not None:
+            self.cache.count_tokens(getattr(usage, "cached_content_token_count", 0) or 0)
+        return (resp.text or "").strip()
+
+    def stream(self, role: str, prompt: str, model: str, system: str = "", user_msg: str = "",
+               schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        client = self._ensure()
+        cached = self.cache.get(model, system) if system and role in self.cached_roles else None
+        sent = False
+        try:
+            for chunk in client.models.generate_content_stream(model=model, contents=prompt,
+                                                               config=self.config(system, cached, schema)):
+                if chunk.text:
+                    sent = True
+                    yield chunk.text
+        except self._errors as e:
+            if not cached or sent:
+                raise LLMUnavailable(f"{type(e).__name__}: {e}") from e
+            self.cache.invalidate(model, system)
+            try:
+                for chunk in client.models.generate_content_stream(model=model, contents=prompt,
+                                                                   config=self.config(system, None, schema)):
+                    if chunk.text:
+                        yield chunk.text
+            except self._errors as e2:
+                raise LLMUnavailable(f"{type(e2).__name__}: {e2}") from e2
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": self.name, "prompt_cache": dict(self.cache.stats) if self.cache else None}
+
+
+def _norm(s: str) -> str:
+    return re.sub(r"\s+", " ", (s or "").strip().lower())
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Reproduce turnos grabados en logs/*.jsonl de forma determinista.
+
+    El planner devuelve el plan (acciones) que se ejecutó para ese mensaje y
+    finalizer/qa la respuesta que se mostró. Un mensaje desconocido recibe un
+    turno grabado elegido por hash del prompt, así que la misma entrada siempre
+    produce la misma salida. La latencia simulada es latency_ms ± jitter_ms.
+    """
+    name = "replay"
+
+    def __init__(self, pattern: Optional[str] = None, latency_ms: Optional[float] = None,
+                 jitter_ms: Optional[float] = None, seed: int = 0):
+        here = os.path.dirname(os.path.abspath(__file__))
+        self.pattern = pattern or os.getenv("LLM_REPLAY_LOGS") or os.path.join(here, "logs", "*.jsonl")
+        self.latency_ms = float(os.getenv("LLM_REPLAY_LATENCY_MS", "0") if latency_ms is None else latency_ms)
+        self.jitter_ms = float(os.getenv("LLM_REPLAY_JITTER_MS", "0") if jitter_ms is None else jitter_ms)
+        self.seed = seed
+        self.turns: List[Dict[str, Any]] = load_recorded_turns(self.pattern)
+        self.by_user: Dict[str, Dict[str, Any]] = {}
+        for t in self.turns:
+            self.by_user.setdefault(_norm(t["user"]), t)
+        self.calls = {"planner": 0, "finalizer": 0, "qa": 0}
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    def _pick(self, prompt: str, user_msg: str) -> Optional[Dict[str, Any]]:
+        # finalize_llm puede anteponer notas del sistema al mensaje: el último párrafo es el del usuario
+        t = next((self.by_user[k] for k in (_norm(user_msg), _norm(user_msg.rsplit("\n\n", 1)[-1]))
+                  if user_msg and k in self.by_user), None)
+        with self._lock:
+            if t is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if t is None and self.turns:
+            t = self.turns[zlib.crc32(prompt.encode("utf-8")) % len(self.turns)]
+        return t
+
+    def _sleep(self, prompt: str) -> None:
+        ms = self.latency_ms
+        if self.jitter_ms:
+            rng = random.Random(zlib.crc32(prompt.encode("utf-8")) ^ self.seed)
+            ms += rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    def _text(self, role: str, prompt: str, user_msg: str) -> str:
+        with self._lock:
+            self.calls[role] = self.calls.get(role, 0) + 1
+        t = self._pick(prompt, user_msg)
+        if t is None:
+            raise LLMUnavailable(f"Sin turnos grabados en {self.pattern}")
+        if role == "planner":
+            return json.dumps({"reply_preview": t["assistant"], "thought": t["thought"], "actions": t["actions"]},
+                              ensure_ascii=False)
+        return t["assistant"]
+
+    def generate(self, role: str, prompt: str, model: str, system: str = "", user_msg: str = "") -> str:
+        text = self._text(role, prompt, user_msg)
+        self._sleep(prompt)
+        return text
+
+    def stream(self, role: str, prompt: str, model: str, system: str = "", user_msg: str = "",
+               schema: Optional[Dict[str, Any]] = None, chunk_chars: int = 64) -> Iterator[str]:
+        """Misma salida que generate() en fragmentos de chunk_chars, con la latencia repartida entre ellos."""
+        text = self._text(role, prompt, user_msg)
+        parts = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+        ms = self.latency_ms
+        if self.jitter_ms:
+            ms += random.Random(zlib.crc32(prompt.encode("utf-8")) ^ self.seed).uniform(-self.jitter_ms, self.jitter_ms)
+        for p in parts:
+            if ms > 0:
+                time.sleep(ms / 1000.0 / len(parts))
+            yield p
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": self.name, "recorded_turns": len(self.turns), "calls": dict(self.calls),
+                    "hits": self.hits, "misses": self.misses}
+
+
+def load_recorded_turns(pattern: str) -> List[Dict[str, Any]]:
+    """Turnos {user, assistant, thought, actions} de los llm_exchange (las acciones salen del mcp_plan previo si faltan)."""
+    turns: List[Dict[str, Any]] = []
+    for path in sorted(glob.glob(pattern)):
+        pending: List[Dict[str, Any]] = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    continue
+                kind = ev.get("event")
+                if kind == "mcp_plan":
+                    pending = ev.get("actions") or []
+                elif kind == "llm_exchange" and ev.get("user"):
+                    ans = ev.get("assistant")
+                    if isinstance(ans, dict):
+                        ans = ans.get("reply") or ""
+                    turns.append({
+                        "user": str(ev["user"]),
+                        "assistant": str(ans or ""),
+                        "thought": str(ev.get("thought") or ""),
+                        "actions": ev.get("actions") or pending,
+                    })
+                    pending = []
+    return turns
+
+
+BACKENDS = {"gemini": GeminiBackend, "replay": ReplayBackend}
+
+
+def make_backend(name: Optional[str] = None, **kw) -> LLMBackend:
+    name = (name or os.getenv("LLM_BACKEND") or "gemini").strip()
+    if ":" in name:
+        mod, cls = name.split(":", 1)
+        return getattr(importlib.import_module(mod), cls)(**kw)
+    try:
+        return BACKENDS[name.lower()](**kw)
+    except KeyError:
+        raise ValueError(f"LLM_BACKEND desconocido: {name!r} (opciones: {', '.join(BACKENDS)})") from None
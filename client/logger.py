@@ -13,6 +13,8 @@ except Exception:
 def _json_default(o):
     if BaseModel and isinstance(o, BaseModel):
         return o.model_dump()
+    if hasattr(o, "to_dict"):   # results.ToolResult
+        return o.to_dict()
     if isinstance(o, (bytes, bytearray)):
         return o.decode("utf-8", errors="replace")
     return repr(o)
@@ -3,13 +3,16 @@ import asyncio
 from asyncio import wait_for
 from typing import List, Dict, Any, Optional
 from contextlib import AsyncExitStack
-import sys, os, subprocess
+from dataclasses import replace
+import sys, os, subprocess, time
 import requests  # para Movies (HTTP)
 import threading
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 import json as _json
+from prefetch import action_key
+from results import ToolResult
 
 try:
     from pydantic import BaseModel as _BM
@@ -17,7 +20,7 @@ except Exception:
     _BM = None
 
 # ====== Configuración del server MCP de LoL (STDIO) ======
-_MLOL_ENTRY = r"C:\Users\rodri\Documents\Redes\MoodST\mcp\lol\server.py"
+_MLOL_ENTRY = os.environ.get("MCP_LOL_ENTRY", r"C:\Users\rodri\Documents\Redes\MoodST\mcp\lol\server.py").strip()
 LOL_SERVER_CMD = sys.executable
 LOL_SERVER_ARGS = [_MLOL_ENTRY]
 
@@ -43,6 +46,20 @@ else:
     SPOTIFY_SERVER_CMD = sys.executable
     SPOTIFY_SERVER_ARGS = ["-m", "mcp.spotify.server"]  # <-- ajusta si tu módulo se llama distinto
 
+# ====== Filesystem / Git MCP (STDIO) ======
+# MCP_FS_ENTRY / MCP_GIT_ENTRY = "path/a/server.py" reemplazan los servers oficiales (p.ej. stand-ins del benchmark).
+_FS_ENTRY = os.environ.get("MCP_FS_ENTRY", "").strip()
+if _FS_ENTRY:
+    FS_SERVER_CMD, FS_SERVER_ARGS = sys.executable, [os.path.abspath(_FS_ENTRY)]
+else:
+    FS_SERVER_CMD, FS_SERVER_ARGS = ("npx.cmd" if os.name == "nt" else "npx"), ["-y", "@modelcontextprotocol/server-filesystem"]
+
+_GIT_ENTRY = os.environ.get("MCP_GIT_ENTRY", "").strip()
+if _GIT_ENTRY:
+    GIT_SERVER_CMD, GIT_SERVER_ARGS = sys.executable, [os.path.abspath(_GIT_ENTRY)]
+else:
+    GIT_SERVER_CMD, GIT_SERVER_ARGS = sys.executable, ["-m", "mcp_server_git"]
+
 # ====== Movies (HTTP JSON-RPC hacia FastAPI /mcp/jsonrpc) ======
 MOVIES_HTTP_URL = os.environ.get("MCP_MOVIES_HTTP_URL", "http://0.0.0.0:8000/mcp/jsonrpc").strip()
 
@@ -151,6 +168,20 @@ def _nearest_existing_dir(p: str) -> str:
         p = parent
     return p
 
+def _is_within(path: str, root: str) -> bool:
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:
+        return False
+
+async def _aiter(actions):
+    if hasattr(actions, "__aiter__"):
+        async for a in actions:
+            yield a
+    else:
+        for a in actions:
+            yield a
+
 def _collect_target_paths(actions: List[Dict[str, Any]]) -> List[str]:
     """
     Recolecta todos los 'path' y 'repo_path' para calcular dirs permitidos (Filesystem MCP).
@@ -261,36 +292,54 @@ class LolLineClient:
         return self.rpc("tools/call", {"name": name, "arguments": arguments})
 
 # ====== Ejecutor principal ======
-async def execute_plan(actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+async def execute_plan(actions, prefetched: Optional[Dict[tuple, ToolResult]] = None) -> List[ToolResult]:
     """
-    Ejecuta acciones MCP y devuelve [{server, tool, args, ok, result|error}, ...].
-
-    - Filesystem: se abre una vez con dirs permitidos “sanos” (ancestros existentes).
+    Ejecuta acciones MCP y devuelve un ToolResult por llamada (ok, result|error, elapsed_ms y el payload ya parseado).
+    elapsed_ms incluye el arranque lazy del server si la acción fue la primera en usarlo.
+    actions: lista, o iterable async si el plan llega en streaming (cada acción se ejecuta al llegar).
+    prefetched: resultados especulados por prefetch.action_key; cada uno se consume una vez
+    (marcado con "prefetched": True) y esa acción no se vuelve a ejecutar. Puede ir llenándose
+    mientras llegan las acciones.
+
+    - Filesystem: con lista se abre una vez con dirs permitidos “sanos” (ancestros existentes);
+      en streaming se abre con la primera acción y se reabre si un path cae fuera de esos dirs.
     - Git: sesión LAZY por repo cuando llega la primera acción git_* para ese repo.
     - Spotify: sesión LAZY global.
     - LoL: sesión LAZY global.
     - Movies: cliente HTTP LAZY.
     """
     results: List[Dict[str, Any]] = []
+    streamed = not isinstance(actions, (list, tuple))
 
-    targets = _collect_target_paths(actions)
+    targets = [] if streamed else _collect_target_paths(actions)
     allowed_dirs = sorted({_nearest_existing_dir(os.path.dirname(t)) for t in targets if t})
 
     async with AsyncExitStack() as stack:
         # ------- Filesystem  -------
         fs_session: Optional[ClientSession] = None
-        if allowed_dirs:
-            npx_cmd = "npx.cmd" if os.name == "nt" else "npx"
+        fs_dirs: List[str] = []
+
+        async def ensure_fs_session(paths: List[str]) -> ClientSession:
+            nonlocal fs_session, fs_dirs
+            need = {_nearest_existing_dir(os.path.dirname(p)) for p in paths if p}
+            if fs_session and all(any(_is_within(d, a) for a in fs_dirs) for d in need):
+                return fs_session
+            dirs = sorted(set(fs_dirs) | need)
             fs_params = StdioServerParameters(
-                command=npx_cmd,
-                args=["-y", "@modelcontextprotocol/server-filesystem", *allowed_dirs],
+                command=FS_SERVER_CMD,
+                args=[*FS_SERVER_ARGS, *dirs],
                 env={**os.environ, "DEBUG": "mcp*,*", "MCP_LOG_LEVEL": "debug", "NO_COLOR": "1"},
             )
+            fs_read, fs_write = await stack.enter_async_context(stdio_client(fs_params))
+            sess = ClientSession(fs_read, fs_write)
+            await stack.enter_async_context(sess)
+            await sess.initialize()
+            fs_session, fs_dirs = sess, dirs
+            return sess
+
+        if allowed_dirs:
             try:
-                fs_read, fs_write = await stack.enter_async_context(stdio_client(fs_params))
-                fs_session = ClientSession(fs_read, fs_write)
-                await stack.enter_async_context(fs_session)
-                await fs_session.initialize()
+                await ensure_fs_session(targets)
             except Exception as e:
                 results.append({
                     "server": "filesystem", "tool": "init",
@@ -312,8 +361,8 @@ async def execute_plan(actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
                 _git_cli_init(rp)
 
             git_params = StdioServerParameters(  
-                command=sys.executable,
-                args=["-m", "mcp_server_git", "--repository", rp],
+                command=GIT_SERVER_CMD,
+                args=[*GIT_SERVER_ARGS, "--repository", rp],
                 env={**os.environ, "NO_COLOR": "1"},
             )
             g_read, g_write = await stack.enter_async_context(stdio_client(git_params))
@@ -394,13 +443,22 @@ async def execute_plan(actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             return tc
 
         # ------- Ejecutar acciones en orden -------
-        for a in actions:
+        prefetched = prefetched if prefetched is not None else {}
+        async for a in _aiter(actions):
             server = a.get("server")
             tool   = a.get("tool")
             args   = a.get("args", {}) or {}
+            if prefetched:
+                hit = prefetched.pop(action_key(server, tool, args), None)
+                if hit is not None:
+                    results.append(replace(hit, args=args, prefetched=True))
+                    continue
+            n0, t0 = len(results), time.perf_counter()
 
             try:
                 if server == "filesystem":
+                    if streamed:
+                        await ensure_fs_session([args.get("path")])
                     if not fs_session:
                         raise RuntimeError("Filesystem MCP no disponible.")
                     if tool == "write_file":
@@ -516,12 +574,6 @@ async def execute_plan(actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
                         raise ValueError(f"Herramienta spotify no soportada: {tool}")
 
                     res_json, is_err = _dump_result(res)
-                    if not is_err and "_text" in res_json and isinstance(res_json.get("_text"), str):
-                        try:
-                            parsed = _json.loads(res_json["_text"])
-                            res_json["parsed"] = parsed
-                        except Exception:
-                            pass
                     if is_err and ("OAuth" in (res_json.get("_text","")) or "login" in (res_json.get("_text",""))):
                         try:
                             ab = await sp.call_tool("auth_begin", {})
@@ -610,32 +662,40 @@ async def execute_plan(actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
                     "server": server, "tool": tool, "args": args,
                     "ok": False, "result": None, "error": str(e)
                 })
+            elapsed = round((time.perf_counter() - t0) * 1000, 2)
+            for r in results[n0:]:
+                r["elapsed_ms"] = elapsed
+            results[n0:] = [ToolResult.from_raw(r) for r in results[n0:]]
 
-    return results
+    return [r if isinstance(r, ToolResult) else ToolResult.from_raw(r) for r in results]
+
+def fix_action(a: Dict[str, Any], seen_repo_dirs: set) -> List[Dict[str, Any]]:
+    """Una acción con sus precondiciones delante; seen_repo_dirs se comparte a lo largo del plan."""
+    out: List[Dict[str, Any]] = []
+    srv = a.get("server")
+    tl  = a.get("tool")
+    args = a.get("args", {}) or {}
+
+    if srv == "git":
+        rp = args.get("repo_path", ".")
+        repo_dir = _abspath(rp)
+        if repo_dir not in seen_repo_dirs:
+            out.append({"server": "filesystem", "tool": "create_directory", "args": {"path": repo_dir}})
+            seen_repo_dirs.add(repo_dir)
+
+    if srv == "filesystem" and tl == "write_file":
+        parent = os.path.dirname(_abspath(args["path"]))
+        out.append({"server": "filesystem", "tool": "create_directory", "args": {"path": parent}})
+
+    out.append(a)
+    return out
 
 def fix_plan(actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Inserta precondiciones: create_directory antes de git y antes de write_file."""
     out: List[Dict[str, Any]] = []
-    seen_repo_dirs = set()
-
+    seen_repo_dirs: set = set()
     for a in actions:
-        srv = a.get("server")
-        tl  = a.get("tool")
-        args = a.get("args", {}) or {}
-
-        if srv == "git":
-            rp = args.get("repo_path", ".")
-            repo_dir = _abspath(rp)
-            if repo_dir not in seen_repo_dirs:
-                out.append({"server": "filesystem", "tool": "create_directory", "args": {"path": repo_dir}})
-                seen_repo_dirs.add(repo_dir)
-
-        if srv == "filesystem" and tl == "write_file":
-            parent = os.path.dirname(_abspath(args["path"]))
-            out.append({"server": "filesystem", "tool": "create_directory", "args": {"path": parent}})
-
-        out.append(a)
-
+        out.extend(fix_action(a, seen_repo_dirs))
     return out
-def execute_plan_blocking(actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    return asyncio.run(execute_plan(actions))
\ No newline at end of file
+def execute_plan_blocking(actions: List[Dict[str, Any]], prefetched: Optional[Dict[tuple, ToolResult]] = None) -> List[ToolResult]:
+    return asyncio.run(execute_plan(actions, prefetched))
\ No newline at end of file
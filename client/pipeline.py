@@ -0,0 +1,76 @@
+# pipeline.py
+"""
+Turno planner → herramientas en streaming.
+
+plan_llm entrega cada acción apenas el JSON del planner la cierra; aquí se le
+agregan sus precondiciones (fix_action), se cruza con el prefetch especulativo
+y se pasa a execute_plan por una cola, así la primera tool corre mientras el
+modelo sigue escribiendo el resto del plan.
+"""
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from llm import plan_llm, fallback_plan
+from mcp_client import execute_plan, fix_action
+from prefetch import Speculation, action_key
+from results import ToolResult
+
+_DONE = object()
+
+
+async def run_turn(user_msg: str, history: Iterable[Dict[str, Any]], spec: Optional[Speculation] = None,
+                   transcript: Optional[str] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[ToolResult]]:
+    """Devuelve (plan, acciones ejecutadas con precondiciones, resultados)."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    emitted: List[Dict[str, Any]] = []
+    fixed: List[Dict[str, Any]] = []
+    prefetched: Dict[tuple, ToolResult] = {}
+    seen_repo_dirs: set = set()
+
+    def planner() -> Dict[str, Any]:
+        try:
+            return plan_llm(user_msg, history, on_action=lambda a: loop.call_soon_threadsafe(queue.put_nowait, a),
+                            transcript=transcript)
+        except Exception:
+            return fallback_plan(user_msg)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+    plan_task = asyncio.ensure_future(asyncio.to_thread(planner))
+
+    async def prepare(a: Dict[str, Any]) -> List[Dict[str, Any]]:
+        try:
+            out = fix_action(a, seen_repo_dirs)
+        except Exception:
+            out = [a]  # acción mal formada: execute_plan la reporta como error
+        for f in out:
+            # match() puede esperar al resultado especulado: fuera del loop para no frenar las sesiones MCP
+            hit = await asyncio.to_thread(spec.match, f) if spec else None
+            if hit is not None:
+                prefetched[action_key(f.get("server"), f.get("tool"), f.get("args"))] = hit
+        fixed.extend(out)
+        return out
+
+    async def actions():
+        while True:
+            a = await queue.get()
+            if a is _DONE:
+                break
+            emitted.append(a)
+            for f in await prepare(a):
+                yield f
+        # el plan de respaldo (o cualquier acción no emitida en streaming) va al final
+        for a in (await plan_task).get("actions", [])[len(emitted):]:
+            for f in await prepare(a):
+                yield f
+
+    results = await execute_plan(actions(), prefetched)
+    if spec:
+        spec.close()
+    return await plan_task, fixed, results
+
+
+def run_turn_blocking(user_msg: str, history: Iterable[Dict[str, Any]], spec: Optional[Speculation] = None,
+                      transcript: Optional[str] = None):
+    return asyncio.run(run_turn(user_msg, history, spec, transcript))
@@ -0,0 +1,168 @@
+# prefetch.py
+"""
+Prefetch especulativo de tools MCP mientras corre el planner.
+
+A partir del mensaje crudo se adivina un puñado de llamadas baratas, de solo
+lectura e idempotentes (whoami, get_recommendations por género...) y se lanzan
+en segundo plano. Cuando llega el plan real, las acciones que coinciden exactamente
+(mismo server/tool/args normalizados) reutilizan ese resultado y el resto se
+descarta. Hit-rate y tiempo ahorrado en prefetch_stats().
+
+whoami no se especula por sí solo (abriría un server MCP sólo para eso): si la
+app ya lo consultó en este run, speculate(..., who=...) lo siembra como resultado
+(fuera de speculated/hits; se cuenta aparte en seeded_hits).
+
+    MCP_PREFETCH=false     → desactiva la especulación
+    MCP_PREFETCH_WAIT_S=5  → espera máxima por un resultado especulado que sí se usará
+"""
+import os, re, json, asyncio, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from router import _count, find_genre
+from results import ToolResult
+
+ENABLED = os.getenv("MCP_PREFETCH", "true").strip().lower() in ("1", "true", "yes")
+WAIT_S = float(os.getenv("MCP_PREFETCH_WAIT_S", "5"))
+
+# Tools seguras de repetir o descartar: no crean nada ni cambian la sesión OAuth.
+READ_ONLY = {("spotify", "whoami"), ("spotify", "search_track"), ("spotify", "analyze_mood"),
+             ("spotify", "get_recommendations")}
+
+_MUSIC_WORDS = ("canci", "tema", "playlist", "lista", "música", "musica", "spotify", "recomi", "escuchar")
+_PLAYLIST_WORDS = ("playlist", "lista")
+
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="mcp-prefetch")
+_stats_lock = threading.Lock()
+_stats = {"turns": 0, "speculated": 0, "hits": 0, "wasted": 0, "saved_ms": 0.0, "seeded_hits": 0}
+
+
+def action_key(server: Optional[str], tool: Optional[str], args: Optional[Dict[str, Any]]) -> Tuple[str, str, str]:
+    """Clave canónica de una llamada: sin prefijo 'spotify.', sin args nulos y texto normalizado."""
+    tool = str(tool or "")
+    if server == "spotify" and tool.startswith("spotify."):
+        tool = tool.split(".", 1)[1]
+    norm = {}
+    for k, v in (args or {}).items():
+        if v is None or v == [] or v == "":
+            continue
+        if isinstance(v, str):
+            v = re.sub(r"\s+", " ", v.strip().lower())
+        elif k == "limit":
+            try:
+                v = int(v)
+            except (TypeError, ValueError):
+                pass
+        norm[k] = v
+    return str(server or ""), tool, json.dumps(norm, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def guess_actions(user_msg: str) -> List[Dict[str, Any]]:
+    """Acciones probables del plan según el texto crudo (solo tools de READ_ONLY)."""
+    t = (user_msg or "").strip().lower()
+    if not t or not any(w in t for w in _MUSIC_WORDS):
+        return []
+    out = [{"server": "spotify", "tool": "whoami", "args": {}}]
+    genre = find_genre(t)
+    if genre and not any(w in t for w in _PLAYLIST_WORDS):
+        out.append({"server": "spotify", "tool": "get_recommendations",
+                    "args": {"mood": genre, "limit": _count(t) or 10}})
+    return out
+
+
+class Speculation:
+    """
+    Llamadas especuladas de un turno. take() entrega de una vez las que el plan
+    real reutiliza; con un plan en streaming se usa match() por acción y close() al final.
+    """
+
+    def __init__(self, actions: List[Dict[str, Any]], future: Future, seeded: List[ToolResult] = ()):
+        self.actions = actions
+        self.keys = {action_key(a.get("server"), a.get("tool"), a.get("args")) for a in actions}
+        # resultados que la app ya tenía (whoami): se sirven igual, pero no cuentan como especulados
+        self.seeded = {action_key(r.server, r.tool, r.args) for r in seeded}
+        self.future = future
+        self.hits: Dict[Tuple[str, str, str], ToolResult] = {}
+        self._results: Optional[Dict[Tuple[str, str, str], ToolResult]] = None
+        self._stale = False
+        self._closed = False
+
+    def _done(self) -> Dict[Tuple[str, str, str], ToolResult]:
+        if self._results is None:
+            try:
+                self._results = {action_key(r.server, r.tool, r.args): r
+                                 for r in self.future.result(timeout=WAIT_S) if r.ok}
+            except Exception:
+                self._results = {}
+        return self._results
+
+    def match(self, action: Dict[str, Any]) -> Optional[ToolResult]:
+        """Resultado especulado para esta acción del plan, o None."""
+        srv, tl, _ = key = action_key(action.get("server"), action.get("tool"), action.get("args"))
+        # Solo sirven acciones anteriores a la primera que cambia estado en Spotify (p.ej. auth_complete).
+        if self._stale or (srv == "spotify" and (srv, tl) not in READ_ONLY):
+            self._stale = True
+            return None
+        if key not in self.keys or key in self.hits:
+            return None
+        hit = self._done().get(key)
+        if hit is not None:
+            self.hits[key] = hit
+        return hit
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        hits = {k: r for k, r in self.hits.items() if k not in self.seeded}
+        speculated = len(self.keys - self.seeded)
+        with _stats_lock:
+            _stats["turns"] += 1
+            _stats["speculated"] += speculated
+            _stats["hits"] += len(hits)
+            _stats["wasted"] += speculated - len(hits)
+            _stats["saved_ms"] += sum(r.elapsed_ms for r in hits.values())
+            _stats["seeded_hits"] += len(self.hits) - len(hits)
+
+    def take(self, plan: List[Dict[str, Any]]) -> Dict[Tuple[str, str, str], ToolResult]:
+        for a in plan:
+            self.match(a)
+        self.close()
+        return dict(self.hits)
+
+
+def _is_whoami(a: Dict[str, Any]) -> bool:
+    return a.get("server") == "spotify" and a.get("tool") == "whoami"
+
+
+def speculate(user_msg: str, who: Optional[Dict[str, Any]] = None) -> Optional[Speculation]:
+    """
+    Lanza en segundo plano las llamadas adivinadas para user_msg; None si no hay nada que especular.
+    `who`: respuesta de whoami que la app ya tiene; se usa como resultado en vez de volver a pedirla.
+    """
+    if not ENABLED:
+        return None
+    actions = guess_actions(user_msg)
+    calls = [a for a in actions if not _is_whoami(a)]
+    if not calls and who is None:
+        return None  # sólo whoami y sin respuesta previa: no vale un server MCP extra
+    seeded: List[ToolResult] = []
+    if who is None:
+        calls = actions
+    elif len(calls) < len(actions):
+        seeded.append(ToolResult(server="spotify", tool="whoami", args={}, ok=True,
+                                 result={"structuredContent": who}, data=who))
+    if not calls:
+        fut: Future = Future()
+        fut.set_result(seeded)
+        return Speculation(actions, fut, seeded)
+    from mcp_client import execute_plan
+    return Speculation(actions, _pool.submit(lambda: seeded + asyncio.run(execute_plan(calls))), seeded)
+
+
+def prefetch_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        s = dict(_stats)
+    s["hit_rate"] = round(s["hits"] / s["speculated"], 3) if s["speculated"] else 0.0
+    s["saved_ms"] = round(s["saved_ms"], 2)
+    return s
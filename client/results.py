@@ -0,0 +1,90 @@
+# results.py
+"""
+Resultados tipados de execute_plan.
+
+Cada llamada MCP se parsea una sola vez al terminar: el payload sale de
+structuredContent (o, si el server solo devolvió texto, de _text como JSON /
+NDJSON) y de ahí se extraen los campos que usa la UI: pistas, URL e id de la
+playlist, canciones agregadas, authorize_url. app.py y finalize_llm leen esos
+campos; `result` conserva la respuesta MCP cruda para los logs.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from json_stream import iter_json_values
+
+
+def parse_ndjson_objects(raw: str) -> List[Dict[str, Any]]:
+    """Convierte NDJSON (o JSONs pegados) a lista de dicts; para texto que llega por partes, JSONStreamDecoder."""
+    return [o for o in iter_json_values(raw) if isinstance(o, dict)]
+
+
+def _payload(result: Any) -> Any:
+    """Payload de una respuesta MCP: structuredContent (sin el envoltorio {"result": ...}) o el texto parseado."""
+    if not isinstance(result, dict):
+        return result
+    sc = result.get("structuredContent")
+    if isinstance(sc, dict) and sc:
+        return sc["result"] if set(sc) == {"result"} else sc
+    raw = result.get("_text")
+    if not isinstance(raw, str) or not raw.strip():
+        return None
+    # una sola pasada: un JSON, o varios pegados (FastMCP manda cada elemento de una lista como un bloque aparte)
+    values = list(iter_json_values(raw))
+    if len(values) == 1 and values[0] is not None:
+        return values[0]
+    return [v for v in values if isinstance(v, dict)] or raw
+
+
+@dataclass(slots=True)
+class ToolResult:
+    server: str
+    tool: str
+    args: Dict[str, Any]
+    ok: bool
+    result: Any = None                 # respuesta MCP cruda (content, structuredContent, _text)
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+    prefetched: bool = False
+    data: Any = None                   # payload parseado
+    tracks: List[Dict[str, Any]] = field(default_factory=list)
+    url: Optional[str] = None
+    playlist_id: Optional[str] = None
+    added: Optional[int] = None
+    authorize_url: Optional[str] = None
+
+    @classmethod
+    def from_raw(cls, r: Dict[str, Any]) -> "ToolResult":
+        """Desde el dict {server, tool, args, ok, result, error, elapsed_ms} que arma el ejecutor."""
+        out = cls(server=r.get("server") or "", tool=r.get("tool") or "", args=r.get("args") or {},
+                  ok=bool(r.get("ok")), result=r.get("result"), error=r.get("error"),
+                  elapsed_ms=float(r.get("elapsed_ms") or 0.0), prefetched=bool(r.get("prefetched")))
+        if out.ok:
+            out.data = data = _payload(out.result)
+            if isinstance(data, list):
+                out.tracks = [t for t in data if isinstance(t, dict) and t.get("id")]
+            elif isinstance(data, dict):
+                if data.get("id") and data.get("artists"):
+                    out.tracks = [data]
+                out.url = data.get("url")
+                out.playlist_id = data.get("playlist_id")
+                out.added = data.get("added")
+                out.authorize_url = data.get("authorize_url")
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Formato de los logs (el mismo que antes de tipar los resultados)."""
+        d = {"server": self.server, "tool": self.tool, "args": self.args, "ok": self.ok,
+             "result": self.result, "error": self.error, "elapsed_ms": self.elapsed_ms}
+        if self.prefetched:
+            d["prefetched"] = True
+        return d
+
+    def view(self) -> Dict[str, Any]:
+        """Vista compacta para el finalizer: el payload parseado en vez de la respuesta MCP completa."""
+        d = {"server": self.server, "tool": self.tool, "ok": self.ok}
+        if self.ok:
+            d["data"] = self.data
+        else:
+            d["error"] = self.error
+        return d
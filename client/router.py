@@ -0,0 +1,169 @@
+# router.py
+"""
+Router local de intenciones: arma el plan sin pasar por plan_llm cuando el
+mensaje encaja con un patrón de alta confianza.
+
+    - playlist de <género ...> [N] [pública|privada] → whoami + get_recommendations(mood="<género ...>", limit=N)
+    - recomiéndame N canciones de <género ...>        → get_recommendations(mood="<género ...>", limit=N)
+    - dame N más (del mismo estilo)                 → get_recommendations(mood=último mood, limit=N)
+    - link de la playlist                           → respuesta directa con la última URL
+    - hazla pública / privada                       → create_playlist_with_tracks con la canasta
+
+route() devuelve None si no hay coincidencia segura. Para medir cobertura
+sobre los logs grabados:
+
+    python router.py --logs "logs/*.jsonl" --planner-ms 1800
+"""
+import re, time
+from typing import Any, Dict, List, Optional
+
+# Más específicos primero: "rock and roll" antes que "rock".
+GENRES = ("rock and roll", "rock alternativo", "hip hop", "reggaeton", "lofi", "jazz", "pop", "metal",
+          "salsa", "cumbia", "blues", "indie", "punk", "techno", "house", "electrónica", "clásica", "rock")
+
+_PLAYLIST_RE = re.compile(r"\b(crea(?:me)?|crear|haz(?:me)?|arma(?:me)?|genera(?:me)?|dame|puedes darme)\b.*\b(playlist|lista)\b")
+_RECS_RE = re.compile(r"\b(recomi[eé]nda(?:me)?|recomienda|dame|pon(?:me)?)\b.*\b(\d{1,3})\s*(canciones|temas|tracks)\b")
+_COUNT_RE = re.compile(r"\b(\d{1,3})\s*(?:canciones|temas|tracks)\b")
+_MORE_RE = re.compile(r"^\s*dame\s+(\d{1,3})\s+m[aá]s\b")
+_LINK_RE = re.compile(r"\blink\b.*\bplaylist\b")
+_TOGGLE_RE = re.compile(r"^\s*(?:hazla|hacerla|ponla|que sea|la quiero)?\s*(p[uú]blica|privada)\s*[.!]?\s*$")
+_NOT_MUSIC = ("repositorio", "repo", "commit", "archivo", "película", "pelicula", "campeón", "campeon")
+
+
+def _genre_match(text: str) -> Optional["re.Match[str]"]:
+    """Primer género de GENRES (en ese orden) que aparece como palabra completa en text."""
+    for g in GENRES:
+        m = re.search(rf"\b{re.escape(g)}\b", text)
+        if m:
+            return m
+    return None
+
+
+def find_genre(text: str) -> Optional[str]:
+    m = _genre_match((text or "").lower())
+    return m.group(0) if m else None
+
+
+_MOOD_STOP = re.compile(r"[\"“”'‘’,.;:!?\\]|\s(?:llamad[ao]|con el nombre|p[uú]blica|privada|por favor|en spotify|en el mercado)\b")
+
+
+def _mood_phrase(text: str, genre: "re.Match[str]") -> str:
+    """Género más sus calificativos ("rock para un día lluvioso"), para que el server infiera el mood completo."""
+    rest = text[genre.start():]
+    m = _MOOD_STOP.search(rest, genre.end() - genre.start())
+    rest = re.sub(r"\s*\b(?:de|con)?\s*\d{1,3}\s*(?:canciones|temas|tracks)\b", "", rest[:m.start()] if m else rest)
+    return re.sub(r"\s+", " ", rest).strip() or genre.group(0)
+
+
+def _count(text: str) -> Optional[int]:
+    """Cantidad pedida: sólo un número pegado a canciones/temas/tracks ("rock de los 80" no es un 80)."""
+    m = _COUNT_RE.search(text)
+    return max(1, min(int(m.group(1)), 100)) if m else None
+
+
+def _stray_number(text: str) -> bool:
+    """Hay un número que no es la cantidad (década, año, "top 40"...): mejor que lo interprete el planner."""
+    return bool(re.search(r"\d", _COUNT_RE.sub("", text)))
+
+
+def _plan(route: str, actions: List[Dict[str, Any]], reply: str) -> Dict[str, Any]:
+    return {"reply_preview": reply, "thought": f"Plan local (router: {route}), sin planner LLM.",
+            "actions": actions, "route": route}
+
+
+def route(user_msg: str, music_ctx: Optional[Dict[str, Any]] = None, authed: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+    """Plan {reply_preview, thought, actions, route} para intenciones comunes, o None si no hay match seguro."""
+    t = re.sub(r"\s+", " ", (user_msg or "").strip().lower())
+    ctx = music_ctx or {}
+    if not t or any(w in t for w in _NOT_MUSIC):
+        return None
+
+    if _LINK_RE.search(t):
+        url = ctx.get("last_playlist_url")
+        if not url:
+            return None
+        return _plan("playlist_link", [], f"✅ Aquí tienes el link de **{ctx.get('last_playlist_name') or 'tu playlist'}**: {url}")
+
+    m = _TOGGLE_RE.match(t)
+    if m:
+        public = m.group(1) != "privada"
+        b = ctx.get("basket")
+        if not b:
+            return _plan("visibility", [], f"Listo, la próxima playlist será {'pública' if public else 'privada'}. "
+                                           "¿De qué género o mood la armo?")
+        track_ids = b.take(b.target)
+        return _plan("visibility", [{
+            "server": "spotify", "tool": "create_playlist_with_tracks",
+            "args": {"name": ctx.get("last_playlist_name") or "Mi Mix", "track_ids": track_ids,
+                     "public": public, "description": f"Generada desde chat • {len(track_ids)} tracks"},
+        }], f"Creo la playlist {'pública' if public else 'privada'} con {len(track_ids)} canciones.")
+
+    m = _MORE_RE.match(t)
+    if m and ctx.get("last_mood"):
+        n = max(1, min(int(m.group(1)), 100))
+        return _plan("more", [{"server": "spotify", "tool": "get_recommendations",
+                               "args": {"mood": ctx["last_mood"], "limit": n}}],
+                     f"Te paso {n} más de {ctx['last_mood']}. ¿Más clásico o más moderno?")
+
+    gm = _genre_match(t)
+    if not gm or _stray_number(t):
+        return None
+    mood = _mood_phrase(t, gm)
+
+    if _PLAYLIST_RE.search(t):
+        if authed is False:
+            return _plan("auth", [{"server": "spotify", "tool": "whoami", "args": {}},
+                                  {"server": "spotify", "tool": "auth_begin", "args": {}}],
+                         "Primero conecta tu cuenta de Spotify con el enlace y luego armo la playlist.")
+        n = _count(t) or 10
+        return _plan("genre_playlist", [{"server": "spotify", "tool": "whoami", "args": {}},
+                                        {"server": "spotify", "tool": "get_recommendations",
+                                         "args": {"mood": mood, "limit": n}}],
+                     f"Armo una playlist de {mood} con {n} canciones. ¿La quieres pública o privada?")
+
+    m = _RECS_RE.search(t)
+    if m:
+        n = max(1, min(int(m.group(2)), 100))
+        return _plan("genre_recs", [{"server": "spotify", "tool": "get_recommendations",
+                                     "args": {"mood": mood, "limit": n}}],
+                     f"Te paso {n} canciones de {mood}. ¿Te paso 5 más del mismo estilo? · ¿Más clásico o más moderno?")
+    return None
+
+
+def coverage(turns: List[Dict[str, Any]], planner_ms: float) -> Dict[str, Any]:
+    """Cobertura del router sobre turnos grabados y ahorro estimado de latencia del planner."""
+    by_route: Dict[str, int] = {}
+    elapsed = []
+    for tr in turns:
+        t0 = time.perf_counter()
+        plan = route(tr["user"], {"last_playlist_url": None, "last_mood": None})
+        elapsed.append((time.perf_counter() - t0) * 1000)
+        if plan:
+            by_route[plan["route"]] = by_route.get(plan["route"], 0) + 1
+    routed = sum(by_route.values())
+    return {
+        "turns": len(turns), "routed": routed,
+        "coverage": round(routed / len(turns), 3) if turns else 0.0,
+        "by_route": by_route,
+        "router_ms_max": round(max(elapsed), 3) if elapsed else 0.0,
+        "planner_ms_saved": round(routed * planner_ms, 1),
+    }
+
+
+if __name__ == "__main__":
+    import os, json, argparse
+    from llm_backends import load_recorded_turns
+
+    ap = argparse.ArgumentParser(description="Cobertura del router local sobre logs grabados.")
+    ap.add_argument("--logs", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "*.jsonl"))
+    ap.add_argument("--planner-ms", type=float, default=1800.0, help="latencia típica de plan_llm para estimar ahorro")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+    turns = load_recorded_turns(args.logs)
+    if args.verbose:
+        for tr in turns:
+            plan = route(tr["user"])
+            if plan:
+                moods = [a["args"].get("mood") for a in plan["actions"] if a["args"].get("mood")]
+                print(f"{plan['route']:15} {tr['user'][:70]!r} → {moods}")
+    print(json.dumps(coverage(turns, args.planner_ms), indent=2, ensure_ascii=False))
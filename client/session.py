@@ -1,12 +1,114 @@
+# session.py
+"""
+Historial de la conversación, acotado por tamaño.
+
+Los mensajes viven en un deque (ring buffer): al pasar de `max_bytes`
+(contenido + razonamiento en UTF-8) o de `max_turns` se descartan los más
+viejos en O(1). En paralelo alimenta una ContextWindow, así el contexto para
+el LLM (get_context) ya viene con presupuesto de tokens y resumen de lo que salió.
+
+    SESSION_MAX_BYTES=262144  CHAT_HISTORY_MAX=200
+"""
+import os, json
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+from context import ContextWindow
+
+MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024)))
+MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX", "200"))
+
+
+def _nbytes(m: Dict[str, Any]) -> int:
+    return len((m.get("content") or "").encode("utf-8")) + len((m.get("thought") or "").encode("utf-8")) + 64
+
+
+def dump_message(m: Dict[str, Any]) -> Dict[str, Any]:
+    """Mensaje apto para JSON (ts en ISO 8601)."""
+    return {**m, "ts": m["ts"].isoformat()} if isinstance(m.get("ts"), datetime) else m
+
+
+def load_message(m: Dict[str, Any]) -> Dict[str, Any]:
+    m = dict(m)
+    if isinstance(m.get("ts"), str):
+        try:
+            m["ts"] = datetime.fromisoformat(m["ts"])
+        except ValueError:
+            m["ts"] = datetime.now()
+    return m
+
+
 class Session:
-    def __init__(self, max_turns=10):
-        self.history = []
+    __slots__ = ("turns", "max_bytes", "max_turns", "size", "evicted", "window", "on_add")
+
+    def __init__(self, max_bytes: int = MAX_BYTES, max_turns: int = MAX_TURNS,
+                 window: Optional[ContextWindow] = None):
+        self.turns: Deque[Dict[str, Any]] = deque()
+        self.max_bytes = max_bytes
         self.max_turns = max_turns
+        self.size = 0
+        self.evicted = 0
+        self.window = window or ContextWindow()
+        # p.ej. session_store: persiste cada mensaje nuevo (append incremental)
+        self.on_add: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    def add(self, role: str, content: str, **extra) -> Dict[str, Any]:
+        """Agrega un mensaje {role, content, ts, ...extra} y descarta los más viejos si se pasa del presupuesto."""
+        m = {"role": role, "content": content or "", **extra}
+        m.setdefault("ts", datetime.now())
+        self.turns.append(m)
+        self.size += _nbytes(m)
+        self.window.add(role, m["content"])
+        self._evict()
+        if self.on_add:
+            self.on_add(m)
+        return m
+
+    def _evict(self) -> None:
+        while len(self.turns) > 1 and (self.size > self.max_bytes or len(self.turns) > self.max_turns):
+            self.size -= _nbytes(self.turns.popleft())
+            self.evicted += 1
+
+    def add_turn(self, user_msg: str, reply: Optional[str] = None) -> None:
+        self.add("user", user_msg)
+        if reply is not None:
+            self.add("assistant", reply)
+
+    def get_context(self, facts: Optional[Dict[str, Any]] = None) -> str:
+        """Transcripción para el LLM: resumen + hechos clave=valor + últimos turnos dentro del presupuesto."""
+        return self.window.render(facts)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.turns)
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": [dump_message(m) for m in self.turns],
+            "window": self.window.to_dict(),
+            "evicted": self.evicted,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], **kw) -> "Session":
+        s = cls(window=ContextWindow.from_dict(data.get("window") or {}), **kw)
+        for m in data.get("turns") or []:
+            m = load_message(m)
+            s.turns.append(m)
+            s.size += _nbytes(m)
+        s.evicted = int(data.get("evicted") or 0)
+        s._evict()
+        return s
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
 
-    def add_turn(self, user_msg: str):
-        self.history.append(user_msg)
-        if len(self.history) > self.max_turns:
-            self.history.pop(0)
+    @classmethod
+    def from_json(cls, raw: str, **kw) -> "Session":
+        return cls.from_dict(json.loads(raw), **kw)
 
-    def get_context(self):
-        return self.history
+    def snapshot(self) -> Dict[str, Any]:
+        return {"messages": len(self.turns), "bytes": self.size, "evicted": self.evicted, "context": self.window.snapshot()}
@@ -0,0 +1,245 @@
+# session_store.py
+"""
+Persistencia de sesiones del chat fuera del proceso de Streamlit.
+
+Cada sesión (sid) guarda sus mensajes con append incremental (un registro por
+mensaje, nunca se reescribe el historial) y un estado pequeño que se reemplaza
+entero: music_ctx + la ventana de contexto del planner. Así una recarga, u
+otra réplica detrás del balanceador, retoma la conversación sin re-llamar al LLM.
+
+    SESSION_STORE=memory                  → LRU en proceso (default)
+    SESSION_STORE=sqlite:client/sessions.sqlite3
+    SESSION_STORE=file:client/sessions    → un .jsonl por sesión
+    SESSION_STORE=paquete.modulo:Clase    → store propio (p.ej. Redis)
+    SESSION_STORE_MAX=1000                → sesiones en el LRU en memoria
+"""
+import os, re, json, sqlite3, threading, importlib
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+
+from session import MAX_TURNS, dump_message
+
+MAX_SESSIONS = int(os.getenv("SESSION_STORE_MAX", "1000"))
+
+_SID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def valid_sid(sid: Optional[str]) -> bool:
+    return bool(sid and _SID_RE.match(sid))
+
+
+class SessionStore:
+    """append(sid, msg) por mensaje, set_state(sid, state) por turno y load(sid) → {"messages", "state"} o None."""
+
+    def append(self, sid: str, message: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def set_state(self, sid: str, state: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def load(self, sid: str, limit: int = MAX_TURNS) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def delete(self, sid: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryStore(SessionStore):
+    """LRU en proceso: no sobrevive reinicios ni se comparte entre réplicas."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, max_messages: int = MAX_TURNS):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, sid: str) -> Dict[str, Any]:
+        e = self._data.get(sid)
+        if e is None:
+            e = self._data[sid] = {"messages": deque(maxlen=self.max_messages), "state": {}}
+            while len(self._data) > self.max_sessions:
+                self._data.popitem(last=False)
+        else:
+            self._data.move_to_end(sid)
+        return e
+
+    def append(self, sid, message):
+        with self._lock:
+            self._entry(sid)["messages"].append(dump_message(message))
+
+    def set_state(self, sid, state):
+        with self._lock:
+            self._entry(sid)["state"] = json.loads(json.dumps(state, default=str))
+
+    def load(self, sid, limit=MAX_TURNS):
+        with self._lock:
+            e = self._data.get(sid)
+            if e is None:
+                return None
+            self._data.move_to_end(sid)
+            return {"messages": list(e["messages"])[-limit:], "state": dict(e["state"])}
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class SQLiteStore(SessionStore):
+    """Un archivo SQLite (WAL) compartible por varias réplicas en el mismo volumen."""
+
+    def __init__(self, path: str, max_messages: int = MAX_TURNS):
+        self.path = path
+        self.max_messages = max_messages
+        self._local = threading.local()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        with self._conn() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("CREATE TABLE IF NOT EXISTS messages (sid TEXT NOT NULL, seq INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)")
+            c.execute("CREATE INDEX IF NOT EXISTS messages_sid ON messages (sid, seq)")
+            c.execute("CREATE TABLE IF NOT EXISTS state (sid TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = self._local.conn = sqlite3.connect(self.path, timeout=10)
+        return c
+
+    def append(self, sid, message):
+        with self._conn() as c:
+            c.execute("INSERT INTO messages (sid, data) VALUES (?, ?)",
+                      (sid, json.dumps(dump_message(message), ensure_ascii=False, default=str)))
+
+    def set_state(self, sid, state):
+        with self._conn() as c:
+            c.execute("INSERT INTO state (sid, data, updated) VALUES (?, ?, julianday('now')) "
+                      "ON CONFLICT(sid) DO UPDATE SET data=excluded.data, updated=excluded.updated",
+                      (sid, json.dumps(state, ensure_ascii=False, default=str)))
+            # mensajes que ya no se van a cargar: se podan una vez por turno
+            c.execute("DELETE FROM messages WHERE sid=? AND seq < (SELECT MIN(seq) FROM "
+                      "(SELECT seq FROM messages WHERE sid=? ORDER BY seq DESC LIMIT ?))",
+                      (sid, sid, self.max_messages))
+
+    def load(self, sid, limit=MAX_TURNS):
+        c = self._conn()
+        st = c.execute("SELECT data FROM state WHERE sid=?", (sid,)).fetchone()
+        rows = c.execute("SELECT data FROM messages WHERE sid=? ORDER BY seq DESC LIMIT ?", (sid, limit)).fetchall()
+        if st is None and not rows:
+            return None
+        return {"messages": [json.loads(r[0]) for r in reversed(rows)], "state": json.loads(st[0]) if st else {}}
+
+    def delete(self, sid):
+        with self._conn() as c:
+            c.execute("DELETE FROM messages WHERE sid=?", (sid,))
+            c.execute("DELETE FROM state WHERE sid=?", (sid,))
+
+
+class FileStore(SessionStore):
+    """
+    Un <sid>.jsonl por sesión: líneas {"m": mensaje} o {"state": ...}; al cargar gana el último estado.
+    La compactación va en el camino de escritura (bajo el lock), nunca dentro de load().
+    """
+
+    def __init__(self, directory: str, max_messages: int = MAX_TURNS):
+        self.directory = directory
+        self.max_messages = max_messages
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lines: Dict[str, int] = {}   # líneas por archivo, para decidir cuándo compactar
+
+    def _path(self, sid: str) -> str:
+        if not valid_sid(sid):
+            raise ValueError(f"sid inválido: {sid!r}")
+        return os.path.join(self.directory, f"{sid}.jsonl")
+
+    def _write(self, sid: str, rec: Dict[str, Any]) -> None:
+        line = json.dumps(rec, ensure_ascii=False, default=str) + "\n"
+        path = self._path(sid)
+        with self._lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+            n = self._lines.get(sid)
+            if n is None:
+                with open(path, encoding="utf-8") as f:
+                    n = sum(1 for _ in f)
+            else:
+                n += 1
+            if n > 2 * self.max_messages + 50:
+                n = self._compact(path)
+            self._lines[sid] = n
+
+    def append(self, sid, message):
+        self._write(sid, {"m": dump_message(message)})
+
+    def set_state(self, sid, state):
+        self._write(sid, {"state": state})
+
+    @staticmethod
+    def _read(path: str, limit: int) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return None
+        messages: deque = deque(maxlen=limit)
+        state: Dict[str, Any] = {}
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # línea a medio escribir
+            if "m" in rec:
+                messages.append(rec["m"])
+            elif "state" in rec:
+                state = rec["state"]
+        return {"messages": list(messages), "state": state}
+
+    def load(self, sid, limit=MAX_TURNS):
+        return self._read(self._path(sid), limit)
+
+    def _compact(self, path: str) -> int:
+        """Reescribe el archivo solo con lo que load() devolvería (con el lock tomado). Devuelve sus líneas."""
+        data = self._read(path, self.max_messages) or {"messages": [], "state": {}}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for m in data["messages"]:
+                f.write(json.dumps({"m": m}, ensure_ascii=False, default=str) + "\n")
+            f.write(json.dumps({"state": data["state"]}, ensure_ascii=False, default=str) + "\n")
+        os.replace(tmp, path)
+        return len(data["messages"]) + 1
+
+    def delete(self, sid):
+        with self._lock:
+            self._lines.pop(sid, None)
+            try:
+                os.remove(self._path(sid))
+            except FileNotFoundError:
+                pass
+
+
+def make_store(spec: Optional[str] = None) -> SessionStore:
+    spec = (spec or os.getenv("SESSION_STORE") or "memory").strip()
+    kind, _, arg = spec.partition(":")
+    if kind.lower() == "memory":
+        return MemoryStore()
+    if kind.lower() == "sqlite":
+        return SQLiteStore(arg or os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.sqlite3"))
+    if kind.lower() == "file":
+        return FileStore(arg or os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions"))
+    if arg:
+        return getattr(importlib.import_module(kind), arg)()
+    raise ValueError(f"SESSION_STORE desconocido: {spec!r} (opciones: memory, sqlite:<ruta>, file:<dir>, modulo:Clase)")
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def store() -> SessionStore:
+    """Store del proceso (compartido por todas las sesiones de Streamlit)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = make_store()
+    return _store
@@ -0,0 +1,138 @@
+# bench_tools.py
+"""
+Benchmark de las tools MCP contra el transport falso (sin red ni credenciales).
+
+    python bench_tools.py --iterations 30 --concurrency 8 --latency-ms 80 --rate-429 0.02
+
+Cada tool se llama en proceso, igual que lo haría FastMCP, y se reporta
+p50/p95/máx, throughput y llamadas al "upstream" por tool. Los estados
+locales (feature store, índice de pistas) van a un directorio temporal para
+que cada corrida parta igual.
+"""
+import os, sys, json, time, asyncio, argparse, tempfile, statistics, logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+
+def _setup_env(args) -> None:
+    tmp = tempfile.mkdtemp(prefix="spotify-bench-")
+    os.environ["SPOTIFY_TRANSPORT"] = "fake"
+    os.environ.setdefault("SPOTIFY_FEATURE_DB", os.path.join(tmp, "features.sqlite3") if args.warm_store else "off")
+    os.environ.setdefault("SPOTIFY_TRACK_INDEX", os.path.join(tmp, "track_index.json.gz") if args.warm_index else "off")
+    os.environ["SPOTIFY_FAKE_SEED"] = str(args.seed)
+    os.environ["SPOTIFY_FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["SPOTIFY_FAKE_JITTER_MS"] = str(args.jitter_ms)
+    os.environ["SPOTIFY_FAKE_ERROR_RATE"] = str(args.error_rate)
+    os.environ["SPOTIFY_FAKE_429_RATE"] = str(args.rate_429)
+    os.environ["SPOTIFY_FAKE_RETRY_AFTER_S"] = str(args.retry_after_s)
+    if args.deprecated:
+        os.environ["SPOTIFY_FAKE_DEPRECATED"] = args.deprecated
+    if not args.real_limits:
+        for k in ("SPOTIFY_APP_RATE", "SPOTIFY_APP_BURST", "SPOTIFY_USER_RATE", "SPOTIFY_USER_BURST"):
+            os.environ[k] = "10000"
+
+
+def _scenarios(S) -> Dict[str, Callable[[int], object]]:
+    moods = ["rock para correr", "lofi para estudiar", "fiesta reggaeton", "jazz para una cena", "synthwave de noche"]
+    ids = [t["id"] for t in S.svc().search_tracks("classic rock anthems", limit=10)]
+    tracks = [S.Track(**t) for t in S.svc().search_tracks("cool jazz classics", limit=5)]
+    pl = asyncio.run(S.create_playlist("bench", "seed"))["playlist_id"]
+
+    def run(fn, *a, **kw):
+        out = fn(*a, **kw)
+        return asyncio.run(out) if asyncio.iscoroutine(out) else out
+
+    return {
+        "ping": lambda i: run(S.ping),
+        "server_info": lambda i: run(S.server_info),
+        "whoami": lambda i: run(S.whoami),
+        "search_track": lambda i: run(S.search_track, f"{moods[i % len(moods)].split()[0]} hits", limit=20),
+        "analyze_mood": lambda i: run(S.analyze_mood, moods[i % len(moods)]),
+        "get_recommendations": lambda i: run(S.get_recommendations, mood=moods[i % len(moods)], limit=20),
+        "get_recommendations_seeded": lambda i: run(S.get_recommendations, seed_tracks=ids[:3], limit=20, seed=i),
+        "create_playlist": lambda i: run(S.create_playlist, f"bench {i}"),
+        "add_to_playlist": lambda i: run(S.add_to_playlist, pl, ids),
+        "create_playlist_with_tracks": lambda i: run(S.create_playlist_with_tracks, f"bench {i}", ids[:2],
+                                                     desired_count=50, mood=moods[i % len(moods)]),
+        "ensure_device_ready": lambda i: run(S.ensure_device_ready),
+        "play_playlist": lambda i: run(S.play_playlist, pl),
+        "explain_selection": lambda i: run(S.explain_selection, tracks, S.ExplainContext(mood="chill")),
+        "build_playlist_from_profile": lambda i: run(S.build_playlist_from_profile, moods[i % len(moods)], limit=25),
+        "create_public_mix": lambda i: run(S.create_public_mix, moods[i % len(moods)], limit=20),
+    }
+
+
+def _bench(name: str, fn: Callable[[int], object], iterations: int, concurrency: int, transport) -> dict:
+    before = sum(transport.snapshot()["calls"].values())
+    lat: List[float] = []
+    errors = 0
+
+    def one(i: int):
+        t0 = time.perf_counter()
+        try:
+            fn(i)
+            return time.perf_counter() - t0, None
+        except Exception as e:
+            return time.perf_counter() - t0, e
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        for dt, err in ex.map(one, range(iterations)):
+            lat.append(dt * 1000)
+            errors += err is not None
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "tool": name, "n": iterations, "errors": errors,
+        "p50_ms": round(statistics.median(lat), 2),
+        "p95_ms": round(lat[min(len(lat) - 1, int(0.95 * len(lat)))], 2),
+        "max_ms": round(lat[-1], 2),
+        "rps": round(iterations / wall, 1) if wall else 0.0,
+        "upstream_per_call": round((sum(transport.snapshot()["calls"].values()) - before) / iterations, 2),
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--iterations", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--retry-after-s", type=float, default=0.2)
+    ap.add_argument("--deprecated", default="", help="endpoints que responden 404, p.ej. recommendations,audio_features")
+    ap.add_argument("--real-limits", action="store_true", help="respetar SPOTIFY_*_RATE en vez de desactivarlos")
+    ap.add_argument("--warm-store", action="store_true", help="usar feature store (temporal) en vez de 'off'")
+    ap.add_argument("--warm-index", action="store_true", help="usar índice de pistas (temporal) en vez de 'off'")
+    ap.add_argument("--only", default="", help="lista de tools separadas por coma")
+    ap.add_argument("--out", default="", help="guardar resultados en JSON")
+    args = ap.parse_args(argv)
+
+    _setup_env(args)
+    logging.disable(logging.WARNING)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import server as S
+
+    transport = S.svc().transport
+    scen = _scenarios(S)
+    only = {x.strip() for x in args.only.split(",") if x.strip()}
+    rows = [_bench(n, fn, args.iterations, args.concurrency, transport)
+            for n, fn in scen.items() if not only or n in only]
+
+    print(f"{'tool':30} {'n':>4} {'err':>4} {'p50':>9} {'p95':>9} {'max':>9} {'rps':>7} {'up/call':>8}")
+    for r in rows:
+        print(f"{r['tool']:30} {r['n']:>4} {r['errors']:>4} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+              f"{r['max_ms']:>9} {r['rps']:>7} {r['upstream_per_call']:>8}")
+    snap = {"args": vars(args), "results": rows, "transport": transport.snapshot(),
+            "rate_limits": S.svc().limits.snapshot(), "coalescing": S.svc().flights.snapshot()}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(snap, f, indent=2)
+        print(f"✅ resultados en {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,72 @@
+# diversity.py
+import math, random
+from typing import Dict, List, Optional, Sequence
+
+from features import FeatureMatrix
+
+SIM_KEYS = ("energy", "valence", "danceability")
+ERA_YEARS = 10.0   # a esta distancia (años) dos pistas ya no se parecen por época
+JITTER = 0.15      # ruido máximo sobre la relevancia cuando hay seed
+
+
+def main_artist(t: dict) -> str:
+    return ((t.get("artists") or [{}])[0].get("name") or "").strip().lower()
+
+
+def release_year(t: dict) -> Optional[int]:
+    d = str(t.get("release_date") or "")[:4]
+    return int(d) if d.isdigit() else None
+
+
+def select_diverse(tracks: Sequence[dict], k: int, features: Optional[FeatureMatrix] = None,
+                   seed: Optional[int] = None, lam: float = 0.7) -> List[dict]:
+    """
+    Selección tipo MMR (max-marginal-relevance) de hasta k pistas.
+
+    `tracks` llega ordenado por relevancia; se conserva una pista por artista
+    principal (la más relevante) y luego se elige iterativamente la que maximiza
+    lam * relevancia - (1 - lam) * similitud máxima con lo ya elegido, donde la
+    similitud combina época (año de lanzamiento) y distancia de features.
+    Sin seed el resultado depende sólo de la entrada (cacheable); con seed se
+    agrega un ruido reproducible a la relevancia. Costo O(k · n).
+    """
+    pool, artists, ids = [], set(), set()
+    for t in tracks:
+        tid, art = t.get("id"), main_artist(t)
+        if not tid or tid in ids or art in artists:
+            continue
+        ids.add(tid); artists.add(art); pool.append(t)
+    n, k = len(pool), max(0, min(int(k), len(pool)))
+    if k == 0:
+        return []
+
+    rnd = random.Random(seed) if seed is not None else None
+    rel = [1.0 - i / n + (rnd.uniform(0.0, JITTER) if rnd else 0.0) for i in range(n)]
+    years = [release_year(t) for t in pool]
+    vecs: List[Optional[tuple]] = []
+    for t in pool:
+        f = features[t["id"]] if features is not None and t["id"] in features else {}
+        v = tuple(f.get(x) for x in SIM_KEYS)
+        vecs.append(v if all(x is not None for x in v) else None)
+
+    def sim(i: int, j: int) -> float:
+        parts = []
+        if years[i] is not None and years[j] is not None:
+            parts.append(max(0.0, 1.0 - abs(years[i] - years[j]) / ERA_YEARS))
+        if vecs[i] is not None and vecs[j] is not None:
+            d = math.sqrt(sum((a - b) ** 2 for a, b in zip(vecs[i], vecs[j])) / len(SIM_KEYS))
+            parts.append(1.0 - d)
+        return sum(parts) / len(parts) if parts else 0.0
+
+    max_sim = [0.0] * n
+    left = list(range(n))
+    out: List[dict] = []
+    while len(out) < k:
+        best = max(left, key=lambda i: (lam * rel[i] - (1.0 - lam) * max_sim[i], -i))
+        left.remove(best)
+        out.append(pool[best])
+        for i in left:
+            s = sim(i, best)
+            if s > max_sim[i]:
+                max_sim[i] = s
+    return out
@@ -0,0 +1,143 @@
+# feature_store.py
+import os, csv, sqlite3, threading, time, logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from features import FEATURE_KEYS
+
+DEFAULT_PATH = os.getenv("SPOTIFY_FEATURE_DB", str(Path(__file__).with_name("features.sqlite3")))
+MISS_TTL_S = float(os.getenv("SPOTIFY_FEATURE_MISS_TTL_S", str(24 * 3600)))
+_SQL_CHUNK = 500  # por debajo del límite de variables de SQLite
+
+
+class FeatureStore:
+    """
+    Persistent audio-feature cache keyed by Spotify track id (SQLite).
+
+    Every batch fetched from /audio-features is written here, and
+    audio_features_map reads it before calling the API, so ranking and
+    explanations keep working when the endpoint is down or deprecated.
+    It can also be seeded offline from a CSV/Parquet dump with `import_file`.
+    Ids the API answered with null (or refused with 403) are recorded as
+    misses for MISS_TTL_S, so they are not requested again on every call.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        cols = ", ".join(f"{k} REAL" for k in FEATURE_KEYS)
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS features (id TEXT PRIMARY KEY, {cols}, updated_at REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS misses (id TEXT PRIMARY KEY, until REAL)")
+        self._db.commit()
+
+    def get_many(self, ids: Iterable[str]) -> Tuple[List[dict], List[str]]:
+        """
+        Devuelve (registros encontrados, ids faltantes) preservando el orden de entrada.
+        Los ids con una marca de miss vigente no están en ninguna de las dos listas.
+        """
+        ids = list(dict.fromkeys(i for i in ids if i))
+        found: Dict[str, dict] = {}
+        skip = set()
+        sel = ", ".join(("id",) + FEATURE_KEYS)
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(ids), _SQL_CHUNK):
+                chunk = ids[i:i+_SQL_CHUNK]
+                marks = ','.join('?' * len(chunk))
+                for row in self._db.execute(f"SELECT {sel} FROM features WHERE id IN ({marks})", chunk):
+                    found[row[0]] = dict(zip(("id",) + FEATURE_KEYS, row))
+                for (tid,) in self._db.execute(f"SELECT id FROM misses WHERE until > ? AND id IN ({marks})", [now, *chunk]):
+                    skip.add(tid)
+        return [found[i] for i in ids if i in found], [i for i in ids if i not in found and i not in skip]
+
+    def put_many(self, records: Iterable[Optional[dict]]) -> int:
+        now = time.time()
+        rows = [
+            (r["id"], *(_num(r.get(k)) for k in FEATURE_KEYS), now)
+            for r in records if r and r.get("id")
+        ]
+        if not rows:
+            return 0
+        q = f"INSERT OR REPLACE INTO features VALUES ({','.join('?' * (len(FEATURE_KEYS) + 2))})"
+        with self._lock:
+            self._db.executemany(q, rows)
+            self._db.commit()
+        return len(rows)
+
+    def put_misses(self, ids: Iterable[str], ttl: float = MISS_TTL_S) -> int:
+        """Marca ids sin features (null o 403) para no volver a pedirlos durante `ttl` segundos."""
+        until = time.time() + ttl
+        rows = [(i, until) for i in dict.fromkeys(ids) if i]
+        if not rows or ttl <= 0:
+            return 0
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO misses VALUES (?, ?)", rows)
+            self._db.commit()
+        return len(rows)
+
+    def import_file(self, path: str, batch: int = 5000) -> int:
+        """Importa un volcado offline (.csv o .parquet) con columna 'id' o 'track_id' + features."""
+        total = 0
+        buf: List[dict] = []
+        for rec in _read_dump(path):
+            rec["id"] = str(rec.get("id") or rec.get("track_id") or "").split(":")[-1]
+            buf.append(rec)
+            if len(buf) >= batch:
+                total += self.put_many(buf); buf = []
+        total += self.put_many(buf)
+        logging.info("feature_store: importadas %d filas desde %s", total, path)
+        return total
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+
+
+def _num(v) -> Optional[float]:
+    try:
+        return float(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_dump(path: str):
+    if path.lower().endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except Exception:
+            raise RuntimeError("Importar .parquet requiere pyarrow (pip install pyarrow).")
+        for b in pq.ParquetFile(path).iter_batches():
+            yield from b.to_pylist()
+        return
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+_store: Optional[FeatureStore] = None
+_store_lock = threading.Lock()
+_disabled = DEFAULT_PATH.lower() in ("", "off", "0")
+
+def store() -> Optional[FeatureStore]:
+    """Store compartido del proceso; None si SPOTIFY_FEATURE_DB=off o no se pudo abrir."""
+    global _store, _disabled
+    if _store is None and not _disabled:
+        with _store_lock:  # lo llaman a la vez los workers de audio_features_map
+            if _store is None and not _disabled:
+                try:
+                    _store = FeatureStore(DEFAULT_PATH)
+                except sqlite3.Error as e:
+                    logging.warning("feature_store deshabilitado (%s)", e)
+                    _disabled = True
+    return _store
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3 or sys.argv[1] != "import":
+        raise SystemExit("uso: python feature_store.py import <dump.csv|dump.parquet>")
+    fs = FeatureStore()
+    fs.import_file(sys.argv[2])
+    print(f"✅ {fs.count()} pistas en {fs.path}")
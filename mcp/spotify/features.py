@@ -0,0 +1,146 @@
+# features.py
+import math
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    import numpy as _np
+except Exception:
+    _np = None
+
+FEATURE_KEYS = ("danceability", "energy", "valence", "tempo", "acousticness", "instrumentalness")
+_COL = {k: i for i, k in enumerate(FEATURE_KEYS)}
+_TEMPO = _COL["tempo"]
+RANK_KEYS = ("energy", "valence", "danceability", "tempo")   # las que usaba el ranking original
+MISSING_DIST = 999.0
+
+
+def norm_tempo(x: float) -> float:
+    return max(0.0, min(1.0, (float(x) - 60.0) / 180.0))
+
+
+def _as_float(v) -> float:
+    try:
+        return float(v) if v is not None else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class FeatureMatrix(Mapping):
+    """
+    Compact audio-feature table: one row per track id, columns = FEATURE_KEYS.
+
+    Backed by a float32 NumPy array when NumPy is installed (missing values are
+    NaN) and by a list of tuples otherwise. It behaves as a read-only mapping
+    `id -> {feature: value}` so callers that expect the old nested-dict shape
+    (e.g. explain_selection) keep working.
+    """
+
+    __slots__ = ("_ids", "_index", "_m")
+
+    def __init__(self, ids: Sequence[str] = (), rows: Sequence[Sequence[float]] = ()):
+        self._ids: List[str] = list(ids)
+        self._index: Dict[str, int] = {tid: i for i, tid in enumerate(self._ids)}
+        if _np is not None:
+            self._m = _np.asarray(rows, dtype=_np.float32).reshape(len(self._ids), len(FEATURE_KEYS))
+        else:
+            self._m = [tuple(r) for r in rows]
+
+    @classmethod
+    def from_records(cls, records: Iterable[Optional[dict]]) -> "FeatureMatrix":
+        """Construye la matriz desde respuestas de /audio-features (ignora nulos y duplicados)."""
+        ids, rows, seen = [], [], set()
+        for f in records:
+            if not f or not f.get("id") or f["id"] in seen:
+                continue
+            seen.add(f["id"])
+            ids.append(f["id"])
+            rows.append(tuple(_as_float(f.get(k)) for k in FEATURE_KEYS))
+        return cls(ids, rows)
+
+    def row(self, tid: str) -> Optional[tuple]:
+        i = self._index.get(tid)
+        if i is None:
+            return None
+        return tuple(float(x) for x in self._m[i])
+
+    def __getitem__(self, tid: str) -> Dict[str, Optional[float]]:
+        r = self.row(tid)
+        if r is None:
+            raise KeyError(tid)
+        return {k: (None if math.isnan(v) else v) for k, v in zip(FEATURE_KEYS, r)}
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, tid) -> bool:
+        return tid in self._index
+
+    def rank(self, ids: Sequence[Optional[str]], targets: Dict[str, float],
+             k: Optional[int] = None, weights: Optional[Dict[str, float]] = None,
+             keys: Sequence[str] = RANK_KEYS) -> List[int]:
+        """
+        Ordena posiciones de `ids` por distancia ponderada a `targets`.
+
+        La distancia es la media ponderada de (x - target)^2 sobre las features
+        disponibles de `keys` (por defecto energy, valence, danceability y tempo;
+        acousticness/instrumentalness de un mood no cambian el orden salvo que se
+        pidan); el tempo se normaliza a [0, 1] una sola vez por llamada.
+        Pistas sin features quedan al final (distancia MISSING_DIST) y los
+        empates conservan el orden de entrada. Con `k` sólo se devuelven las k
+        mejores posiciones (selección parcial en vez de ordenar todo).
+        """
+        n = len(ids)
+        want = [(k_, float(v)) for k_, v in (targets or {}).items() if k_ in keys and k_ in _COL and v is not None]
+        if not n or not want:
+            return list(range(n))[:k] if k is not None else list(range(n))
+        cols = [_COL[k_] for k_, _ in want]
+        tvec = [norm_tempo(v) if k_ == "tempo" else v for k_, v in want]
+        w = [float((weights or {}).get(k_, 1.0)) for k_, _ in want]
+        k = n if k is None else max(0, min(int(k), n))
+
+        if _np is not None:
+            return self._rank_np(ids, cols, tvec, w, k)
+
+        def dist(tid):
+            r = self.row(tid) if tid else None
+            if r is None:
+                return MISSING_DIST
+            d = ws = 0.0
+            for c, t, wi in zip(cols, tvec, w):
+                x = r[c]
+                if math.isnan(x):
+                    continue
+                if c == _TEMPO:
+                    x = norm_tempo(x)
+                d += wi * (x - t) ** 2; ws += wi
+            return d / ws if ws else MISSING_DIST
+
+        scored = [(dist(tid), i) for i, tid in enumerate(ids)]
+        scored.sort()
+        return [i for _, i in scored[:k]]
+
+    def _rank_np(self, ids, cols, tvec, w, k) -> List[int]:
+        np = _np
+        n = len(ids)
+        rows = np.fromiter((self._index.get(t, -1) if t else -1 for t in ids), dtype=np.intp, count=n)
+        X = np.full((n, len(cols)), np.nan, dtype=np.float32)
+        hit = rows >= 0
+        if hit.any():
+            X[hit] = self._m[rows[hit]][:, cols]
+        if _TEMPO in cols:
+            j = cols.index(_TEMPO)
+            X[:, j] = np.clip((X[:, j] - 60.0) / 180.0, 0.0, 1.0)
+        W = np.asarray(w, dtype=np.float32)
+        diff = (X - np.asarray(tvec, dtype=np.float32)) ** 2
+        valid = ~np.isnan(diff)
+        wsum = (valid * W).sum(axis=1)
+        dsum = (np.where(valid, diff, 0.0) * W).sum(axis=1)
+        dist = np.full(n, MISSING_DIST, dtype=np.float64)
+        np.divide(dsum, wsum, out=dist, where=wsum > 0)
+        idx = np.arange(n) if k >= n else np.argpartition(dist, k - 1)[:k] if k else np.arange(0)
+        idx = idx[np.lexsort((idx, dist[idx]))]
+        return idx.tolist()
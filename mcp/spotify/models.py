@@ -11,6 +11,7 @@ class Track(BaseModel):
     artists: List[Artist]
     uri: str
     preview_url: Optional[str] = None
+    release_date: Optional[str] = None
 
 class Mood(BaseModel):
     mood: str
@@ -0,0 +1,260 @@
+# mood.py
+import re, unicodedata
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+KEY_TO_MOOD = {
+    "calm": {"valence": 0.6, "energy": 0.2},
+    "focus": {"valence": 0.55, "energy": 0.25},
+    "happy": {"valence": 0.85, "energy": 0.6},
+    "sad": {"valence": 0.2, "energy": 0.15},
+    "party": {"valence": 0.8, "energy": 0.85, "danceability": 0.8},
+    "night": {"valence": 0.55, "energy": 0.2},
+    "piano": {"valence": 0.6, "energy": 0.25, "acousticness": 0.7, "instrumentalness": 0.5},
+
+    "rock and roll": {"valence": 0.75, "energy": 0.80},
+    "rock": {"valence": 0.65, "energy": 0.75},
+    "metal": {"valence": 0.45, "energy": 0.90},
+    "indie": {"valence": 0.60, "energy": 0.55},
+    "jazz": {"valence": 0.55, "energy": 0.35},
+    "lofi": {"valence": 0.55, "energy": 0.20},
+    "reggaeton": {"valence": 0.75, "energy": 0.80, "danceability": 0.85},
+    "trap": {"valence": 0.50, "energy": 0.70, "danceability": 0.80},
+    "pop": {"valence": 0.80, "energy": 0.65, "danceability": 0.75},
+
+    "electronic": {"valence": 0.70, "energy": 0.85, "danceability": 0.80},
+    "edm": {"valence": 0.75, "energy": 0.90, "danceability": 0.85},
+    "house": {"valence": 0.70, "energy": 0.80, "danceability": 0.90},
+    "techno": {"valence": 0.60, "energy": 0.95, "danceability": 0.85},
+    "dubstep": {"valence": 0.55, "energy": 0.95, "danceability": 0.80},
+
+    "classical": {"valence": 0.65, "energy": 0.25, "acousticness": 0.9, "instrumentalness": 0.95},
+    "orchestral": {"valence": 0.60, "energy": 0.30, "acousticness": 0.85, "instrumentalness": 0.90},
+    "ambient": {"valence": 0.50, "energy": 0.10, "acousticness": 0.95, "instrumentalness": 0.90},
+
+    "blues": {"valence": 0.40, "energy": 0.35},
+    "soul": {"valence": 0.70, "energy": 0.50},
+    "funk": {"valence": 0.80, "energy": 0.70, "danceability": 0.85},
+    "r&b": {"valence": 0.75, "energy": 0.60, "danceability": 0.80},
+
+    "hip hop": {"valence": 0.70, "energy": 0.75, "danceability": 0.85},
+    "rap": {"valence": 0.65, "energy": 0.80, "danceability": 0.80},
+
+    "folk": {"valence": 0.60, "energy": 0.30, "acousticness": 0.85},
+    "country": {"valence": 0.75, "energy": 0.55, "acousticness": 0.70},
+
+    "latin": {"valence": 0.80, "energy": 0.75, "danceability": 0.85},
+    "salsa": {"valence": 0.85, "energy": 0.80, "danceability": 0.90},
+    "cumbia": {"valence": 0.80, "energy": 0.70, "danceability": 0.85},
+    "tango": {"valence": 0.60, "energy": 0.50, "danceability": 0.70},
+
+    "reggae": {"valence": 0.75, "energy": 0.50, "danceability": 0.80},
+    "ska": {"valence": 0.80, "energy": 0.70, "danceability": 0.85},
+
+    "punk": {"valence": 0.60, "energy": 0.95},
+    "grunge": {"valence": 0.50, "energy": 0.80},
+
+    "disco": {"valence": 0.85, "energy": 0.80, "danceability": 0.90},
+    "synthwave": {"valence": 0.75, "energy": 0.70, "danceability": 0.80},
+
+    "chill": {"valence": 0.65, "energy": 0.25},
+    "romantic": {"valence": 0.80, "energy": 0.40},
+    "epic": {"valence": 0.70, "energy": 0.90},
+    "dark": {"valence": 0.30, "energy": 0.60},
+    "uplifting": {"valence": 0.90, "energy": 0.80},
+    "melancholic": {"valence": 0.35, "energy": 0.25},
+    "rainy": {"valence": 0.45, "energy": 0.30},
+}
+
+GENRE_QUERY_HINTS = {
+    "rock and roll": ["classic rock and roll 50s 60s", "rock and roll legends", "rockabilly classics"],
+    "rock": ["classic rock anthems", "alternative rock classics", "90s rock hits", "modern rock bangers"],
+    "metal": ["heavy metal classics", "thrash metal", "power metal anthems"],
+    "indie": ["indie rock classics", "indie anthems", "bedroom indie"],
+    "jazz": ["cool jazz classics", "hard bop classics", "modern jazz"],
+    "lofi": ["lofi hip hop beats", "study lofi"],
+    "reggaeton": ["reggaeton hits", "old school reggaeton classics", "perreo intenso"],
+    "trap": ["latin trap hits", "trap bangers"],
+    "pop": ["pop anthems", "80s pop classics", "modern pop hits"],
+    "electronic": ["electronic dance hits", "electronic chill", "electronic classics"],
+    "edm": ["edm festival anthems", "edm hits", "edm classics"],
+    "house": ["house music classics", "deep house", "progressive house"],
+    "techno": ["techno bangers", "classic techno", "minimal techno"],
+    "dubstep": ["dubstep essentials", "classic dubstep", "modern dubstep"],
+    "classical": ["classical masterpieces", "romantic era classics", "baroque classics"],
+    "orchestral": ["orchestral film scores", "epic orchestral", "orchestral classics"],
+    "ambient": ["ambient chill", "ambient soundscapes", "ambient classics"],
+    "blues": ["blues legends", "classic blues", "modern blues"],
+    "soul": ["soul classics", "neo soul", "motown hits"],
+    "funk": ["funk classics", "modern funk", "funk legends"],
+    "r&b": ["r&b classics", "modern r&b", "90s r&b hits"],
+    "hip hop": ["hip hop classics", "modern hip hop", "old school hip hop"],
+    "rap": ["rap anthems", "classic rap", "modern rap hits"],
+    "folk": ["folk classics", "modern folk", "indie folk"],
+    "country": ["country classics", "modern country hits", "country legends"],
+    "latin": ["latin hits", "latin pop classics", "latin party"],
+    "salsa": ["salsa classics", "salsa party", "modern salsa"],
+    "cumbia": ["cumbia classics", "modern cumbia", "cumbia hits"],
+    "tango": ["tango classics", "modern tango", "argentinian tango"],
+    "reggae": ["reggae classics", "roots reggae", "modern reggae"],
+    "ska": ["ska classics", "modern ska", "ska punk"],
+    "punk": ["punk rock classics", "modern punk", "pop punk hits"],
+    "grunge": ["grunge classics", "90s grunge", "modern grunge"],
+    "disco": ["disco classics", "modern disco", "disco party"],
+    "synthwave": ["synthwave classics", "modern synthwave", "retro synthwave"],
+    "chill": ["chill hits", "chillout lounge", "chill vibes"],
+    "romantic": ["romantic ballads", "love songs", "romantic classics"],
+    "epic": ["epic soundtracks", "epic orchestral", "epic movie themes"],
+    "dark": ["dark ambient", "dark electronic", "dark wave"],
+    "uplifting": ["uplifting anthems", "feel good hits", "uplifting pop"],
+    "melancholic": ["melancholic indie", "sad songs", "melancholic classics"],
+    "rainy": ["rainy day jazz", "rainy day acoustic", "calm rainy day",
+              "rainy day chill", "acoustic rain", "indie rain", "rainy day rock", "soft rock classics"],
+}
+
+# Sinónimos (ES/EN, sin tildes) → tag canónico de KEY_TO_MOOD / GENRE_QUERY_HINTS.
+SYNONYMS = {
+    "rainy": ["rain", "rainy day", "lluvia", "lluvias", "lluvioso", "lluviosa", "lluviosos", "lluviosas",
+              "llueve", "lloviendo", "dia gris", "nublado", "nublada"],
+    "calm": ["calma", "calmado", "calmada", "tranquilo", "tranquila", "tranquilidad", "relajado", "relajada",
+             "relax", "relajarme", "relajarse"],
+    "focus": ["concentrarme", "concentracion", "concentrado", "concentrada", "estudiar", "estudio", "study",
+              "trabajar", "productividad"],
+    "happy": ["feliz", "felices", "alegre", "alegres", "contento", "contenta", "alegria"],
+    "sad": ["triste", "tristes", "tristeza", "llorar", "desamor"],
+    "party": ["fiesta", "fiestas", "fiestero", "fiestera", "parranda", "rumba", "antro"],
+    "night": ["noche", "nocturno", "nocturna", "de noche", "madrugada"],
+    "chill": ["chillout", "chill out", "relajante", "relajantes"],
+    "romantic": ["romantico", "romantica", "romanticos", "romanticas", "amor", "enamorado", "enamorada"],
+    "epic": ["epico", "epica", "epicos", "epicas"],
+    "dark": ["oscuro", "oscura", "oscuros", "oscuras", "sombrio", "sombria"],
+    "melancholic": ["melancolico", "melancolica", "melancolia", "nostalgico", "nostalgica", "nostalgia"],
+    "uplifting": ["animado", "animada", "animados", "motivacion", "motivador", "motivadora", "motivante"],
+    "rock and roll": ["rock n roll", "rock & roll", "rocknroll"],
+    "hip hop": ["hiphop"],
+    "r&b": ["rnb", "r and b", "rhythm and blues"],
+    "lofi": ["lo fi"],
+    "reggaeton": ["regueton", "reguetón", "perreo"],
+    "electronic": ["electronica", "electronico", "electro"],
+    "classical": ["musica clasica", "clasica instrumental"],
+    "orchestral": ["orquesta", "orquestal", "sinfonica", "sinfonico"],
+    "ambient": ["ambiental"],
+    "folk": ["folklore", "folclore", "folclorica"],
+    "latin": ["latino", "latina", "latinos", "latinas"],
+    "piano": ["pianos", "piano solo"],
+}
+
+TOKEN_RE = re.compile(r"[\w&]+")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin tildes, carácter a carácter (las posiciones coinciden con el texto original)."""
+    return "".join(unicodedata.normalize("NFD", c)[0] for c in (text or "").lower())
+
+
+class MoodMatch(NamedTuple):
+    tag: str
+    start: int
+    end: int
+
+
+class MoodMatcher:
+    """
+    Word-level trie over the mood/genre vocabulary.
+
+    Built once at import. `find()` tokenizes the prompt and walks the trie from
+    every token, keeping the longest phrase that ends on a word boundary
+    ("rock and roll" beats "rock"; "trap" does not match "trapo"). A single
+    left-to-right pass returns every non-overlapping tag with its position.
+    """
+
+    def __init__(self, phrases: Dict[str, str]):
+        self._root: dict = {}
+        self.max_len = 0
+        for phrase, tag in phrases.items():
+            toks = TOKEN_RE.findall(normalize(phrase))
+            if not toks:
+                continue
+            node = self._root
+            for t in toks:
+                node = node.setdefault(t, {})
+            node[None] = tag
+            self.max_len = max(self.max_len, len(toks))
+
+    @classmethod
+    def compile(cls, tags, synonyms: Dict[str, List[str]]) -> "MoodMatcher":
+        phrases = {t: t for t in tags}
+        for tag, words in synonyms.items():
+            for w in words:
+                phrases.setdefault(w, tag)
+        return cls(phrases)
+
+    def find(self, norm_text: str) -> Tuple[MoodMatch, ...]:
+        toks = [(m.group(0), m.start(), m.end()) for m in TOKEN_RE.finditer(norm_text)]
+        out: List[MoodMatch] = []
+        i = 0
+        while i < len(toks):
+            node, best = self._root, None
+            for j in range(i, min(len(toks), i + self.max_len)):
+                node = node.get(toks[j][0])
+                if node is None:
+                    break
+                if None in node:
+                    best = (j, node[None])
+            if best is None:
+                i += 1
+                continue
+            j, tag = best
+            out.append(MoodMatch(tag, toks[i][1], toks[j][2]))
+            i = j + 1
+        return tuple(out)
+
+
+MATCHER = MoodMatcher.compile(list(KEY_TO_MOOD) + list(GENRE_QUERY_HINTS), SYNONYMS)
+NEUTRAL = {"valence": 0.6, "energy": 0.4}
+
+
+class MoodGuess(NamedTuple):
+    mood: str
+    targets: Tuple[Tuple[str, float], ...]
+    tags: Tuple[str, ...]
+    query_hints: Optional[Tuple[str, ...]]
+    matches: Tuple[MoodMatch, ...]
+    source: str = "lexicon"  # "lexicon" | "embedding" | "neutral"
+
+
+def _blend(weighted_tags) -> Tuple[Tuple[str, float], ...]:
+    """Media ponderada de los targets de cada tag; independiente del orden de los dicts."""
+    acc: Dict[str, List[float]] = {}
+    for tag, w in weighted_tags:
+        for k, v in KEY_TO_MOOD.get(tag, NEUTRAL).items():
+            s = acc.setdefault(k, [0.0, 0.0])
+            s[0] += w * v; s[1] += w
+    return tuple((k, round(s[0] / s[1], 4)) for k, s in acc.items())
+
+
+def _hints(tags) -> Optional[Tuple[str, ...]]:
+    return tuple(dict.fromkeys(h for g in tags if g in GENRE_QUERY_HINTS for h in GENRE_QUERY_HINTS[g])) or None
+
+
+@lru_cache(maxsize=2048)
+def _guess(norm_prompt: str) -> MoodGuess:
+    matches = MATCHER.find(norm_prompt)
+    if matches:
+        tags = tuple(dict.fromkeys(m.tag for m in matches))
+        genres = [t for t in tags if t in GENRE_QUERY_HINTS]
+        # Cada mención pesa 1: repetir un tag lo refuerza.
+        return MoodGuess(genres[0] if genres else tags[0], _blend((m.tag, 1.0) for m in matches),
+                         tags, _hints(tags), matches)
+    # Sin palabra clave literal: vecino más cercano en el índice de embeddings local.
+    from mood_embed import nearest_moods
+    near = nearest_moods(norm_prompt)
+    if near:
+        tags = tuple(t for t, _ in near)
+        return MoodGuess(tags[0], _blend((t, s * s) for t, s in near), tags, _hints(tags), (), "embedding")
+    return MoodGuess("neutral", tuple(NEUTRAL.items()), ("neutral",), None, (), "neutral")
+
+
+def match_mood(prompt: str) -> MoodGuess:
+    """Tags, targets y query hints para un prompt libre (memoizado por prompt normalizado)."""
+    return _guess(normalize(prompt))
@@ -0,0 +1,151 @@
+# mood_embed.py
+import os, json, math, heapq, hashlib, logging, zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from mood import KEY_TO_MOOD, SYNONYMS, normalize, TOKEN_RE
+
+DIM = 1 << 14
+MIN_SIM = 0.30
+INDEX_PATH = os.getenv("SPOTIFY_MOOD_INDEX", str(Path(__file__).with_name("mood_index.json")))
+
+# Frases de ejemplo → tag de KEY_TO_MOOD. Cubren intenciones sin palabra clave literal.
+EXAMPLES: List[Tuple[str, str]] = [
+    ("manejar de noche", "night"), ("conducir de noche por la costa", "night"),
+    ("viaje nocturno en carretera", "night"), ("late night drive", "night"),
+    ("luces de la ciudad", "night"), ("insomnio", "night"),
+    ("programar", "focus"), ("leer un libro", "focus"), ("hacer la tarea", "focus"),
+    ("biblioteca", "focus"), ("deep work", "focus"), ("coding", "focus"),
+    ("meditar", "ambient"), ("meditacion", "ambient"), ("dormir", "ambient"), ("sleep", "ambient"),
+    ("yoga", "calm"), ("spa", "calm"), ("domingo en la manana", "calm"), ("bano de tina", "calm"),
+    ("dia soleado", "happy"), ("sunny day", "happy"), ("verano en la playa", "happy"),
+    ("buen humor", "happy"), ("road trip con amigos", "happy"), ("cantar en la ducha", "happy"),
+    ("corazon roto", "sad"), ("me dejo mi novia", "sad"), ("me dejo mi novio", "sad"),
+    ("breakup", "sad"), ("extrano a alguien", "sad"), ("duelo", "sad"),
+    ("cena romantica", "romantic"), ("cita", "romantic"), ("aniversario", "romantic"), ("date night", "romantic"),
+    ("previa con amigos", "party"), ("pregame", "party"), ("bailar toda la noche", "party"),
+    ("discoteca", "party"), ("boda", "party"), ("cumpleanos", "party"), ("carrete", "party"),
+    ("tarde de domingo", "chill"), ("cafe", "chill"), ("cafeteria", "chill"), ("atardecer", "chill"),
+    ("sunset", "chill"), ("brunch", "chill"), ("terraza", "chill"),
+    ("otono", "melancholic"), ("recuerdos", "melancholic"), ("extranar el pasado", "melancholic"),
+    ("tormenta", "rainy"), ("cielo gris", "rainy"), ("frio", "rainy"),
+    ("gimnasio", "epic"), ("gym", "epic"), ("entrenar", "epic"), ("workout", "epic"),
+    ("correr", "uplifting"), ("cardio", "uplifting"), ("levantarme temprano", "uplifting"),
+    ("halloween", "dark"), ("terror", "dark"), ("misterio", "dark"),
+    ("cena elegante", "jazz"), ("bar de cocteles", "jazz"), ("restaurante", "jazz"),
+    ("pelicula de accion", "epic"), ("videojuego", "synthwave"), ("arcade", "synthwave"),
+]
+
+STOPWORDS = frozenset("""
+a al algo algun alguna con de del el en es esta estoy la las lo los me mi mis muy para por que quiero toda todo todas todos
+dame pon ponme recomiendame recomienda canciones cancion musica temas tema playlist lista mix un una unos
+unas y o se su sus tu tus te for the to of and some song songs music me my
+""".split())
+
+
+def _features(norm_text: str) -> Dict[int, float]:
+    """Hashing de palabras + n-gramas de caracteres (3/4) con signo; vector L2-normalizado."""
+    vec: Dict[int, float] = {}
+
+    def add(key: str, w: float):
+        h = zlib.crc32(key.encode("utf-8"))
+        i = h % DIM
+        vec[i] = vec.get(i, 0.0) + (w if (h >> 31) & 1 else -w)
+
+    for tok in TOKEN_RE.findall(norm_text):
+        if tok in STOPWORDS or tok.isdigit():
+            continue
+        add("w:" + tok, 1.0)
+        padded = f"<{tok}>"
+        for n in (3, 4):
+            for j in range(len(padded) - n + 1):
+                add(padded[j:j+n], 0.35)
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    return {i: v / norm for i, v in vec.items() if v} if norm else {}
+
+
+class MoodIndex:
+    """
+    CPU-only nearest-neighbour index over the mood/genre vocabulary.
+
+    Each entry (tag name, synonym or curated example phrase) is embedded with
+    signed feature hashing of words and character n-grams, so inflections and
+    typos ("manejando", "nocturo") still land near their phrase. Queries are
+    answered with an inverted index (cosine = sparse dot product), which keeps
+    lookups in the tens of microseconds without NumPy.
+    """
+
+    def __init__(self, tags: List[str], postings: Dict[int, List[Tuple[int, float]]]):
+        self.tags = tags
+        self.postings = postings
+
+    @staticmethod
+    def _entries() -> List[Tuple[str, str]]:
+        out = [(t, t) for t in KEY_TO_MOOD]
+        out += [(w, tag) for tag, words in SYNONYMS.items() if tag in KEY_TO_MOOD for w in words]
+        out += [(p, tag) for p, tag in EXAMPLES if tag in KEY_TO_MOOD]
+        return out
+
+    @classmethod
+    def signature(cls) -> str:
+        raw = json.dumps([DIM, cls._entries()], ensure_ascii=False)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def build(cls) -> "MoodIndex":
+        tags: List[str] = []
+        postings: Dict[int, List[Tuple[int, float]]] = {}
+        for phrase, tag in cls._entries():
+            vec = _features(normalize(phrase))
+            if not vec:
+                continue
+            row = len(tags)
+            tags.append(tag)
+            for i, v in vec.items():
+                postings.setdefault(i, []).append((row, v))
+        return cls(tags, postings)
+
+    def save(self, path: str) -> None:
+        data = {"sig": self.signature(), "tags": self.tags,
+                "postings": {str(i): [[r, round(v, 6)] for r, v in p] for i, p in self.postings.items()}}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    @classmethod
+    def load_or_build(cls, path: str = INDEX_PATH) -> "MoodIndex":
+        """Carga el archivo de vectores precalculado; si falta o quedó viejo, lo regenera."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("sig") == cls.signature():
+                return cls(data["tags"], {int(i): [(r, v) for r, v in p] for i, p in data["postings"].items()})
+        except (OSError, ValueError, KeyError):
+            pass
+        idx = cls.build()
+        try:
+            idx.save(path)
+        except OSError as e:
+            logging.info("mood_index: no se pudo guardar %s (%s)", path, e)
+        return idx
+
+    def query(self, norm_text: str, k: int = 3) -> List[Tuple[str, float]]:
+        """Top-k (tag, similitud coseno) deduplicado por tag."""
+        scores: Dict[int, float] = {}
+        for i, q in _features(norm_text).items():
+            for row, v in self.postings.get(i, ()):
+                scores[row] = scores.get(row, 0.0) + q * v
+        best: Dict[str, float] = {}
+        for row, s in heapq.nlargest(4 * k, scores.items(), key=lambda x: x[1]):
+            tag = self.tags[row]
+            if s > best.get(tag, 0.0):
+                best[tag] = s
+        return sorted(best.items(), key=lambda x: -x[1])[:k]
+
+
+_index: Optional[MoodIndex] = None
+
+def nearest_moods(norm_text: str, k: int = 3, min_sim: float = MIN_SIM) -> List[Tuple[str, float]]:
+    global _index
+    if _index is None:
+        _index = MoodIndex.load_or_build()
+    return [(t, s) for t, s in _index.query(norm_text, k) if s >= min_sim]
@@ -0,0 +1,164 @@
+# rate_limit.py
+import os, threading, time, heapq, itertools, logging
+from typing import Callable, Dict, Optional, Any
+
+# Lanes de prioridad: menor número = se atiende antes.
+LANES = {"interactive": 0, "default": 1, "background": 2}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with priority lanes.
+
+    Callers block in `acquire()` until a token is available. Waiters are served
+    strictly by (lane, arrival) so interactive calls overtake queued background
+    work. A 429 from upstream pauses the whole bucket for `Retry-After` seconds.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.rate = max(0.1, float(rate))
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._stats = {"granted": 0, "throttled": 0, "timeouts": 0, "wait_total_s": 0.0, "wait_max_s": 0.0}
+        self._depth = {lane: 0 for lane in LANES}
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def acquire(self, lane: str = "default", timeout: Optional[float] = None) -> float:
+        """Bloquea hasta obtener un token. Devuelve los segundos esperados."""
+        lane = lane if lane in LANES else "default"
+        t0 = time.monotonic()
+        ticket = (LANES[lane], next(self._seq))
+        with self._cond:
+            heapq.heappush(self._heap, ticket)
+            self._depth[lane] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._heap[0] == ticket and now >= self._paused_until and self._tokens >= 1.0:
+                        heapq.heappop(self._heap)
+                        self._tokens -= 1.0
+                        waited = now - t0
+                        self._stats["granted"] += 1
+                        self._stats["wait_total_s"] += waited
+                        self._stats["wait_max_s"] = max(self._stats["wait_max_s"], waited)
+                        self._cond.notify_all()
+                        return waited
+                    if timeout is not None and now - t0 >= timeout:
+                        self._heap.remove(ticket)
+                        heapq.heapify(self._heap)
+                        self._stats["timeouts"] += 1
+                        self._cond.notify_all()
+                        raise TimeoutError(f"Rate limit '{self.name}': sin token tras {timeout:.1f}s")
+                    delay = max(self._paused_until - now, (1.0 - self._tokens) / self.rate, 0.005)
+                    if timeout is not None:
+                        delay = min(delay, max(0.0, timeout - (now - t0)))
+                    self._cond.wait(delay)
+            finally:
+                self._depth[lane] -= 1
+
+    def penalize(self, retry_after: float) -> None:
+        """Pausa el bucket (p.ej. tras un 429) y vacía los tokens acumulados."""
+        with self._cond:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + max(0.0, retry_after))
+            self._tokens = 0.0
+            self._stamp = now
+            self._stats["throttled"] += 1
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            granted = self._stats["granted"]
+            return {
+                "rate_per_s": self.rate,
+                "burst": self.burst,
+                "tokens": round(self._tokens, 2),
+                "queue_depth": dict(self._depth),
+                "granted": granted,
+                "throttled_429": self._stats["throttled"],
+                "timeouts": self._stats["timeouts"],
+                "wait_avg_ms": round(1000 * self._stats["wait_total_s"] / granted, 2) if granted else 0.0,
+                "wait_max_ms": round(1000 * self._stats["wait_max_s"], 2),
+                "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            }
+
+
+def _retry_after(exc: Exception, default: float = 1.0) -> Optional[float]:
+    """Devuelve el Retry-After de un 429 (spotipy u otros), o None si no es un 429."""
+    if getattr(exc, "http_status", None) != 429:
+        return None
+    headers = getattr(exc, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After") or headers.get("retry-after") or default)
+    except (TypeError, ValueError):
+        return default
+
+
+class SpotifyRateLimits:
+    """
+    Process-wide request budget for the Spotify Web API.
+
+    App-credential and user-credential calls are limited by separate buckets,
+    since Spotify throttles them independently. `call()` is the single entry
+    point: it waits for a token, runs the request and, on a 429, pauses the
+    bucket for Retry-After and retries a bounded number of times.
+    """
+
+    def __init__(self, app_rate: float = 5.0, app_burst: int = 10,
+                 user_rate: float = 3.0, user_burst: int = 6,
+                 max_429_retries: int = 2, acquire_timeout: Optional[float] = 30.0):
+        self.buckets = {
+            "app": TokenBucket("app", app_rate, app_burst),
+            "user": TokenBucket("user", user_rate, user_burst),
+        }
+        self.max_429_retries = max_429_retries
+        self.acquire_timeout = acquire_timeout
+
+    @classmethod
+    def from_env(cls) -> "SpotifyRateLimits":
+        return cls(
+            app_rate=float(os.getenv("SPOTIFY_APP_RATE", "5")),
+            app_burst=int(os.getenv("SPOTIFY_APP_BURST", "10")),
+            user_rate=float(os.getenv("SPOTIFY_USER_RATE", "3")),
+            user_burst=int(os.getenv("SPOTIFY_USER_BURST", "6")),
+            max_429_retries=int(os.getenv("SPOTIFY_429_RETRIES", "2")),
+        )
+
+    def call(self, cred: str, lane: str, fn: Callable, *args, **kwargs):
+        bucket = self.buckets[cred]
+        attempt = 0
+        while True:
+            bucket.acquire(lane, timeout=self.acquire_timeout)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                wait = _retry_after(e)
+                if wait is None or attempt >= self.max_429_retries:
+                    raise
+                attempt += 1
+                logging.warning("Spotify 429 en bucket=%s; pausa %.1fs (intento %d)", cred, wait, attempt)
+                bucket.penalize(wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: b.snapshot() for name, b in self.buckets.items()}
+
+
+_limits: Optional[SpotifyRateLimits] = None
+_limits_lock = threading.Lock()
+
+def limits() -> SpotifyRateLimits:
+    global _limits
+    with _limits_lock:
+        if _limits is None:
+            _limits = SpotifyRateLimits.from_env()
+        return _limits
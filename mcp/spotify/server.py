@@ -1,331 +1,43 @@
 # server.py
-import os, logging, re, random, time
-from typing import List, Optional, Dict, Any
-from dataclasses import dataclass
+import os, asyncio, logging, random, threading
+from typing import List, Optional, Dict
 from pathlib import Path
 
-from tenacity import retry, wait_exponential, stop_after_attempt
 from dotenv import load_dotenv
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
-from spotipy.exceptions import SpotifyException
+
+# antes de importar los módulos del server: feature_store y track_index leen su ruta del entorno al importarse
+load_dotenv()
+load_dotenv(Path(__file__).with_name(".env"))
 
 from mcp.server.fastmcp import FastMCP
 from models import Track, Mood, ExplainContext, PlaylistRef, EnsureDeviceResult, AddedResult, PlayResult
+from spotify_service import SCOPES, asvc, oauth_settings, svc
+from features import FeatureMatrix
+from feature_store import store as feature_store
+from mood import GENRE_QUERY_HINTS, NEUTRAL, match_mood
+from track_index import track_index
+from diversity import main_artist, select_diverse
 
 logging.basicConfig(level=logging.INFO)
-load_dotenv()
-load_dotenv(Path(__file__).with_name(".env"))
 
 redir = os.getenv("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8080/callback").replace("localhost", "127.0.0.1")
 os.environ["SPOTIPY_CLIENT_ID"] = os.getenv("SPOTIFY_CLIENT_ID", "")
 os.environ["SPOTIPY_CLIENT_SECRET"] = os.getenv("SPOTIFY_CLIENT_SECRET", "")
 os.environ["SPOTIPY_REDIRECT_URI"] = redir
 
-SCOPES = [
-    "playlist-modify-public", "playlist-modify-private", "user-read-playback-state",
-    "user-modify-playback-state", "user-top-read", "user-read-recently-played",
-    "user-read-currently-playing", "user-read-private"
-]
-SCOPE_STR = " ".join(SCOPES)
 BOT_MODE = os.getenv("SPOTIFY_BOT_MODE", "0") == "1"
-
-@dataclass
-class SpotifyClients:
-    app: spotipy.Spotify
-    user: Optional[spotipy.Spotify]
-
-def _build_app_client() -> spotipy.Spotify:
-    cid = os.environ.get("SPOTIFY_CLIENT_ID")
-    csec = os.environ.get("SPOTIFY_CLIENT_SECRET")
-    if not cid or not csec:
-        raise RuntimeError("Faltan SPOTIFY_CLIENT_ID / SPOTIFY_CLIENT_SECRET")
-    auth = SpotifyClientCredentials(client_id=cid, client_secret=csec)
-    return spotipy.Spotify(auth_manager=auth, requests_timeout=10, retries=3)
-
-def _build_bot_user_client() -> spotipy.Spotify:
-    rt = os.getenv("SPOTIFY_REFRESH_TOKEN", "")
-    if not rt:
-        raise RuntimeError("Falta SPOTIFY_REFRESH_TOKEN en .env para BOT_MODE.")
-    oauth = SpotifyOAuth(
-        client_id=os.environ["SPOTIPY_CLIENT_ID"],
-        client_secret=os.environ["SPOTIPY_CLIENT_SECRET"],
-        redirect_uri=os.environ["SPOTIPY_REDIRECT_URI"],
-        scope=SCOPE_STR,
-        open_browser=False,
-        cache_path=f".cache-{os.getenv('SPOTIFY_USERNAME','bot')}",
-        requests_timeout=10,
-    )
-    token_info = oauth.refresh_access_token(rt)
-    try:
-        oauth.cache_handler.save_token_to_cache(token_info)
-    except Exception:
-        pass
-    return spotipy.Spotify(auth_manager=oauth, requests_timeout=10, retries=3)
-
-class SpotifyService:
-    """
-    Spotify API service wrapper for managing music operations.
-    Handles both app-only and user-authenticated Spotify operations including
-    search, recommendations, playlist management, and playback control.
-    Attributes:
-        market (str): Market/country code for Spotify API requests
-        clients (SpotifyClients): Container for app and user Spotify clients
-    Note:
-        Requires SPOTIFY_MARKET environment variable (defaults to "US")
-        User operations require OAuth authentication via set_user_auth_manager()
-    """
-
-    def __init__(self):
-        self.market = os.environ.get("SPOTIFY_MARKET", "US")
-        self.clients = SpotifyClients(app=_build_app_client(), user=None)
-        if BOT_MODE:
-            self.clients.user = _build_bot_user_client()
-
-    def set_user_auth_manager(self, oauth: SpotifyOAuth):
-        self.clients.user = spotipy.Spotify(auth_manager=oauth, requests_timeout=10, retries=3)
-
-    def _require_user(self) -> spotipy.Spotify:
-        if not self.clients.user:
-            raise PermissionError("Acción requiere OAuth de usuario configurado y login previo.")
-        return self.clients.user
-
-    def _sp_tracks(self, ids: List[str]):
-        sp = self.clients.app
-        try:
-            return sp.tracks(tracks=ids, market=self.market)
-        except TypeError:
-            return sp.tracks(tracks=ids)
-
-    @staticmethod
-    def _coerce_seed_list(seeds):
-        if not seeds:
-            return []
-        if isinstance(seeds, str):
-            toks = re.split(r"[,\s]+", seeds.strip())
-        else:
-            flat = []
-            for s in seeds:
-                if not s: continue
-                if isinstance(s, str):
-                    flat += re.split(r"[,\s]+", s.strip())
-                else:
-                    flat.append(str(s))
-            toks = [t for t in flat if t]
-        out, seen = [], set()
-        for t in toks:
-            tid = t.split(":")[-1]
-            if len(tid) == 22 and tid not in seen:
-                seen.add(tid); out.append(tid)
-        return out
-
-    def search_tracks(self, query: str, limit: int = 10, market: Optional[str] = None):
-        sp = self.clients.app
-        res = sp.search(q=query, type="track", limit=limit, market=market or self.market)
-        items = res.get("tracks", {}).get("items", [])
-        return [{
-            "id": t["id"],
-            "name": t["name"],
-            "artists": [{"name": a["name"]} for a in t.get("artists", [])],
-            "uri": t["uri"],
-            "preview_url": t.get("preview_url")}
-        for t in items]
-
-    def audio_features_map(self, track_ids):
-        if not track_ids:
-            return {}
-        ids = [str(t).split(":")[-1] for t in track_ids if t]
-        CHUNK = 50
-        out = {}
-        for i in range(0, len(ids), CHUNK):
-            batch = ids[i:i+CHUNK]
-            try:
-                feats = self.clients.app.audio_features(tracks=batch) or []
-            except SpotifyException as e:
-                logging.warning("audio_features failed (%s) len=%d", getattr(e, "http_status", e), len(batch))
-                return {}
-            except Exception as e:
-                logging.warning("audio_features error: %s", e)
-                return {}
-            for f in feats:
-                if not f or not f.get("id"):
-                    continue
-                out[f["id"]] = {k: f.get(k) for k in (
-                    "danceability", "energy", "valence", "tempo", "acousticness", "instrumentalness")}
-        return out
-
-    def _rank_by_targets(self, candidates, targets):
-        if not candidates:
-            return []
-        ids = [t.get("id") for t in candidates if t and t.get("id")]
-        fm = self.audio_features_map(ids)
-        if not fm:
-            return candidates
-        keys = ("energy", "valence", "danceability", "tempo")
-        want = {k: targets.get(k) for k in keys if targets.get(k) is not None}
-
-        def norm_tempo(x): return max(0.0, min(1.0, (float(x) - 60.0) / 180.0))
-
-        def dist(t):
-            f = fm.get(t["id"], {}); d = n = 0
-            for k, v in want.items():
-                x = f.get(k)
-                if x is None: continue
-                if k == "tempo":
-                    x = norm_tempo(x); v = norm_tempo(v)
-                d += (float(x) - float(v))**2; n += 1
-            return d / n if n else 999.0
-
-        return sorted(candidates, key=dist)
-
-    def recommendations(self, seed_tracks, targets: Dict[str, float], limit: int = 20):
-        sp = self.clients.app
-        toks = [p.strip() for p in re.split(r"[,\s]+", seed_tracks) if p.strip()] if isinstance(seed_tracks, str) else \
-               [p.strip() for s in (seed_tracks or []) for p in re.split(r"[,\s]+", str(s)) if p.strip()]
-        ids = [t.split(":")[-1] for t in toks if len(t.split(":")[-1]) == 22][:5]
-
-        valid_ids, artist_ids = [], []
-        if ids:
-            meta = self._sp_tracks(ids)
-            for tr in (meta or {}).get("tracks", []) or []:
-                if not tr: continue
-                mkts = tr.get("available_markets") or []
-                if not mkts or self.market in mkts:
-                    valid_ids.append(tr["id"])
-                for a in (tr.get("artists") or [])[:1]:
-                    if a.get("id"): artist_ids.append(a["id"])
-        artist_ids = list(dict.fromkeys(artist_ids))[:5]
-
-        tgt = {f"target_{k}": float(v) for k, v in targets.items()
-               if v is not None and k in ("energy", "valence", "danceability", "tempo")}
-
-        def _official(**params):
-            try:
-                return (sp.recommendations(**params) or {}).get("tracks", []) or []
-            except SpotifyException as e:
-                logging.warning("Recommendations failed (%s) params=%s", getattr(e, "http_status", e), params); return []
-            except Exception as e:
-                logging.warning("Recommendations error (%s) params=%s", e, params); return []
-
-        for k in (5, 3, 2, 1):
-            if len(valid_ids) >= k:
-                tr = _official(seed_tracks=valid_ids[:k], limit=int(limit), **tgt)
-                if tr:
-                    return [{
-                        "id": t["id"], "name": t["name"],
-                        "artists": [{"name": a["name"]} for a in t.get("artists", [])],
-                        "uri": t["uri"], "preview_url": t.get("preview_url")} for t in tr]
-
-        candidates = []
-        if artist_ids:
-            for aid in artist_ids:
-                try:
-                    rel = sp.artist_related_artists(aid).get("artists", [])[:5]
-                except Exception:
-                    rel = []
-                base = [aid] + [a.get("id") for a in rel if a and a.get("id")]
-                for a in base[:5]:
-                    try:
-                        candidates.extend(sp.artist_top_tracks(a, market=self.market).get("tracks", [])[:5])
-                    except Exception:
-                        pass
-
-        if not candidates:
-            return []
-
-        seen = set(); clean = []
-        for t in candidates:
-            if not t or not t.get("id"): continue
-            if t["id"] in seen: continue
-            mkts = t.get("available_markets") or []
-            if mkts and self.market not in mkts: continue
-            seen.add(t["id"]); clean.append(t)
-
-        ranked = self._rank_by_targets(clean, targets)[:int(limit)]
-        return [{
-            "id": t["id"], "name": t["name"],
-            "artists": [{"name": a["name"]} for a in t.get("artists", [])],
-            "uri": t["uri"], "preview_url": t.get("preview_url")} for t in ranked]
-
-    def create_playlist(self, name: str, description: str = "", public: bool = False):
-        sp = self._require_user()
-        me = sp.me()
-        pl = sp.user_playlist_create(me["id"], name=name, public=public, description=description)
-        return {"playlist_id": pl["id"], "url": pl["external_urls"]["spotify"]}
-
-    def add_to_playlist(self, playlist_id: str, track_uris: List[str]) -> int:
-        sp = self._require_user()
-        if not track_uris:
-            return 0
-        chunks = [track_uris[i:i+100] for i in range(0, len(track_uris), 100)]
-        added = 0
-        for ch in chunks:
-            sp.playlist_add_items(playlist_id, ch)
-            added += len(ch)
-        return added
-
-    def list_devices(self):
-        sp = self._require_user()
-        return (sp.devices() or {}).get("devices", [])
-
-    @retry(wait=wait_exponential(multiplier=0.5, max=4), stop=stop_after_attempt(3))
-    def start_or_transfer(self, playlist_uri: str, device_id: Optional[str]):
-        sp = self._require_user()
-        try:
-            sp.start_playback(device_id=device_id, context_uri=playlist_uri)
-            return "playing"
-        except spotipy.exceptions.SpotifyException as e:
-            if e.http_status == 403: return "not_premium"
-            raise
-
-    def user_seed_track_ids(self, want: int = 5):
-        sp = self._require_user()
-        seen, seeds = set(), []
-        try:
-            top = sp.current_user_top_tracks(limit=min(20, max(5, want*3)), time_range="medium_term")
-            for it in top.get("items", []):
-                tid = it.get("id")
-                if tid and tid not in seen:
-                    seeds.append(tid); seen.add(tid)
-                if len(seeds) >= want: return seeds
-        except Exception:
-            pass
-        try:
-            rp = sp.current_user_recently_played(limit=50)
-            for it in rp.get("items", []):
-                tr = it.get("track", {}); tid = tr.get("id")
-                if tid and tid not in seen:
-                    seeds.append(tid); seen.add(tid)
-                if len(seeds) >= want: return seeds
-        except Exception:
-            pass
-        try:
-            arts = sp.current_user_top_artists(limit=5, time_range="medium_term")
-            for a in arts.get("items", []):
-                at = sp.artist_top_tracks(a["id"], market=self.market)
-                for tr in at.get("tracks", []):
-                    tid = tr.get("id")
-                    if tid and tid not in seen:
-                        seeds.append(tid); seen.add(tid)
-                    if len(seeds) >= want: return seeds
-        except Exception:
-            pass
-        return seeds
+INDEX_TTL_S = float(os.getenv("SPOTIFY_TRACK_INDEX_TTL_S", str(6 * 3600)))
+ADD_BATCH = 100  # máximo de URIs por playlist_add_items
+BACKFILL_BATCH = 200  # ids sin features completados por cada refresco del índice
 
 mcp = FastMCP("spotify")
-_svc: Optional[SpotifyService] = None
-def svc():
-    global _svc
-    if _svc is None: _svc = SpotifyService()
-    return _svc
 
-_pending_oauth: Optional[SpotifyOAuth] = None
+_pending_oauth = None
 def _new_oauth():
+    from spotipy.oauth2 import SpotifyOAuth
     return SpotifyOAuth(
-        client_id=os.environ["SPOTIPY_CLIENT_ID"],
-        client_secret=os.environ["SPOTIPY_CLIENT_SECRET"],
-        redirect_uri=os.environ["SPOTIPY_REDIRECT_URI"],
-        scope=SCOPE_STR,
+        **oauth_settings(),
+        scope=" ".join(SCOPES),
         open_browser=False,
         cache_path=f".cache-{os.getenv('SPOTIFY_USERNAME','me')}",
         requests_timeout=10,
@@ -342,15 +54,17 @@ def server_info() -> dict:
         "version": os.environ.get("APP_VERSION", "0.1.0"),
         "bot_mode": BOT_MODE,
         "market": svc().market,
+        "transport": svc().transport.name,
         "scopes": SCOPES,
+        "rate_limits": svc().limits.snapshot(),
+        "coalescing": svc().flights.snapshot(),
     }
 
 @mcp.tool()
-def whoami():
-    u = svc().clients.user
-    if not u: return {"authed": False}
+async def whoami():
+    if not svc().transport.has_user(): return {"authed": False}
     try:
-        me = u.me()
+        me = await asvc().me()
         return {"authed": True, "id": me.get("id"), "display_name": me.get("display_name")}
     except Exception:
         return {"authed": False}
@@ -365,7 +79,10 @@ def auth_begin() -> dict:
     return {"authorize_url": url}
 
 @mcp.tool()
-def auth_complete(redirect_url: Optional[str] = None, code: Optional[str] = None) -> dict:
+async def auth_complete(redirect_url: Optional[str] = None, code: Optional[str] = None) -> dict:
+    return await asyncio.to_thread(_auth_complete, redirect_url, code)
+
+def _auth_complete(redirect_url: Optional[str], code: Optional[str]) -> dict:
     if BOT_MODE:
         return {"ok": False, "bot_mode": True, "error": "auth_complete deshabilitado en BOT_MODE."}
     global _pending_oauth
@@ -377,209 +94,148 @@ def auth_complete(redirect_url: Optional[str] = None, code: Optional[str] = None
     if not code:
         return {"ok": False, "error": "No encontré 'code'."}
     token_info = oauth.get_access_token(code=code)
-    svc().clients.user = spotipy.Spotify(auth_manager=oauth, requests_timeout=10, retries=3)
+    svc().set_user_auth_manager(oauth)
     _pending_oauth = None
-    me = svc().clients.user.me()
+    me = svc()._user("me", lane="interactive")
     return {"ok": True, "id": me.get("id"), "display_name": me.get("display_name")}
 
 @mcp.tool()
-def search_track(query: str, market: Optional[str] = None, limit: int = 10):
-    items = svc().search_tracks(query=query, limit=limit, market=market)
+async def search_track(query: str, market: Optional[str] = None, limit: int = 10):
+    items = await asvc().search_tracks(query=query, limit=limit, market=market, lane="interactive")
     return [Track(**t) for t in items]
 
-KEY_TO_MOOD = {
-    "calm": {"valence": 0.6, "energy": 0.2},
-    "focus": {"valence": 0.55, "energy": 0.25},
-    "happy": {"valence": 0.85, "energy": 0.6},
-    "sad": {"valence": 0.2, "energy": 0.15},
-    "party": {"valence": 0.8, "energy": 0.85, "danceability": 0.8},
-    "night": {"valence": 0.55, "energy": 0.2},
-    "piano": {"valence": 0.6, "energy": 0.25, "acousticness": 0.7, "instrumentalness": 0.5},
-
-    "rock and roll": {"valence": 0.75, "energy": 0.80},
-    "rock": {"valence": 0.65, "energy": 0.75},
-    "metal": {"valence": 0.45, "energy": 0.90},
-    "indie": {"valence": 0.60, "energy": 0.55},
-    "jazz": {"valence": 0.55, "energy": 0.35},
-    "lofi": {"valence": 0.55, "energy": 0.20},
-    "reggaeton": {"valence": 0.75, "energy": 0.80, "danceability": 0.85},
-    "trap": {"valence": 0.50, "energy": 0.70, "danceability": 0.80},
-    "pop": {"valence": 0.80, "energy": 0.65, "danceability": 0.75},
-
-    "electronic": {"valence": 0.70, "energy": 0.85, "danceability": 0.80},
-    "edm": {"valence": 0.75, "energy": 0.90, "danceability": 0.85},
-    "house": {"valence": 0.70, "energy": 0.80, "danceability": 0.90},
-    "techno": {"valence": 0.60, "energy": 0.95, "danceability": 0.85},
-    "dubstep": {"valence": 0.55, "energy": 0.95, "danceability": 0.80},
-
-    "classical": {"valence": 0.65, "energy": 0.25, "acousticness": 0.9, "instrumentalness": 0.95},
-    "orchestral": {"valence": 0.60, "energy": 0.30, "acousticness": 0.85, "instrumentalness": 0.90},
-    "ambient": {"valence": 0.50, "energy": 0.10, "acousticness": 0.95, "instrumentalness": 0.90},
-
-    "blues": {"valence": 0.40, "energy": 0.35},
-    "soul": {"valence": 0.70, "energy": 0.50},
-    "funk": {"valence": 0.80, "energy": 0.70, "danceability": 0.85},
-    "r&b": {"valence": 0.75, "energy": 0.60, "danceability": 0.80},
-
-    "hip hop": {"valence": 0.70, "energy": 0.75, "danceability": 0.85},
-    "rap": {"valence": 0.65, "energy": 0.80, "danceability": 0.80},
-
-    "folk": {"valence": 0.60, "energy": 0.30, "acousticness": 0.85},
-    "country": {"valence": 0.75, "energy": 0.55, "acousticness": 0.70},
-
-    "latin": {"valence": 0.80, "energy": 0.75, "danceability": 0.85},
-    "salsa": {"valence": 0.85, "energy": 0.80, "danceability": 0.90},
-    "cumbia": {"valence": 0.80, "energy": 0.70, "danceability": 0.85},
-    "tango": {"valence": 0.60, "energy": 0.50, "danceability": 0.70},
-
-    "reggae": {"valence": 0.75, "energy": 0.50, "danceability": 0.80},
-    "ska": {"valence": 0.80, "energy": 0.70, "danceability": 0.85},
-
-    "punk": {"valence": 0.60, "energy": 0.95},
-    "grunge": {"valence": 0.50, "energy": 0.80},
-
-    "disco": {"valence": 0.85, "energy": 0.80, "danceability": 0.90},
-    "synthwave": {"valence": 0.75, "energy": 0.70, "danceability": 0.80},
-
-    "chill": {"valence": 0.65, "energy": 0.25},
-    "romantic": {"valence": 0.80, "energy": 0.40},
-    "epic": {"valence": 0.70, "energy": 0.90},
-    "dark": {"valence": 0.30, "energy": 0.60},
-    "uplifting": {"valence": 0.90, "energy": 0.80},
-    "melancholic": {"valence": 0.35, "energy": 0.25},
-}
-
-GENRE_QUERY_HINTS = {
-    "rock and roll": ["classic rock and roll 50s 60s", "rock and roll legends", "rockabilly classics"],
-    "rock": ["classic rock anthems", "alternative rock classics", "90s rock hits", "modern rock bangers"],
-    "metal": ["heavy metal classics", "thrash metal", "power metal anthems"],
-    "indie": ["indie rock classics", "indie anthems", "bedroom indie"],
-    "jazz": ["cool jazz classics", "hard bop classics", "modern jazz"],
-    "lofi": ["lofi hip hop beats", "study lofi"],
-    "reggaeton": ["reggaeton hits", "old school reggaeton classics", "perreo intenso"],
-    "trap": ["latin trap hits", "trap bangers"],
-    "pop": ["pop anthems", "80s pop classics", "modern pop hits"],
-    "electronic": ["electronic dance hits", "electronic chill", "electronic classics"],
-    "edm": ["edm festival anthems", "edm hits", "edm classics"],
-    "house": ["house music classics", "deep house", "progressive house"],
-    "techno": ["techno bangers", "classic techno", "minimal techno"],
-    "dubstep": ["dubstep essentials", "classic dubstep", "modern dubstep"],
-    "classical": ["classical masterpieces", "romantic era classics", "baroque classics"],
-    "orchestral": ["orchestral film scores", "epic orchestral", "orchestral classics"],
-    "ambient": ["ambient chill", "ambient soundscapes", "ambient classics"],
-    "blues": ["blues legends", "classic blues", "modern blues"],
-    "soul": ["soul classics", "neo soul", "motown hits"],
-    "funk": ["funk classics", "modern funk", "funk legends"],
-    "r&b": ["r&b classics", "modern r&b", "90s r&b hits"],
-    "hip hop": ["hip hop classics", "modern hip hop", "old school hip hop"],
-    "rap": ["rap anthems", "classic rap", "modern rap hits"],
-    "folk": ["folk classics", "modern folk", "indie folk"],
-    "country": ["country classics", "modern country hits", "country legends"],
-    "latin": ["latin hits", "latin pop classics", "latin party"],
-    "salsa": ["salsa classics", "salsa party", "modern salsa"],
-    "cumbia": ["cumbia classics", "modern cumbia", "cumbia hits"],
-    "tango": ["tango classics", "modern tango", "argentinian tango"],
-    "reggae": ["reggae classics", "roots reggae", "modern reggae"],
-    "ska": ["ska classics", "modern ska", "ska punk"],
-    "punk": ["punk rock classics", "modern punk", "pop punk hits"],
-    "grunge": ["grunge classics", "90s grunge", "modern grunge"],
-    "disco": ["disco classics", "modern disco", "disco party"],
-    "synthwave": ["synthwave classics", "modern synthwave", "retro synthwave"],
-    "chill": ["chill hits", "chillout lounge", "chill vibes"],
-    "romantic": ["romantic ballads", "love songs", "romantic classics"],
-    "epic": ["epic soundtracks", "epic orchestral", "epic movie themes"],
-    "dark": ["dark ambient", "dark electronic", "dark wave"],
-    "uplifting": ["uplifting anthems", "feel good hits", "uplifting pop"],
-    "melancholic": ["melancholic indie", "sad songs", "melancholic classics"],
-    "rainy": ["rainy day jazz", "rainy day acoustic", "calm rainy day",
-              "rainy day chill", "acoustic rain", "indie rain", "rainy day rock", "soft rock classics"],
-}
-
 class MoodModel(Mood):
+    danceability: Optional[float] = None
     query_hints: Optional[List[str]] = None
+    source: str = "lexicon"
 
 def infer_mood(prompt: str) -> MoodModel:
-    p = (prompt or "").lower()
-    for g in GENRE_QUERY_HINTS.keys():
-        if g in p:
-            base = KEY_TO_MOOD.get(g, {"valence": 0.6, "energy": 0.4})
-            return MoodModel(
-                mood=g,
-                valence=base.get("valence", 0.6),
-                energy=base.get("energy", 0.4),
-                tags=[g],
-                query_hints=GENRE_QUERY_HINTS[g]
-            )
-    tags = [k for k in KEY_TO_MOOD if k in p]
-    agg: Dict[str, float] = {}
-    for k in tags:
-        for kk, vv in KEY_TO_MOOD[k].items():
-            agg[kk] = (agg.get(kk, 0.0) + vv) / 2 if kk in agg else vv
-    if not agg:
-        if any(w in p for w in ("lluv", "rain", "rainy")):
-            agg = {"valence": 0.45, "energy": 0.30}
-            tags = ["rainy"]
-        else:
-            agg = {"valence": 0.6, "energy": 0.4}
-            tags = ["neutral"]
-    return MoodModel(mood=tags[0], valence=agg.get("valence", 0.6), energy=agg.get("energy", 0.4), tags=tags, query_hints=None)
+    g = match_mood(prompt)
+    t = dict(g.targets)
+    return MoodModel(
+        mood=g.mood,
+        valence=t.get("valence", NEUTRAL["valence"]),
+        energy=t.get("energy", NEUTRAL["energy"]),
+        danceability=t.get("danceability"),
+        tags=list(g.tags),
+        query_hints=list(g.query_hints) if g.query_hints else None,
+        source=g.source,
+    )
+
+def _mood_targets(m: MoodModel) -> Dict[str, float]:
+    t = {"energy": m.energy, "valence": m.valence}
+    if m.danceability is not None:
+        t["danceability"] = m.danceability
+    return t
+
+def _genre_tags(m: MoodModel) -> List[str]:
+    return [t for t in (m.tags or []) if t in GENRE_QUERY_HINTS]
+
+def _index_tracks(tracks, tags) -> None:
+    """Ingresa resultados de la API al índice local (features sólo desde el store, sin llamadas extra)."""
+    idx = track_index()
+    if idx is None or not tracks:
+        return
+    fs = feature_store()
+    feats = FeatureMatrix.from_records(fs.get_many([t["id"] for t in tracks if t.get("id")])[0]) if fs else None
+    idx.add(tracks, tags=tags, market=svc().market, features=feats)
+
+def _refresh_tag(tags: List[str], hint: str) -> None:
+    try:
+        items = svc().search_tracks(query=hint, limit=50, lane="background")
+        fm = svc().audio_features_map([t["id"] for t in items], lane="background")
+        track_index().add(items, tags=tags, market=svc().market, features=fm)
+    except Exception as e:
+        logging.info("track_index refresh '%s' falló: %s", hint, e)
+
+_backfill = None
+_backfill_lock = threading.Lock()
+
+def _backfill_features(ids: List[str]) -> None:
+    try:
+        track_index().set_features(svc().audio_features_map(ids, lane="background"))
+    except Exception as e:
+        logging.info("track_index backfill de features falló: %s", e)
+
+def _refresh_index(m: MoodModel) -> None:
+    """
+    Refresca en segundo plano los géneros del mood cuyo contenido local está vencido
+    y completa features de pistas indexadas sin ellas (nearest() no las devuelve).
+    """
+    global _backfill
+    idx = track_index()
+    if idx is None:
+        return
+    for g in _genre_tags(m):
+        if idx.is_stale(g, INDEX_TTL_S):
+            idx.mark_fresh(g)
+            svc()._bg.submit(_refresh_tag, [g], random.choice(GENRE_QUERY_HINTS[g]))
+    with _backfill_lock:
+        if _backfill is None or _backfill.done():
+            ids = idx.unfeatured(BACKFILL_BATCH)
+            _backfill = svc()._bg.submit(_backfill_features, ids) if ids else None
 
 @mcp.tool()
-def analyze_mood(prompt: str):
-    return infer_mood(prompt)
+async def analyze_mood(prompt: str):
+    return await asyncio.to_thread(infer_mood, prompt)
 
 @mcp.tool()
-def get_recommendations(seed_tracks: Optional[List[str]] = None, mood: Optional[str] = None,
-                        energy: Optional[float] = None, valence: Optional[float] = None,
-                        danceability: Optional[float] = None, tempo: Optional[float] = None,
-                        limit: int = 20):
+async def get_recommendations(seed_tracks: Optional[List[str]] = None, mood: Optional[str] = None,
+                              energy: Optional[float] = None, valence: Optional[float] = None,
+                              danceability: Optional[float] = None, tempo: Optional[float] = None,
+                              limit: int = 20, seed: Optional[int] = None):
+    """
+    Recomienda hasta `limit` pistas (una por artista principal) con selección MMR.
+    Mismos argumentos → mismo resultado; `seed` permite variar el orden de forma reproducible.
+    """
+    return await asyncio.to_thread(_get_recommendations, seed_tracks, mood, energy, valence,
+                                   danceability, tempo, limit, seed)
+
+def _get_recommendations(seed_tracks, mood, energy, valence, danceability, tempo, limit, seed):
     m = infer_mood(mood or "")
     targets = {k: v for k, v in dict(energy=energy, valence=valence, danceability=danceability, tempo=tempo).items() if v is not None}
     if m and not targets:
-        targets = {"energy": m.energy, "valence": m.valence}
-
-    tracks = svc().recommendations(seed_tracks or [], targets, limit=limit)
-
-    seen_art = set(); uniq = []
-    for t in tracks:
-        main = (t.get("artists") or [{}])[0].get("name", "").lower()
-        if main in seen_art: continue
-        seen_art.add(main); uniq.append(t)
-    uniq = uniq[: int(limit)]
-
-    rnd = random.Random(int(time.time() // 3600))
-    rnd.shuffle(uniq)
-
-    if len(uniq) < int(limit):
-        hints = (m.query_hints or []) if m else []
-        if hints:
-            need = int(limit) - len(uniq)
-            q = rnd.choice(hints)
-            more = svc().search_tracks(query=q, limit=min(50, need * 5))
-            for t in more:
-                main = (t.get("artists") or [{}])[0].get("name", "").lower()
-                if main in seen_art: continue
-                seen_art.add(main); uniq.append(t)
-                if len(uniq) >= int(limit): break
-
-    return [Track(**t) for t in uniq[: int(limit)]]
+        targets = _mood_targets(m)
+
+    genres = _genre_tags(m)
+    idx = track_index()
+    tracks = []
+    if idx is not None and not seed_tracks:
+        tracks = idx.nearest(targets, k=int(limit) * 2, tags=genres or None, market=svc().market)
+        _refresh_index(m)
+    if len(tracks) < int(limit):
+        fresh = svc().recommendations(seed_tracks or [], targets, limit=limit)
+        _index_tracks(fresh, m.tags)
+        tracks = tracks + fresh
+
+    need = int(limit) - len({main_artist(t) for t in tracks})
+    hints = (m.query_hints or []) if m else []
+    if need > 0 and hints:
+        q = random.Random(seed).choice(hints) if seed is not None else hints[0]
+        more = svc().search_tracks(query=q, limit=min(50, need * 5))
+        _index_tracks(more, genres)
+        tracks = tracks + more
+
+    fs = feature_store()
+    feats = FeatureMatrix.from_records(fs.get_many([t["id"] for t in tracks if t.get("id")])[0]) if fs else None
+    picked = select_diverse(tracks, int(limit), features=feats, seed=seed)
+    return [Track(**t) for t in picked]
 
 @mcp.tool()
-def create_playlist(name: str, description: str = "", public: bool = False):
+async def create_playlist(name: str, description: str = "", public: bool = False):
     if BOT_MODE:
         public = True
-    out = svc().create_playlist(name=name, description=description, public=public)
+    out = await asvc().create_playlist(name=name, description=description, public=public)
     return out
 
 @mcp.tool()
-def add_to_playlist(playlist_id: str, track_ids: List[str]):
+async def add_to_playlist(playlist_id: str, track_ids: List[str]):
     uris = [tid if tid.startswith("spotify:track:") else f"spotify:track:{tid}" for tid in track_ids]
-    n = svc().add_to_playlist(playlist_id, uris)
+    n = await asvc().add_to_playlist(playlist_id, uris)
     return AddedResult(added=n)
 
 @mcp.tool()
-@mcp.tool()
-def create_playlist_with_tracks(
+async def create_playlist_with_tracks(
     name: str,
     track_ids: List[str],
     description: str = "",
@@ -587,10 +243,20 @@ def create_playlist_with_tracks(
     desired_count: Optional[int] = None,
     mood: Optional[str] = None,
 ):
+    return await asyncio.to_thread(_create_playlist_with_tracks, name, track_ids, description,
+                                   public, desired_count, mood)
+
+def _create_playlist_with_tracks(name, track_ids, description, public, desired_count, mood):
+    """
+    Crea la playlist y la llena en streaming: la creación corre en paralelo con la
+    búsqueda de candidatos y las búsquedas por hint se lanzan todas a la vez. Las
+    pistas que pasan el filtro (id + artista principal) se toman en el orden de los
+    hints, así el resultado no depende de qué búsqueda responde primero, y se agregan
+    apenas la playlist existe, en tandas de hasta 100 (el máximo por llamada a la API).
+    """
+    s = svc()
     base_ids = [str(t).split(":")[-1] for t in (track_ids or []) if t]
     seen_ids = set(base_ids)
-    def _main_artist_name(t) -> str:
-        return ((t.get("artists") or [{}])[0].get("name") or "").lower().strip()
 
     if desired_count is not None:
         desired_count = max(1, min(int(desired_count), 100))
@@ -598,79 +264,89 @@ def create_playlist_with_tracks(
     else:
         desired_count = len(base_ids)
 
-    need = desired_count - len(base_ids)
-    if need > 0:
-        m = infer_mood(mood or "")
-        targets = {"energy": m.energy, "valence": m.valence} if m else {}
-        basket: list[Dict[str, Any]] = []
-
-        hints = (m.query_hints or [])
-        rnd = random.Random(int(time.time() // 3600))
-        rnd.shuffle(hints)
-
-        used_artists = set()
-        if base_ids:
-            meta = svc()._sp_tracks(base_ids) or {}
-            for tr in (meta.get("tracks") or []):
-                if tr and tr.get("id"):
-                    used_artists.add(_main_artist_name(tr))
-
-        for q in hints:
-            if need <= 0:
-                break
-            try:
-                items = svc().search_tracks(query=q, limit=min(50, need * 4))
-            except Exception:
-                items = []
-            for t in items:
-                tid = t.get("id")
-                if not tid or tid in seen_ids:
-                    continue
-                main = _main_artist_name(t)
-                if main in used_artists:
-                    continue
-                seen_ids.add(tid)
-                used_artists.add(main)
-                basket.append(t)
-                need -= 1
-                if need <= 0:
-                    break
+    pl_fut = s._bg.submit(s.create_playlist, name=name, description=description, public=public)
+    pending = [f"spotify:track:{tid}" for tid in base_ids]
+    added = 0
+    searches = []
 
+    def flush(wait: bool = False):
+        nonlocal pending, added
+        while pending and (wait or pl_fut.done()):
+            pl = pl_fut.result()
+            batch, pending = pending[:ADD_BATCH], pending[ADD_BATCH:]
+            added += s.add_to_playlist(pl["playlist_id"], batch)
+
+    try:
+        need = desired_count - len(base_ids)
         if need > 0:
-            try:
-                recs = svc().recommendations(seed_tracks=[], targets=targets, limit=max(need * 2, 10))
-            except Exception:
-                recs = []
-            for t in recs:
+            m = infer_mood(mood or "")
+            targets = _mood_targets(m) if m else {}
+            genres = _genre_tags(m)
+            meta_fut = s._bg.submit(s._sp_tracks, base_ids) if base_ids else None
+            searches = [s._bg.submit(s.search_tracks, query=q, limit=min(50, need * 4)) for q in (m.query_hints or [])]
+
+            used_artists = set()
+            if meta_fut is not None:
+                try:
+                    for tr in ((meta_fut.result() or {}).get("tracks") or []):
+                        if tr and tr.get("id"):
+                            used_artists.add(main_artist(tr))
+                except Exception as e:
+                    logging.warning("create_playlist_with_tracks: sin metadata de semillas (%s)", e)
+
+            def take(items):
+                nonlocal need
+                for t in items:
+                    if need <= 0:
+                        break
+                    tid = t.get("id")
+                    if not tid or tid in seen_ids:
+                        continue
+                    main = main_artist(t)
+                    if main in used_artists:
+                        continue
+                    seen_ids.add(tid)
+                    used_artists.add(main)
+                    pending.append(f"spotify:track:{tid}")
+                    need -= 1
+
+            idx = track_index()
+            if idx is not None:
+                take(idx.nearest(targets, k=need * 3, tags=genres or None, market=s.market, exclude=seen_ids))
+                _refresh_index(m)
+            flush()
+
+            for fut in searches:
                 if need <= 0:
                     break
-                tid = t.get("id")
-                if not tid or tid in seen_ids:
-                    continue
-                main = _main_artist_name(t)
-                if main in used_artists:
-                    continue
-                seen_ids.add(tid)
-                used_artists.add(main)
-                basket.append(t)
-                need -= 1
-
-        for t in basket:
-            if len(base_ids) >= desired_count:
-                break
-            base_ids.append(t["id"])
-
-    uris = [f"spotify:track:{tid}" for tid in base_ids[:desired_count]]
-
-    out = svc().create_playlist(name=name, description=description, public=public)
-    added = svc().add_to_playlist(out["playlist_id"], uris) if uris else 0
-    return {"playlist_id": out["playlist_id"], "url": out["url"], "added": added}
+                try:
+                    items = fut.result()
+                except Exception:
+                    items = []
+                _index_tracks(items, genres)
+                take(items)
+                flush()
 
+            if need > 0:
+                try:
+                    recs = s.recommendations(seed_tracks=[], targets=targets, limit=max(need * 2, 10))
+                except Exception:
+                    recs = []
+                _index_tracks(recs, m.tags)
+                take(recs)
+
+        flush(wait=True)
+        out = pl_fut.result()
+    finally:
+        # si la creación de la playlist (o un add) falla, las búsquedas que quedan no se esperan
+        for fut in searches:
+            fut.cancel()
+    return {"playlist_id": out["playlist_id"], "url": out["url"], "added": added}
 
 @mcp.tool()
-def ensure_device_ready():
+async def ensure_device_ready():
     try:
-        devs = svc().list_devices()
+        devs = await asvc().list_devices()
     except PermissionError:
         return EnsureDeviceResult(device_id=None, status="not_premium")
     if not devs:
@@ -679,10 +355,10 @@ def ensure_device_ready():
     return EnsureDeviceResult(device_id=target.get("id"), status="ready")
 
 @mcp.tool()
-def play_playlist(playlist_id: str, device_id: Optional[str] = None):
+async def play_playlist(playlist_id: str, device_id: Optional[str] = None):
     pl_uri = f"spotify:playlist:{playlist_id}" if not playlist_id.startswith("spotify:playlist:") else playlist_id
     try:
-        status = svc().start_or_transfer(pl_uri, device_id)
+        status = await asvc().start_or_transfer(pl_uri, device_id)
         if status == "not_premium":
             return PlayResult(status="not_premium", device_id=device_id)
         return PlayResult(status="playing", device_id=device_id)
@@ -693,8 +369,8 @@ def play_playlist(playlist_id: str, device_id: Optional[str] = None):
         return PlayResult(status="no_device", device_id=device_id)
 
 @mcp.tool()
-def explain_selection(tracks: List[Track], context: ExplainContext):
-    feats = svc().audio_features_map([t.id for t in tracks])
+async def explain_selection(tracks: List[Track], context: ExplainContext):
+    feats = await asvc().audio_features_map([t.id for t in tracks])
     hdr = f"**Contexto:** mood={context.mood or '-'} • activity={context.activity or '-'} • time={context.time_of_day or '-'}"
     lines = [hdr]
     for t in tracks:
@@ -711,39 +387,39 @@ def explain_selection(tracks: List[Track], context: ExplainContext):
     return {"rationale_md": "\n".join(lines)}
 
 @mcp.tool()
-def build_playlist_from_profile(mood_prompt: str, name: Optional[str] = None, public: bool = False, limit: int = 25):
-    m = infer_mood(mood_prompt)
-    targets = {"energy": m.energy, "valence": m.valence}
+async def build_playlist_from_profile(mood_prompt: str, name: Optional[str] = None, public: bool = False, limit: int = 25):
+    m = await asyncio.to_thread(infer_mood, mood_prompt)
+    targets = _mood_targets(m)
     seeds: List[str] = []
     try:
-        seeds = svc().user_seed_track_ids(want=5)
+        seeds = await asvc().user_seed_track_ids(want=5)
     except (PermissionError, AttributeError):
         pass
     if len(seeds) < 1:
         q = (m.query_hints or [m.mood, f"{m.mood} classics", f"{m.mood} hits"])[0]
-        themed = svc().search_tracks(query=q, limit=5)
+        themed = await asvc().search_tracks(query=q, limit=5)
         seeds = [t["id"] for t in (themed or [])]
 
-    recs = svc().recommendations(seed_tracks=seeds, targets=targets, limit=limit)
+    recs = await asvc().recommendations(seed_tracks=seeds, targets=targets, limit=limit)
     title = name or f"{m.mood.title()} • Rainy Day Mix"
-    pl = svc().create_playlist(
+    pl = await asvc().create_playlist(
         title,
         description=f"{m.mood} · energy {m.energy:.2f} · valence {m.valence:.2f}",
         public=public,
     )
     track_uris = [f"spotify:track:{t['id']}" for t in recs]
-    svc().add_to_playlist(pl["playlist_id"], track_uris)
+    await asvc().add_to_playlist(pl["playlist_id"], track_uris)
     return PlaylistRef(**pl)
 
 @mcp.tool()
-def create_public_mix(mood_prompt: str, name: str = "Bot Mix", limit: int = 20) -> PlaylistRef:
-    m = infer_mood(mood_prompt)
-    targets = {"energy": m.energy, "valence": m.valence}
-    themed = svc().search_tracks(query="alternative rock classics", limit=5)
+async def create_public_mix(mood_prompt: str, name: str = "Bot Mix", limit: int = 20) -> PlaylistRef:
+    m = await asyncio.to_thread(infer_mood, mood_prompt)
+    targets = _mood_targets(m)
+    themed = await asvc().search_tracks(query="alternative rock classics", limit=5)
     seeds = [t["id"] for t in (themed or [])] or []
-    recs = svc().recommendations(seed_tracks=seeds, targets=targets, limit=limit)
-    pl = svc().create_playlist(name, description=f"{m.mood} • auto-mix", public=True)
-    svc().add_to_playlist(pl["playlist_id"], [f"spotify:track:{t['id']}" for t in recs])
+    recs = await asvc().recommendations(seed_tracks=seeds, targets=targets, limit=limit)
+    pl = await asvc().create_playlist(name, description=f"{m.mood} • auto-mix", public=True)
+    await asvc().add_to_playlist(pl["playlist_id"], [f"spotify:track:{t['id']}" for t in recs])
     return PlaylistRef(**pl)
 
 @mcp.prompt()
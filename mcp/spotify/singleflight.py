@@ -0,0 +1,78 @@
+# singleflight.py
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def freeze(v) -> Hashable:
+    """Convierte args (listas, dicts) en una clave hashable y estable."""
+    if isinstance(v, dict):
+        return tuple(sorted((k, freeze(x)) for k, x in v.items()))
+    if isinstance(v, (list, tuple, set, frozenset)):
+        items = [freeze(x) for x in v]
+        return tuple(sorted(items, key=repr) if isinstance(v, (set, frozenset)) else items)
+    return v
+
+
+class _Call:
+    __slots__ = ("done", "result", "exc", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.exc: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one upstream request.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive with the same key while it is in flight block until it finishes
+    and receive the same result, or the same exception. Nothing is cached
+    after completion. Shared results are the same object for every caller,
+    so treat them as read-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats = {"upstream": 0, "coalesced": 0, "max_waiters": 0}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["upstream"] += 1
+            else:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+                self._stats["max_waiters"] = max(self._stats["max_waiters"], call.waiters)
+        if not leader:
+            call.done.wait()
+            if call.exc is not None:
+                raise call.exc
+            return call.result
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.exc = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            up, co = self._stats["upstream"], self._stats["coalesced"]
+            return {
+                "upstream_calls": up,
+                "coalesced_calls": co,
+                "saved_pct": round(100.0 * co / (up + co), 1) if up + co else 0.0,
+                "max_waiters": self._stats["max_waiters"],
+                "in_flight": len(self._calls),
+            }
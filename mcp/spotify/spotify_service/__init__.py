@@ -0,0 +1,26 @@
+"""
+Spotify Web API service shared by the MCP server and offline tools.
+
+Submodules load on first attribute access, so `import spotify_service` is
+cheap and spotipy is only imported when the real transport is built:
+
+    from spotify_service import svc, asvc, make_transport
+"""
+import importlib
+
+_EXPORTS = {
+    "SpotifyService": "service", "svc": "service",
+    "AsyncSpotifyService": "aio", "asvc": "aio",
+    "Transport": "transport", "SpotipyTransport": "transport", "make_transport": "transport",
+    "oauth_settings": "transport", "SCOPES": "transport", "SCOPE_STR": "transport",
+    "FakeTransport": "fake", "FakeConfig": "fake", "FakeHTTPError": "fake",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    mod = _EXPORTS.get(name)
+    if mod is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{mod}", __name__), name)
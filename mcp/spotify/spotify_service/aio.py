@@ -0,0 +1,62 @@
+# aio.py
+import asyncio
+from typing import Dict, List, Optional
+
+from .service import SpotifyService, svc
+
+
+class AsyncSpotifyService:
+    """
+    asyncio facade over SpotifyService.
+
+    Each coroutine runs the blocking call in a worker thread, so an event loop
+    (e.g. the MCP server's) keeps serving other requests meanwhile. Rate
+    limiting, request coalescing and the feature store are shared with the
+    wrapped service.
+    """
+
+    def __init__(self, service: Optional[SpotifyService] = None):
+        self.sync = service or svc()
+
+    @property
+    def market(self) -> str:
+        return self.sync.market
+
+    async def _run(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def search_tracks(self, query: str, limit: int = 10, market: Optional[str] = None, lane: str = "default"):
+        return await self._run(self.sync.search_tracks, query, limit=limit, market=market, lane=lane)
+
+    async def audio_features_map(self, track_ids, lane: str = "default"):
+        return await self._run(self.sync.audio_features_map, track_ids, lane=lane)
+
+    async def recommendations(self, seed_tracks, targets: Dict[str, float], limit: int = 20):
+        return await self._run(self.sync.recommendations, seed_tracks, targets, limit=limit)
+
+    async def create_playlist(self, name: str, description: str = "", public: bool = False):
+        return await self._run(self.sync.create_playlist, name, description=description, public=public)
+
+    async def add_to_playlist(self, playlist_id: str, track_uris: List[str]) -> int:
+        return await self._run(self.sync.add_to_playlist, playlist_id, track_uris)
+
+    async def list_devices(self):
+        return await self._run(self.sync.list_devices)
+
+    async def start_or_transfer(self, playlist_uri: str, device_id: Optional[str]):
+        return await self._run(self.sync.start_or_transfer, playlist_uri, device_id)
+
+    async def user_seed_track_ids(self, want: int = 5):
+        return await self._run(self.sync.user_seed_track_ids, want=want)
+
+    async def me(self) -> dict:
+        return await self._run(self.sync._user, "me", lane="interactive")
+
+
+_asvc: Optional[AsyncSpotifyService] = None
+
+def asvc() -> AsyncSpotifyService:
+    global _asvc
+    if _asvc is None:
+        _asvc = AsyncSpotifyService()
+    return _asvc
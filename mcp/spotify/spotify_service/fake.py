@@ -0,0 +1,317 @@
+# fake.py
+import os, re, time, random, hashlib, string, threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .transport import Transport
+
+_B62 = string.digits + string.ascii_letters
+_WORDS_A = ("midnight", "golden", "electric", "silent", "velvet", "neon", "broken", "crystal", "wild", "lonely",
+            "burning", "paper", "summer", "winter", "hollow", "cosmic", "sweet", "restless", "blue", "distant")
+_WORDS_B = ("heart", "river", "city", "dream", "fire", "highway", "ocean", "shadow", "garden", "signal",
+            "mirror", "echo", "horizon", "parade", "machine", "letter", "island", "thunder", "station", "moon")
+_FEATURE_KEYS = ("danceability", "energy", "valence", "tempo", "acousticness", "instrumentalness")
+_TOKEN = re.compile(r"[\w&]+")
+
+
+def _sid(seed: int, kind: str, i: int) -> str:
+    """ID base62 de 22 caracteres, estable para (seed, tipo, i)."""
+    h = int(hashlib.sha1(f"{seed}:{kind}:{i}".encode()).hexdigest(), 16)
+    out = []
+    for _ in range(22):
+        h, r = divmod(h, 62)
+        out.append(_B62[r])
+    return "".join(out)
+
+
+class FakeHTTPError(Exception):
+    """Mimics spotipy's SpotifyException: http_status, msg and headers."""
+
+    def __init__(self, http_status: int, msg: str = "", headers: Optional[dict] = None):
+        super().__init__(f"http status: {http_status}, {msg}")
+        self.http_status = http_status
+        self.msg = msg
+        self.headers = headers or {}
+
+
+@dataclass
+class FakeConfig:
+    seed: int = 7
+    artists: int = 4000
+    tracks_per_artist: int = 5
+    markets: Tuple[str, ...] = ("US", "CL", "MX", "ES", "AR")
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0          # fracción de llamadas que fallan con 503
+    rate_429: float = 0.0            # fracción de llamadas que devuelven 429
+    retry_after_s: float = 1.0
+    deprecated: Tuple[str, ...] = () # endpoints que responden 404 (p.ej. recommendations)
+    premium: bool = True
+    devices: int = 1
+    authed: bool = True
+    endpoint_latency_ms: Dict[str, float] = field(default_factory=dict)
+
+    @classmethod
+    def from_env(cls) -> "FakeConfig":
+        e = os.getenv
+        lat = {}
+        for part in (e("SPOTIFY_FAKE_ENDPOINT_LATENCY_MS") or "").split(","):
+            if "=" in part:
+                k, v = part.split("=", 1)
+                lat[k.strip()] = float(v)
+        return cls(
+            seed=int(e("SPOTIFY_FAKE_SEED", "7")),
+            artists=int(e("SPOTIFY_FAKE_ARTISTS", "4000")),
+            latency_ms=float(e("SPOTIFY_FAKE_LATENCY_MS", "0")),
+            jitter_ms=float(e("SPOTIFY_FAKE_JITTER_MS", "0")),
+            error_rate=float(e("SPOTIFY_FAKE_ERROR_RATE", "0")),
+            rate_429=float(e("SPOTIFY_FAKE_429_RATE", "0")),
+            retry_after_s=float(e("SPOTIFY_FAKE_RETRY_AFTER_S", "1")),
+            deprecated=tuple(x.strip() for x in (e("SPOTIFY_FAKE_DEPRECATED") or "").split(",") if x.strip()),
+            premium=e("SPOTIFY_FAKE_PREMIUM", "1") == "1",
+            devices=int(e("SPOTIFY_FAKE_DEVICES", "1")),
+            authed=e("SPOTIFY_FAKE_AUTHED", "1") == "1",
+            endpoint_latency_ms=lat,
+        )
+
+
+class FakeCatalog:
+    """
+    Deterministic synthetic catalog: artists spread over the genres of
+    mood.GENRE_QUERY_HINTS, each with top tracks whose audio features
+    cluster around the genre's KEY_TO_MOOD targets. Track text includes the
+    genre's query hints, so the server's hint searches return on-genre tracks.
+    """
+
+    def __init__(self, cfg: FakeConfig):
+        from mood import GENRE_QUERY_HINTS, KEY_TO_MOOD
+        rnd = random.Random(cfg.seed)
+        genres = sorted(GENRE_QUERY_HINTS)
+        self.artists: Dict[str, dict] = {}
+        self.tracks: Dict[str, dict] = {}
+        self.features: Dict[str, dict] = {}
+        self.by_artist: Dict[str, List[str]] = {}
+        self.by_genre: Dict[str, List[str]] = {}
+        self._postings: Dict[str, List[str]] = {}
+        for a in range(cfg.artists):
+            g = genres[a % len(genres)]
+            aid = _sid(cfg.seed, "artist", a)
+            artist = {"id": aid, "name": f"The {rnd.choice(_WORDS_A).title()} {rnd.choice(_WORDS_B).title()}s {a}",
+                      "uri": f"spotify:artist:{aid}", "genres": [g], "popularity": rnd.randint(5, 95)}
+            self.artists[aid] = artist
+            self.by_genre.setdefault(g, []).append(aid)
+            center = KEY_TO_MOOD.get(g, {})
+            text = " ".join([g] + GENRE_QUERY_HINTS[g])
+            for t in range(cfg.tracks_per_artist):
+                tid = _sid(cfg.seed, "track", a * cfg.tracks_per_artist + t)
+                year = rnd.randint(1960, 2024)
+                name = f"{rnd.choice(_WORDS_A).title()} {rnd.choice(_WORDS_B).title()}"
+                k = rnd.randint(1, len(cfg.markets))
+                self.tracks[tid] = {
+                    "id": tid, "name": name, "uri": f"spotify:track:{tid}", "type": "track",
+                    "artists": [{"id": aid, "name": artist["name"], "uri": artist["uri"]}],
+                    "album": {"id": _sid(cfg.seed, "album", a * 100 + t // 4), "name": f"{name} (LP)",
+                              "release_date": f"{year}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"},
+                    "available_markets": sorted(rnd.sample(cfg.markets, k)),
+                    "popularity": rnd.randint(0, 100), "preview_url": None,
+                }
+                self.features[tid] = {"id": tid, **{
+                    f: (round(rnd.uniform(60, 180), 1) if f == "tempo" else
+                        round(min(1.0, max(0.0, rnd.gauss(center.get(f, 0.5), 0.12))), 3))
+                    for f in _FEATURE_KEYS}}
+                self.by_artist.setdefault(aid, []).append(tid)
+                for tok in set(_TOKEN.findall(f"{name} {artist['name']} {text}".lower())):
+                    self._postings.setdefault(tok, []).append(tid)
+
+    def search(self, q: str) -> List[str]:
+        """
+        Ids ordenados por nº de tokens de la consulta que coinciden; dentro del mismo
+        puntaje se intercalan artistas (como la API real) y luego manda la popularidad.
+        """
+        hits: Counter = Counter()
+        for tok in set(_TOKEN.findall(q.lower())):
+            hits.update(self._postings.get(tok, ()))
+        if not hits:
+            return []
+        ids = sorted(hits, key=lambda tid: (-hits[tid], -self.tracks[tid]["popularity"], tid))
+        nth: Counter = Counter()
+        turn = {}
+        for tid in ids:
+            key = (hits[tid], self.tracks[tid]["artists"][0]["id"])
+            turn[tid] = nth[key]
+            nth[key] += 1
+        return sorted(ids, key=lambda tid: (-hits[tid], turn[tid]))
+
+
+class FakeTransport(Transport):
+    """
+    In-process stand-in for the Spotify Web API, for benchmarks and offline runs.
+
+    Serves search, tracks, audio-features, recommendations, related artists,
+    top tracks, playlists, devices and playback from a FakeCatalog, with no
+    network access. Latency (global or per endpoint), 503s and 429s with a
+    Retry-After header can be injected (see FakeConfig / SPOTIFY_FAKE_*).
+    Fault injection draws from a seeded RNG, so runs are repeatable.
+    """
+
+    name = "fake"
+
+    def __init__(self, config: Optional[FakeConfig] = None):
+        self.cfg = config or FakeConfig.from_env()
+        self.catalog = FakeCatalog(self.cfg)
+        self.user = self.cfg.authed
+        self.playlists: Dict[str, dict] = {}
+        self.playing: Optional[dict] = None
+        self._rnd = random.Random(self.cfg.seed)
+        self._lock = threading.Lock()
+        self._calls: Counter = Counter()
+        self._faults: Counter = Counter()
+
+    # ---- Transport ----
+    def call(self, cred: str, method: str, *args, **kwargs):
+        if cred == "user" and not self.user:
+            raise PermissionError("Acción requiere OAuth de usuario configurado y login previo.")
+        fn = getattr(self, "_ep_" + method, None)
+        with self._lock:
+            self._calls[method] += 1
+            roll = self._rnd.random()
+            jitter = self._rnd.uniform(0.0, self.cfg.jitter_ms)
+        delay_ms = self.cfg.endpoint_latency_ms.get(method, self.cfg.latency_ms) + jitter
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+        if roll < self.cfg.rate_429:
+            self._fault("429")
+            raise FakeHTTPError(429, "API rate limit exceeded", {"Retry-After": str(self.cfg.retry_after_s)})
+        if roll < self.cfg.rate_429 + self.cfg.error_rate:
+            self._fault("503")
+            raise FakeHTTPError(503, "Service unavailable")
+        if fn is None or method in self.cfg.deprecated:
+            self._fault("404")
+            raise FakeHTTPError(404, f"{method}: not found")
+        return fn(*args, **kwargs)
+
+    def has_user(self) -> bool:
+        return bool(self.user)
+
+    def set_user_auth(self, auth_manager) -> None:
+        self.user = True
+
+    def _fault(self, kind: str) -> None:
+        with self._lock:
+            self._faults[kind] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"calls": dict(self._calls), "faults": dict(self._faults),
+                    "tracks": len(self.catalog.tracks), "playlists": len(self.playlists)}
+
+    # ---- helpers ----
+    def _playable(self, tid: str, market: Optional[str]) -> bool:
+        return not market or market in self.catalog.tracks[tid]["available_markets"]
+
+    def _tracks_json(self, ids: Sequence[str]) -> List[dict]:
+        return [self.catalog.tracks[t] for t in ids]
+
+    # ---- app endpoints ----
+    def _ep_search(self, q: str, limit: int = 10, offset: int = 0, type: str = "track", market: Optional[str] = None):
+        limit = max(1, min(int(limit), 50))
+        ids = [t for t in self.catalog.search(q) if self._playable(t, market)]
+        page = ids[int(offset):int(offset) + limit]
+        return {"tracks": {"items": self._tracks_json(page), "limit": limit, "offset": int(offset), "total": len(ids)}}
+
+    def _ep_tracks(self, tracks: Sequence[str], market: Optional[str] = None):
+        ids = [str(t).split(":")[-1] for t in tracks]
+        if len(ids) > 50:
+            raise FakeHTTPError(400, "Too many ids requested")
+        return {"tracks": [self.catalog.tracks.get(t) for t in ids]}
+
+    def _ep_audio_features(self, tracks: Sequence[str]):
+        ids = [str(t).split(":")[-1] for t in tracks]
+        if len(ids) > 100:
+            raise FakeHTTPError(400, "Too many ids requested")
+        return [self.catalog.features.get(t) for t in ids]
+
+    def _ep_recommendations(self, seed_tracks: Sequence[str] = (), seed_artists: Sequence[str] = (),
+                            seed_genres: Sequence[str] = (), limit: int = 20, market: Optional[str] = None, **targets):
+        cat = self.catalog
+        seeds = [t for t in seed_tracks if t in cat.tracks]
+        if not (seeds or seed_artists or seed_genres):
+            raise FakeHTTPError(400, "At least one seed must be provided")
+        genres = {cat.artists[cat.tracks[t]["artists"][0]["id"]]["genres"][0] for t in seeds}
+        genres |= {cat.artists[a]["genres"][0] for a in seed_artists if a in cat.artists} | set(seed_genres)
+        pool = [t for g in sorted(genres) for a in cat.by_genre.get(g, ()) for t in cat.by_artist[a]
+                if t not in seeds and self._playable(t, market)]
+        want = {k[len("target_"):]: float(v) for k, v in targets.items() if k.startswith("target_")}
+
+        def dist(tid):
+            f = cat.features[tid]
+            return sum(((f[k] - v) / 180.0 if k == "tempo" else f[k] - v) ** 2
+                       for k, v in want.items() if k in f)
+
+        pool.sort(key=lambda t: (dist(t), t))
+        return {"tracks": self._tracks_json(pool[:max(1, min(int(limit), 100))]), "seeds": []}
+
+    def _ep_artist_related_artists(self, artist_id: str):
+        cat = self.catalog
+        a = cat.artists.get(str(artist_id).split(":")[-1])
+        if a is None:
+            raise FakeHTTPError(404, "non existing id")
+        peers = [x for x in cat.by_genre[a["genres"][0]] if x != a["id"]]
+        return {"artists": [cat.artists[x] for x in peers[:20]]}
+
+    def _ep_artist_top_tracks(self, artist_id: str, country: str = "US", market: Optional[str] = None):
+        cat = self.catalog
+        ids = cat.by_artist.get(str(artist_id).split(":")[-1])
+        if ids is None:
+            raise FakeHTTPError(404, "non existing id")
+        mk = market or country
+        ids = sorted((t for t in ids if self._playable(t, mk)), key=lambda t: -cat.tracks[t]["popularity"])
+        return {"tracks": self._tracks_json(ids[:10])}
+
+    # ---- user endpoints ----
+    def _ep_me(self):
+        return {"id": "fake-user", "display_name": "Fake User", "product": "premium" if self.cfg.premium else "free"}
+
+    def _ep_user_playlist_create(self, user: str, name: str, public: bool = True, collaborative: bool = False,
+                                 description: str = ""):
+        with self._lock:
+            pid = _sid(self.cfg.seed, "playlist", len(self.playlists))
+            self.playlists[pid] = {"id": pid, "name": name, "public": public, "description": description,
+                                   "owner": {"id": user}, "items": [],
+                                   "external_urls": {"spotify": f"https://open.spotify.com/playlist/{pid}"}}
+        return {k: v for k, v in self.playlists[pid].items() if k != "items"}
+
+    def _ep_playlist_add_items(self, playlist_id: str, items: Sequence[str], position: Optional[int] = None):
+        pl = self.playlists.get(str(playlist_id).split(":")[-1])
+        if pl is None:
+            raise FakeHTTPError(404, "Playlist not found")
+        if len(items) > 100:
+            raise FakeHTTPError(400, "Too many tracks")
+        with self._lock:
+            pl["items"].extend(items)
+        return {"snapshot_id": f"{pl['id']}:{len(pl['items'])}"}
+
+    def _ep_devices(self):
+        return {"devices": [{"id": f"fake-device-{i}", "name": f"Fake Speaker {i}", "type": "Speaker",
+                             "is_active": i == 0, "volume_percent": 50} for i in range(self.cfg.devices)]}
+
+    def _ep_start_playback(self, device_id: Optional[str] = None, context_uri: Optional[str] = None,
+                           uris: Optional[Sequence[str]] = None, offset=None, position_ms=None):
+        if not self.cfg.premium:
+            raise FakeHTTPError(403, "Player command failed: Premium required")
+        if not self.cfg.devices:
+            raise FakeHTTPError(404, "Player command failed: No active device found")
+        self.playing = {"device_id": device_id or "fake-device-0", "context_uri": context_uri, "uris": uris}
+
+    def _ep_current_user_top_tracks(self, limit: int = 20, offset: int = 0, time_range: str = "medium_term"):
+        ids = sorted(self.catalog.tracks, key=lambda t: -self.catalog.tracks[t]["popularity"])
+        return {"items": self._tracks_json(ids[int(offset):int(offset) + int(limit)])}
+
+    def _ep_current_user_recently_played(self, limit: int = 50, after=None, before=None):
+        ids = list(self.catalog.tracks)[:int(limit)]
+        return {"items": [{"track": t, "played_at": "2024-01-01T00:00:00Z"} for t in self._tracks_json(ids)]}
+
+    def _ep_current_user_top_artists(self, limit: int = 20, offset: int = 0, time_range: str = "medium_term"):
+        ids = sorted(self.catalog.artists, key=lambda a: -self.catalog.artists[a]["popularity"])
+        return {"items": [self.catalog.artists[a] for a in ids[int(offset):int(offset) + int(limit)]]}
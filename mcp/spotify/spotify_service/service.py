@@ -0,0 +1,290 @@
+# service.py
+import os, re, logging, threading
+from functools import partial
+from typing import List, Optional, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tenacity import retry, wait_exponential, stop_after_attempt
+
+from rate_limit import limits
+from singleflight import SingleFlight, freeze
+from features import FeatureMatrix
+from feature_store import store as feature_store
+from .transport import Transport, make_transport
+
+
+def _track_dict(t: dict) -> dict:
+    """Pista de la API → formato plano de Track."""
+    return {"id": t["id"], "name": t["name"],
+            "artists": [{"name": a["name"]} for a in t.get("artists", [])],
+            "uri": t["uri"], "preview_url": t.get("preview_url"),
+            "release_date": (t.get("album") or {}).get("release_date")}
+
+
+class SpotifyService:
+    """
+    Spotify API service wrapper for managing music operations.
+    Handles both app-only and user-authenticated Spotify operations including
+    search, recommendations, playlist management, and playback control.
+    Attributes:
+        market (str): Market/country code for Spotify API requests
+        transport (Transport): Backend that executes the Web API calls
+            (spotipy by default; selectable with SPOTIFY_TRANSPORT)
+    Note:
+        Requires SPOTIFY_MARKET environment variable (defaults to "US")
+        User operations require OAuth authentication via set_user_auth_manager()
+        Methods are blocking; AsyncSpotifyService exposes the same API for asyncio callers.
+    """
+
+    def __init__(self, transport: Optional[Transport] = None, market: Optional[str] = None):
+        self.market = market or os.environ.get("SPOTIFY_MARKET", "US")
+        self.transport = transport or make_transport()
+        self.limits = limits()
+        self.flights = SingleFlight()
+        self._pool = ThreadPoolExecutor(max_workers=int(os.getenv("SPOTIFY_FETCH_WORKERS", "4")),
+                                        thread_name_prefix="spotify")
+        # Tareas que a su vez usan _pool (pipelines, refrescos) van aparte para no agotarlo.
+        self._bg = ThreadPoolExecutor(max_workers=int(os.getenv("SPOTIFY_PIPELINE_WORKERS", "8")),
+                                      thread_name_prefix="spotify-bg")
+
+    def set_user_auth_manager(self, oauth):
+        self.transport.set_user_auth(oauth)
+
+    def _app(self, method: str, *args, lane: str = "default", **kwargs):
+        """
+        Llama a un endpoint con credenciales de app pasando por el presupuesto compartido.
+        Llamadas idénticas en vuelo (endpoint + args + market) y del mismo carril comparten una
+        sola petición; con el carril en la clave, una interactiva no espera detrás de una de fondo.
+        """
+        fn = partial(self.transport.call, "app", method)
+        key = (method, lane, freeze(args), freeze(kwargs))
+        try:
+            hash(key)
+        except TypeError:
+            return self.limits.call("app", lane, fn, *args, **kwargs)
+        return self.flights.do(key, self.limits.call, "app", lane, fn, *args, **kwargs)
+
+    def _user(self, method: str, *args, lane: str = "default", **kwargs):
+        """Igual que _app, pero con el cliente OAuth del usuario (bucket 'user')."""
+        self._require_user()
+        return self.limits.call("user", lane, partial(self.transport.call, "user", method), *args, **kwargs)
+
+    def _require_user(self) -> None:
+        if not self.transport.has_user():
+            raise PermissionError("Acción requiere OAuth de usuario configurado y login previo.")
+
+    def _sp_tracks(self, ids: List[str], lane: str = "default"):
+        try:
+            return self._app("tracks", tracks=ids, market=self.market, lane=lane)
+        except TypeError:
+            return self._app("tracks", tracks=ids, lane=lane)
+
+    @staticmethod
+    def _coerce_seed_list(seeds):
+        if not seeds:
+            return []
+        if isinstance(seeds, str):
+            toks = re.split(r"[,\s]+", seeds.strip())
+        else:
+            flat = []
+            for s in seeds:
+                if not s: continue
+                if isinstance(s, str):
+                    flat += re.split(r"[,\s]+", s.strip())
+                else:
+                    flat.append(str(s))
+            toks = [t for t in flat if t]
+        out, seen = [], set()
+        for t in toks:
+            tid = t.split(":")[-1]
+            if len(tid) == 22 and tid not in seen:
+                seen.add(tid); out.append(tid)
+        return out
+
+    def search_tracks(self, query: str, limit: int = 10, market: Optional[str] = None, lane: str = "default"):
+        res = self._app("search", q=query, type="track", limit=limit, market=market or self.market, lane=lane)
+        items = res.get("tracks", {}).get("items", [])
+        return [_track_dict(t) for t in items]
+
+    def _audio_features_batch(self, batch: List[str], lane: str = "default"):
+        # los 429 los reintenta el limitador y los 5xx/conexión el transporte; aquí solo un reintento
+        # si la lectura venció (GET idempotente), para no perder los ids del lote
+        for attempt in range(2):
+            try:
+                return [f for f in (self._app("audio_features", tracks=batch, lane=lane) or []) if f]
+            except Exception as e:
+                if attempt or not self.transport.is_read_timeout(e):
+                    raise
+                logging.info("audio_features: timeout de lectura (len=%d), reintento", len(batch))
+
+    def audio_features_map(self, track_ids, lane: str = "default") -> FeatureMatrix:
+        if not track_ids:
+            return FeatureMatrix()
+        ids = [str(t).split(":")[-1] for t in track_ids if t]
+        fs = feature_store()
+        records, ids = fs.get_many(ids) if fs else ([], list(dict.fromkeys(ids)))
+        CHUNK = 50
+        batches = [ids[i:i+CHUNK] for i in range(0, len(ids), CHUNK)]
+        futs = {self._pool.submit(self._audio_features_batch, b, lane): b for b in batches}
+        failed = 0
+        for fut in as_completed(futs):
+            batch = futs[fut]
+            try:
+                feats = fut.result()
+            except Exception as e:
+                failed += 1
+                logging.warning("audio_features failed (%s) len=%d", getattr(e, "http_status", e), len(batch))
+                if fs and getattr(e, "http_status", None) == 403:
+                    fs.put_misses(batch)
+                continue
+            if fs:
+                fs.put_many(feats)
+                got = {f["id"] for f in feats if f.get("id")}
+                fs.put_misses([i for i in batch if i not in got])
+            records.extend(feats)
+        if failed:
+            logging.warning("audio_features: %d/%d lotes fallidos; uso resultados parciales + store local", failed, len(batches))
+        return FeatureMatrix.from_records(records)
+
+    def _rank_by_targets(self, candidates, targets, k: Optional[int] = None):
+        if not candidates:
+            return []
+        fm = self.audio_features_map([t.get("id") for t in candidates if t and t.get("id")])
+        if not fm:
+            return candidates[:k] if k is not None else candidates
+        order = fm.rank([(t or {}).get("id") for t in candidates], targets, k=k)
+        return [candidates[i] for i in order]
+
+    def recommendations(self, seed_tracks, targets: Dict[str, float], limit: int = 20):
+        toks = [p.strip() for p in re.split(r"[,\s]+", seed_tracks) if p.strip()] if isinstance(seed_tracks, str) else \
+               [p.strip() for s in (seed_tracks or []) for p in re.split(r"[,\s]+", str(s)) if p.strip()]
+        ids = [t.split(":")[-1] for t in toks if len(t.split(":")[-1]) == 22][:5]
+
+        valid_ids, artist_ids = [], []
+        if ids:
+            meta = self._sp_tracks(ids)
+            for tr in (meta or {}).get("tracks", []) or []:
+                if not tr: continue
+                mkts = tr.get("available_markets") or []
+                if not mkts or self.market in mkts:
+                    valid_ids.append(tr["id"])
+                for a in (tr.get("artists") or [])[:1]:
+                    if a.get("id"): artist_ids.append(a["id"])
+        artist_ids = list(dict.fromkeys(artist_ids))[:5]
+
+        tgt = {f"target_{k}": float(v) for k, v in targets.items()
+               if v is not None and k in ("energy", "valence", "danceability", "tempo")}
+
+        def _official(**params):
+            try:
+                return (self._app("recommendations", **params) or {}).get("tracks", []) or []
+            except Exception as e:
+                logging.warning("Recommendations failed (%s) params=%s", getattr(e, "http_status", e), params); return []
+
+        for k in (5, 3, 2, 1):
+            if len(valid_ids) >= k:
+                tr = _official(seed_tracks=valid_ids[:k], limit=int(limit), **tgt)
+                if tr:
+                    return [_track_dict(t) for t in tr]
+
+        candidates = []
+        if artist_ids:
+            for aid in artist_ids:
+                try:
+                    rel = self._app("artist_related_artists", aid, lane="background").get("artists", [])[:5]
+                except Exception:
+                    rel = []
+                base = [aid] + [a.get("id") for a in rel if a and a.get("id")]
+                for a in base[:5]:
+                    try:
+                        candidates.extend(self._app("artist_top_tracks", a, country=self.market, lane="background").get("tracks", [])[:5])
+                    except Exception:
+                        pass
+
+        if not candidates:
+            return []
+
+        seen = set(); clean = []
+        for t in candidates:
+            if not t or not t.get("id"): continue
+            if t["id"] in seen: continue
+            mkts = t.get("available_markets") or []
+            if mkts and self.market not in mkts: continue
+            seen.add(t["id"]); clean.append(t)
+
+        ranked = self._rank_by_targets(clean, targets, k=int(limit))
+        return [_track_dict(t) for t in ranked]
+
+    def create_playlist(self, name: str, description: str = "", public: bool = False):
+        me = self._user("me")
+        pl = self._user("user_playlist_create", me["id"], name=name, public=public, description=description)
+        return {"playlist_id": pl["id"], "url": pl["external_urls"]["spotify"]}
+
+    def add_to_playlist(self, playlist_id: str, track_uris: List[str]) -> int:
+        self._require_user()
+        if not track_uris:
+            return 0
+        chunks = [track_uris[i:i+100] for i in range(0, len(track_uris), 100)]
+        added = 0
+        for ch in chunks:
+            self._user("playlist_add_items", playlist_id, ch)
+            added += len(ch)
+        return added
+
+    def list_devices(self):
+        return (self._user("devices") or {}).get("devices", [])
+
+    @retry(wait=wait_exponential(multiplier=0.5, max=4), stop=stop_after_attempt(3))
+    def start_or_transfer(self, playlist_uri: str, device_id: Optional[str]):
+        try:
+            self._user("start_playback", device_id=device_id, context_uri=playlist_uri, lane="interactive")
+            return "playing"
+        except Exception as e:
+            if getattr(e, "http_status", None) == 403: return "not_premium"
+            raise
+
+    def user_seed_track_ids(self, want: int = 5):
+        self._require_user()
+        seen, seeds = set(), []
+        try:
+            top = self._user("current_user_top_tracks", limit=min(20, max(5, want*3)), time_range="medium_term")
+            for it in top.get("items", []):
+                tid = it.get("id")
+                if tid and tid not in seen:
+                    seeds.append(tid); seen.add(tid)
+                if len(seeds) >= want: return seeds
+        except Exception:
+            pass
+        try:
+            rp = self._user("current_user_recently_played", limit=50)
+            for it in rp.get("items", []):
+                tr = it.get("track", {}); tid = tr.get("id")
+                if tid and tid not in seen:
+                    seeds.append(tid); seen.add(tid)
+                if len(seeds) >= want: return seeds
+        except Exception:
+            pass
+        try:
+            arts = self._user("current_user_top_artists", limit=5, time_range="medium_term")
+            for a in arts.get("items", []):
+                at = self._user("artist_top_tracks", a["id"], country=self.market)
+                for tr in at.get("tracks", []):
+                    tid = tr.get("id")
+                    if tid and tid not in seen:
+                        seeds.append(tid); seen.add(tid)
+                    if len(seeds) >= want: return seeds
+        except Exception:
+            pass
+        return seeds
+
+
+_svc: Optional[SpotifyService] = None
+_svc_lock = threading.Lock()
+
+def svc() -> SpotifyService:
+    """Servicio compartido del proceso (transport según SPOTIFY_TRANSPORT)."""
+    global _svc
+    with _svc_lock:
+        if _svc is None:
+            _svc = SpotifyService()
+        return _svc
@@ -0,0 +1,148 @@
+# transport.py
+import os, importlib
+from typing import Dict, Optional
+
+SCOPES = [
+    "playlist-modify-public", "playlist-modify-private", "user-read-playback-state",
+    "user-modify-playback-state", "user-top-read", "user-read-recently-played",
+    "user-read-currently-playing", "user-read-private"
+]
+SCOPE_STR = " ".join(SCOPES)
+
+
+class Transport:
+    """
+    What SpotifyService needs from the outside world.
+
+    `call(cred, method, ...)` runs one Web API operation with app ("app") or
+    user ("user") credentials. Method names and arguments follow spotipy
+    (search, tracks, audio_features, recommendations, artist_top_tracks,
+    user_playlist_create, playlist_add_items, start_playback, ...), and so do
+    the responses (raw Web API JSON). Errors must carry `http_status` (and
+    `headers` for 429s), as spotipy's SpotifyException does.
+    """
+
+    name = "base"
+
+    def call(self, cred: str, method: str, *args, **kwargs):
+        raise NotImplementedError
+
+    def has_user(self) -> bool:
+        return False
+
+    def set_user_auth(self, auth_manager) -> None:
+        raise NotImplementedError(f"El transport '{self.name}' no soporta OAuth de usuario.")
+
+    def is_read_timeout(self, exc: BaseException) -> bool:
+        """True si exc es un timeout de lectura HTTP (la petición pudo no llegar a responderse)."""
+        return False
+
+
+def oauth_settings() -> Dict[str, str]:
+    return {
+        "client_id": os.getenv("SPOTIPY_CLIENT_ID") or os.getenv("SPOTIFY_CLIENT_ID", ""),
+        "client_secret": os.getenv("SPOTIPY_CLIENT_SECRET") or os.getenv("SPOTIFY_CLIENT_SECRET", ""),
+        "redirect_uri": os.getenv("SPOTIPY_REDIRECT_URI") or os.getenv("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8080/callback"),
+    }
+
+
+class SpotipyTransport(Transport):
+    """Real Web API through spotipy (imported on first use)."""
+
+    name = "spotipy"
+
+    def __init__(self, bot_mode: Optional[bool] = None):
+        import spotipy
+        self._spotipy = spotipy
+        self.app = self._new_client(self._app_auth())
+        self.user = None
+        if bot_mode is None:
+            bot_mode = os.getenv("SPOTIFY_BOT_MODE", "0") == "1"
+        if bot_mode:
+            self.user = self._new_client(self._bot_auth())
+
+    def is_read_timeout(self, exc):
+        import requests
+        return isinstance(exc, requests.exceptions.ReadTimeout)
+
+    def _new_client(self, auth_manager):
+        return self._spotipy.Spotify(auth_manager=auth_manager, requests_timeout=10,
+                                     requests_session=self._session())
+
+    @staticmethod
+    def _session():
+        """
+        Sesión HTTP con reintentos solo para 5xx. urllib3 reintenta además cualquier 429 con Retry-After
+        (respect_retry_after_header), aunque no esté en status_forcelist; se desactiva para que el 429
+        llegue como SpotifyException y lo gestione rate_limit (Retry-After + presupuesto compartido).
+        Los timeouts de lectura no se reintentan aquí (read=False: incluiría POSTs no idempotentes);
+        las lecturas idempotentes que lo necesitan lo hacen en SpotifyService (is_read_timeout).
+        """
+        import requests
+        from urllib3.util.retry import Retry
+        retry = Retry(total=3, connect=None, read=False, status=3, backoff_factor=0.3,
+                      allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+                      status_forcelist=(500, 502, 503, 504), respect_retry_after_header=False)
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @staticmethod
+    def _app_auth():
+        from spotipy.oauth2 import SpotifyClientCredentials
+        cid = os.environ.get("SPOTIFY_CLIENT_ID")
+        csec = os.environ.get("SPOTIFY_CLIENT_SECRET")
+        if not cid or not csec:
+            raise RuntimeError("Faltan SPOTIFY_CLIENT_ID / SPOTIFY_CLIENT_SECRET")
+        return SpotifyClientCredentials(client_id=cid, client_secret=csec)
+
+    @staticmethod
+    def _bot_auth():
+        from spotipy.oauth2 import SpotifyOAuth
+        rt = os.getenv("SPOTIFY_REFRESH_TOKEN", "")
+        if not rt:
+            raise RuntimeError("Falta SPOTIFY_REFRESH_TOKEN en .env para BOT_MODE.")
+        oauth = SpotifyOAuth(
+            **oauth_settings(),
+            scope=SCOPE_STR,
+            open_browser=False,
+            cache_path=f".cache-{os.getenv('SPOTIFY_USERNAME','bot')}",
+            requests_timeout=10,
+        )
+        token_info = oauth.refresh_access_token(rt)
+        try:
+            oauth.cache_handler.save_token_to_cache(token_info)
+        except Exception:
+            pass
+        return oauth
+
+    def call(self, cred: str, method: str, *args, **kwargs):
+        client = self.app if cred == "app" else self.user
+        if client is None:
+            raise PermissionError("Acción requiere OAuth de usuario configurado y login previo.")
+        return getattr(client, method)(*args, **kwargs)
+
+    def has_user(self) -> bool:
+        return self.user is not None
+
+    def set_user_auth(self, auth_manager) -> None:
+        self.user = self._new_client(auth_manager)
+
+
+# nombre → "modulo:Clase"; SPOTIFY_TRANSPORT también acepta una ruta "paquete.modulo:Clase".
+TRANSPORTS = {
+    "spotipy": "spotify_service.transport:SpotipyTransport",
+    "fake": "spotify_service.fake:FakeTransport",
+}
+
+
+def make_transport(name: Optional[str] = None, **kwargs) -> Transport:
+    """Instancia el transport pedido (por defecto SPOTIFY_TRANSPORT o 'spotipy')."""
+    name = (name or os.getenv("SPOTIFY_TRANSPORT") or "spotipy").strip()
+    target = TRANSPORTS.get(name.lower(), name)
+    if ":" not in target:
+        raise ValueError(f"Transport desconocido '{name}'. Opciones: {', '.join(TRANSPORTS)} o 'modulo:Clase'.")
+    mod, cls = target.split(":", 1)
+    return getattr(importlib.import_module(mod), cls)(**kwargs)
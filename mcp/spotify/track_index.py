@@ -0,0 +1,236 @@
+# track_index.py
+import os, gzip, json, math, time, threading, logging, atexit
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from features import FEATURE_KEYS, FeatureMatrix
+from diversity import release_year
+
+INDEX_PATH = os.getenv("SPOTIFY_TRACK_INDEX", str(Path(__file__).with_name("track_index.json.gz")))
+GRID = 10          # celdas por eje (energy × valence)
+SAVE_EVERY_S = 60  # persistencia diferida tras ingestas
+_E, _V = FEATURE_KEYS.index("energy"), FEATURE_KEYS.index("valence")
+
+
+def _cell(f: Sequence[float]) -> Optional[Tuple[int, int]]:
+    e, v = f[_E], f[_V]
+    if math.isnan(e) or math.isnan(v):
+        return None
+    return (min(GRID - 1, max(0, int(e * GRID))), min(GRID - 1, max(0, int(v * GRID))))
+
+
+class TrackIndex:
+    """
+    Local candidate index of tracks seen through the API.
+
+    Columns (id, name, artists, uri, market, tags, year, features) are kept as
+    parallel lists and persisted as one gzip'd columnar JSON file. Tags are
+    the genres/moods the track was found for (e.g. the GENRE_QUERY_HINTS
+    search that returned it). Approximate nearest-neighbour lookups use an
+    energy × valence grid: the query expands ring by ring from the target
+    cell until enough candidates are collected, then ranks only those
+    exactly with FeatureMatrix.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._row: Dict[str, int] = {}
+        self.cols: Dict[str, list] = {c: [] for c in ("id", "name", "artists", "uri", "market", "tags", "year", "feats")}
+        self._grid: Dict[Optional[Tuple[int, int]], List[int]] = {}
+        self._by_tag: Dict[str, Set[int]] = {}
+        self.fresh: Dict[str, float] = {}
+        self._dirty_since: Optional[float] = None
+        self._cursor = 0  # unfeatured()
+
+    def __len__(self) -> int:
+        return len(self.cols["id"])
+
+    # ---- persistencia ----
+    def load(self) -> "TrackIndex":
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return self
+        cols = data.get("cols") or {}
+        n = len(cols.get("id") or [])
+        feats = [tuple(math.nan if x is None else x for x in r) for r in cols.get("feats", [])]
+        years = cols.get("year") or [None] * n   # índices guardados antes de la columna year
+        with self._lock:
+            for i in range(n):
+                self._insert(cols["id"][i], cols["name"][i], cols["artists"][i], cols["uri"][i],
+                             cols["market"][i], cols["tags"][i], years[i], feats[i])
+            self.fresh.update(data.get("fresh") or {})
+            self._dirty_since = None
+        return self
+
+    def save(self) -> None:
+        with self._lock:
+            if self._dirty_since is None:
+                return
+            cols = dict(self.cols)
+            cols["feats"] = [[None if math.isnan(x) else round(x, 4) for x in r] for r in self.cols["feats"]]
+            data = {"cols": cols, "fresh": self.fresh}
+            self._dirty_since = None
+        tmp = self.path + ".tmp"
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.warning("track_index: no se pudo guardar %s (%s)", self.path, e)
+
+    def _maybe_save(self) -> None:
+        if self._dirty_since is not None and time.time() - self._dirty_since >= SAVE_EVERY_S:
+            self.save()
+
+    # ---- ingesta ----
+    def _insert(self, tid, name, artists, uri, market, tags, year, feats) -> int:
+        row = len(self.cols["id"])
+        self._row[tid] = row
+        for c, v in (("id", tid), ("name", name), ("artists", list(artists)), ("uri", uri),
+                     ("market", market), ("tags", list(tags)), ("year", year), ("feats", tuple(feats))):
+            self.cols[c].append(v)
+        self._grid.setdefault(_cell(feats), []).append(row)
+        for t in tags:
+            self._by_tag.setdefault(t, set()).add(row)
+        return row
+
+    def add(self, tracks: Iterable[dict], tags: Iterable[str] = (), market: str = "",
+            features: Optional[FeatureMatrix] = None) -> int:
+        """Agrega/actualiza pistas (formato search_tracks). Devuelve cuántas eran nuevas."""
+        tags = [t for t in tags if t and t != "neutral"]
+        new = 0
+        with self._lock:
+            for t in tracks:
+                tid = (t or {}).get("id")
+                if not tid:
+                    continue
+                f = features.row(tid) if features is not None else None
+                row = self._row.get(tid)
+                if row is None:
+                    self._insert(tid, t.get("name", ""), [a.get("name", "") for a in t.get("artists") or []],
+                                 t.get("uri") or f"spotify:track:{tid}", market, tags, release_year(t),
+                                 f or (math.nan,) * len(FEATURE_KEYS))
+                    new += 1
+                    continue
+                if self.cols["year"][row] is None:
+                    self.cols["year"][row] = release_year(t)
+                for tg in tags:
+                    if tg not in self.cols["tags"][row]:
+                        self.cols["tags"][row].append(tg)
+                        self._by_tag.setdefault(tg, set()).add(row)
+                if f is not None:
+                    self._set_feats(row, f)
+            if self._dirty_since is None:
+                self._dirty_since = time.time()
+        self._maybe_save()
+        return new
+
+    def _set_feats(self, row: int, f: Sequence[float]) -> bool:
+        """Completa las features de una fila que no las tenía (la mueve de la celda None a la suya)."""
+        if _cell(self.cols["feats"][row]) is not None or _cell(f) is None:
+            return False
+        self._grid[None].remove(row)
+        self.cols["feats"][row] = tuple(f)
+        self._grid.setdefault(_cell(f), []).append(row)
+        return True
+
+    def unfeatured(self, n: int) -> List[str]:
+        """
+        Hasta n ids sin features (p.ej. ingresados desde búsquedas), para completarlos
+        en segundo plano. Rota entre llamadas: los ids que la API no resuelve no tapan al resto.
+        """
+        with self._lock:
+            rows = self._grid.get(None) or []
+            if not rows:
+                return []
+            start = self._cursor % len(rows)
+            out = (rows[start:] + rows[:start])[:n]
+            self._cursor = start + len(out)
+            return [self.cols["id"][r] for r in out]
+
+    def set_features(self, features: FeatureMatrix) -> int:
+        """Completa features de pistas ya indexadas. Devuelve cuántas filas se actualizaron."""
+        done = 0
+        with self._lock:
+            for tid in features:
+                row = self._row.get(tid)
+                f = features.row(tid)
+                if row is not None and f is not None and self._set_feats(row, f):
+                    done += 1
+            if done and self._dirty_since is None:
+                self._dirty_since = time.time()
+        self._maybe_save()
+        return done
+
+    def mark_fresh(self, tag: str) -> None:
+        with self._lock:
+            self.fresh[tag] = time.time()
+            self._dirty_since = self._dirty_since or time.time()
+
+    def is_stale(self, tag: str, ttl_s: float) -> bool:
+        return time.time() - self.fresh.get(tag, 0.0) > ttl_s
+
+    # ---- consulta ----
+    def _track(self, row: int) -> dict:
+        c = self.cols
+        return {"id": c["id"][row], "name": c["name"][row],
+                "artists": [{"name": a} for a in c["artists"][row]],
+                "uri": c["uri"][row], "preview_url": None,
+                "release_date": str(c["year"][row]) if c["year"][row] else None}
+
+    def nearest(self, targets: Dict[str, float], k: int, tags: Optional[Iterable[str]] = None,
+                market: Optional[str] = None, exclude: Iterable[str] = ()) -> List[dict]:
+        """
+        Hasta k pistas cercanas a `targets`. Con `tags`, sólo pistas etiquetadas
+        con alguno de ellos. Si hay objetivo de energy/valence, las pistas sin
+        features no se devuelven (no hay con qué ordenarlas): el llamador
+        completa con la API y unfeatured/set_features las rellenan aparte.
+        """
+        exclude = set(exclude)
+        with self._lock:
+            allowed: Optional[Set[int]] = None
+            if tags:
+                allowed = set().union(*(self._by_tag.get(t, set()) for t in tags))
+                if not allowed:
+                    return []
+
+            def ok(r: int) -> bool:
+                return ((allowed is None or r in allowed) and self.cols["id"][r] not in exclude
+                        and (not market or not self.cols["market"][r] or self.cols["market"][r] == market))
+
+            e, v = targets.get("energy"), targets.get("valence")
+            picked: List[int] = []
+            if e is not None and v is not None:
+                ce, cv = _cell(tuple(float(targets.get(k_, math.nan)) for k_ in FEATURE_KEYS)) or (0, 0)
+                want = max(k * 3, 10)
+                for ring in range(GRID):
+                    for i in range(ce - ring, ce + ring + 1):
+                        for j in range(cv - ring, cv + ring + 1):
+                            if max(abs(i - ce), abs(j - cv)) != ring:
+                                continue
+                            picked.extend(r for r in self._grid.get((i, j), ()) if ok(r))
+                    if len(picked) >= want:
+                        break
+                fm = FeatureMatrix([self.cols["id"][r] for r in picked], [self.cols["feats"][r] for r in picked])
+                picked = [picked[i] for i in fm.rank([self.cols["id"][r] for r in picked], targets, k=k)]
+            else:
+                picked = [r for r in range(len(self)) if ok(r)]
+            return [self._track(r) for r in picked[:k]]
+
+
+_index: Optional[TrackIndex] = None
+_index_lock = threading.Lock()
+
+def track_index() -> Optional[TrackIndex]:
+    """Índice compartido del proceso (None si SPOTIFY_TRACK_INDEX=off)."""
+    global _index
+    if INDEX_PATH.lower() in ("", "off", "0"):
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = TrackIndex(INDEX_PATH).load()
+            atexit.register(_index.save)
+        return _index